@@ -0,0 +1,161 @@
+# 查询接口的审计访问日志：请求路径上只把记录追加到内存队列，后台线程批量写入本地滚动文件
+#
+# 同时设置 ACCESS_LOG_DIR 与 ACCESS_LOG_SALT 后启用，每个 worker 写自己的 access-<pid>.log（JSON Lines），
+# 超过 ACCESS_LOG_MAX_BYTES 时滚动为 .1 ~ .N。每行字段：
+#     ts 时间戳 | route 路由 | method | status HTTP 状态码 | result ok/miss/invalid/throttled/not_modified/error
+#     | ms 处理耗时 | client 客户端 | phone_hash 号码哈希（仅单号查询）
+#     | lookup 查询路径 seg7/prefix/ported/miss/invalid（仅实际执行了查询的单号请求）
+# 号码不落盘，只记录 HMAC-SHA256(ACCESS_LOG_SALT, 号码) 的前 16 位十六进制。手机号空间很小（约 10^10），
+# 无盐或弱盐的哈希可被穷举还原，因此未配置盐值时拒绝启用；所有 worker 与节点应使用同一个足够长的随机盐值。
+#
+# 队列有上限（ACCESS_LOG_QUEUE），磁盘变慢写不过来时新记录直接丢弃并计数，请求永远不会被日志阻塞。
+import os
+import hmac
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+
+ACCESS_LOG_DIR = os.environ.get("ACCESS_LOG_DIR", "")
+ACCESS_LOG_QUEUE = int(os.environ.get("ACCESS_LOG_QUEUE", "100000"))
+ACCESS_LOG_FLUSH_SECONDS = float(os.environ.get("ACCESS_LOG_FLUSH_SECONDS", "1"))
+ACCESS_LOG_MAX_BYTES = int(os.environ.get("ACCESS_LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+ACCESS_LOG_BACKUPS = int(os.environ.get("ACCESS_LOG_BACKUPS", "10"))
+ACCESS_LOG_SALT = os.environ.get("ACCESS_LOG_SALT", "").encode("utf-8")
+
+RESULTS = {200: "ok", 304: "not_modified", 400: "invalid", 404: "miss", 429: "throttled"}
+
+# 待写入的记录：(时间戳, 路由, 方法, 状态码, 耗时秒, 客户端, 号码, 查询路径)；deque 的 append/popleft 是线程安全的
+_queue = deque()
+STATS = {
+    "queued": 0,            # 进入队列的记录数
+    "written": 0,           # 已写入文件的记录数
+    "dropped": 0,           # 队列已满被丢弃的记录数
+    "flushes": 0,
+    "errors": 0,            # 写入失败次数（该批记录计入 dropped）
+    "bytes_written": 0,
+    "last_flush_records": 0,
+    "last_flush_ms": None,
+    "records_per_sec": None,  # 最近一次批量写入的吞吐（记录数 / 写入耗时）
+}
+
+
+def enabled():
+    return bool(ACCESS_LOG_DIR and ACCESS_LOG_SALT)
+
+
+def record(route, method, status, seconds, client, phone=None, lookup=None):
+    """请求路径上调用：只追加到内存队列，队列已满时丢弃"""
+    if len(_queue) >= ACCESS_LOG_QUEUE:
+        STATS["dropped"] += 1
+        return
+    _queue.append((time.time(), route, method, status, seconds, client, phone, lookup))
+    STATS["queued"] += 1
+
+
+def phone_hash(phone):
+    return hmac.new(ACCESS_LOG_SALT, phone.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+def _format(entry):
+    ts, route, method, status, seconds, client, phone, lookup = entry
+    line = {"ts": round(ts, 3), "route": route, "method": method, "status": status,
+            "result": RESULTS.get(status, "error"), "ms": round(seconds * 1000, 3), "client": client}
+    if phone:
+        line["phone_hash"] = phone_hash(phone)
+    if lookup:
+        line["lookup"] = lookup
+    return json.dumps(line, ensure_ascii=False, separators=(",", ":"))
+
+
+class _RotatingFile:
+    """按大小滚动的追加写文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+
+    def write(self, data):
+        if self.f is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.f = open(self.path, "ab")
+        self.f.write(data)
+        self.f.flush()
+        if self.f.tell() >= ACCESS_LOG_MAX_BYTES:
+            self.rotate()
+
+    def rotate(self):
+        self.f.close()
+        self.f = None
+        for i in range(ACCESS_LOG_BACKUPS - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if ACCESS_LOG_BACKUPS > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+_file = None
+
+
+def flush():
+    """取出队列中的全部记录，格式化后一次写入"""
+    global _file
+    n = len(_queue)
+    if not n:
+        return 0
+    start = time.perf_counter()
+    batch = [_queue.popleft() for _ in range(n)]
+    data = ("\n".join(map(_format, batch)) + "\n").encode("utf-8")
+    path = os.path.join(ACCESS_LOG_DIR, f"access-{os.getpid()}.log")
+    if _file is None or _file.path != path:
+        _file = _RotatingFile(path)
+    try:
+        _file.write(data)
+    except OSError as e:
+        STATS["errors"] += 1
+        STATS["dropped"] += n
+        print(f"⚠️  访问日志写入失败 {path}: {e}")
+        return 0
+    elapsed = time.perf_counter() - start
+    STATS["written"] += n
+    STATS["flushes"] += 1
+    STATS["bytes_written"] += len(data)
+    STATS["last_flush_records"] = n
+    STATS["last_flush_ms"] = round(elapsed * 1000, 3)
+    STATS["records_per_sec"] = round(n / elapsed) if elapsed else None
+    return n
+
+
+def stats():
+    return {"dir": ACCESS_LOG_DIR, "pending": len(_queue), "capacity": ACCESS_LOG_QUEUE, **STATS}
+
+
+def _flush_loop():
+    while True:
+        time.sleep(ACCESS_LOG_FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception as e:  # 后台线程不能退出，否则队列会一直满
+            STATS["errors"] += 1
+            print(f"⚠️  访问日志后台写入异常: {e}")
+
+
+_writer_pid = None
+
+
+def start_writer():
+    """启动后台写入线程（每个进程一个，仅在设置了 ACCESS_LOG_DIR 与 ACCESS_LOG_SALT 时启用）"""
+    global _writer_pid
+    if ACCESS_LOG_DIR and not ACCESS_LOG_SALT:
+        print("⚠️  已设置 ACCESS_LOG_DIR 但未设置 ACCESS_LOG_SALT：号码哈希可被穷举还原，审计访问日志未启用！"
+              "请为所有 worker 配置同一个足够长的随机盐值")
+        return
+    if not enabled() or _writer_pid == os.getpid():
+        return
+    _writer_pid = os.getpid()
+    # fork 继承的队列属于父进程，worker 从空队列开始
+    _queue.clear()
+    threading.Thread(target=_flush_loop, name="access-log-writer", daemon=True).start()
@@ -1,9 +1,31 @@
 # 手机号归属地查询 API - 完整生产版（兼容 Python 3.12 + Flask 3.0.3）
 import os
-import csv
+import io
 import re
+import csv
+import hmac
 import json
-from flask import Flask, request, Response
+import time
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qsl
+from flask import Flask, request, Response, g, stream_with_context
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import HTTP_STATUS_CODES, parse_accept_header, parse_etags
+
+import accesslog
+import bulk
+import compact
+import compress
+import metrics
+import profiling
+import ratelimit
+import seg_index
+import seg_lookup
+import snapshot
 
 # ---------------------- 初始化 Flask 应用 ----------------------
 app = Flask(__name__)
@@ -13,102 +35,232 @@ from flask_cors import CORS
 CORS(app, resources=r'/*')
 
 # ---------------------- 自定义 JSON 响应（确保 UTF-8 中文）----------------------
+def dump_json(data):
+    """序列化为紧凑 JSON 字符串，不转义中文"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+JSON_MIMETYPE = "application/json; charset=utf-8"
+
 def json_response(data, status=200):
     """返回 UTF-8 编码的 JSON 响应，不转义中文"""
     return Response(
-        json.dumps(data, ensure_ascii=False, separators=(',', ':')),
+        dump_json(data),
         status=status,
-        mimetype='application/json; charset=utf-8'
+        mimetype=JSON_MIMETYPE
     )
 
-# ---------------------- 路径配置 ----------------------
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-LOCAL_ROOT = os.path.join(BASE_DIR, "city")
-
-SEG_MAP = {}          # {七位号段: (城市, 运营商)}
-SEG_PREFIX_MAP = {}   # {三位前缀: (城市, 运营商)}
-
-# ---------------------- 数据加载函数（完全保留你的逻辑）----------------------
-def load_seg_data():
-    """从 city/ 目录递归加载所有 CSV/TSV 号段文件"""
-    print("=" * 60)
-    print("🚀 开始加载手机号段数据...")
-    print(f"📁 数据目录: {LOCAL_ROOT}")
-
-    if not os.path.exists(LOCAL_ROOT):
-        print("❌ 错误: city/ 目录不存在！请确保它与 api.py 在同一目录。")
-        return
-
-    city_folders = [f for f in os.listdir(LOCAL_ROOT) if os.path.isdir(os.path.join(LOCAL_ROOT, f))]
-    print(f"✅ 发现 {len(city_folders)} 个城市文件夹")
-
-    total_loaded = 0
-    for city in city_folders:
-        city_path = os.path.join(LOCAL_ROOT, city)
-        csv_files = [f for f in os.listdir(city_path) if f.endswith(".csv")]
-        
-        for csv_file in csv_files:
-            file_path = os.path.join(city_path, csv_file)
-            try:
-                # 自动检测分隔符：优先 \t，其次 ,
-                with open(file_path, "r", encoding="utf-8-sig", errors="ignore") as f:
-                    first_line = f.readline().strip()
-                    delimiter = "\t" if "\t" in first_line else ","
-                    f.seek(0)
-
-                    reader = csv.DictReader(f, delimiter=delimiter)
-                    headers = reader.fieldnames
-                    if not headers:
-                        continue
-
-                    # 从文件名提取运营商
-                    operator = ""
-                    if "移动" in csv_file:
-                        operator = "移动"
-                    elif "电信" in csv_file:
-                        operator = "电信"
-                    elif "联通" in csv_file:
-                        operator = "联通"
-                    elif "广电" in csv_file:
-                        operator = "广电"
-
-                    if not operator:
-                        print(f"⚠️  跳过文件（无法识别运营商）: {csv_file}")
-                        continue
-
-                    # 解析每一行的号段列
-                    for row in reader:
-                        for col in headers:
-                            if col in ["省份", "运营商"]:
-                                continue
-                            seg_value = str(row.get(col, "")).strip()
-                            if (
-                                seg_value.isdigit()
-                                and len(seg_value) == 7
-                                and seg_value[0] == '1'
-                                and seg_value[1] in '3456789'
-                            ):
-                                SEG_MAP[seg_value] = (city, operator)
-                                SEG_PREFIX_MAP[seg_value[:3]] = (city, operator)
-                                total_loaded += 1
-
-            except Exception as e:
-                print(f"❌ 加载失败 {file_path}: {e}")
-
-    print(f"✅ 数据加载完成！共加载 {total_loaded} 个号段")
-    print(f"   - 7位号段: {len(SEG_MAP)}")
-    print(f"   - 3位前缀: {len(SEG_PREFIX_MAP)}")
-    print("=" * 60)
+# ---------------------- 配置 ----------------------
+# 号段数据的加载、热更新与查询逻辑在 seg_lookup 中（不依赖 Flask），这里只做 HTTP 封装
+BASE_DIR = seg_lookup.BASE_DIR
+LOCAL_ROOT = seg_lookup.LOCAL_ROOT
+
+# 批量查询单次最多号码数
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "10000"))
+# 批量查询请求体的字节上限（默认每个号码 64 字节，足够容纳引号、逗号与缩进）；
+# 在读取与解析请求体之前按 Content-Length 拒绝，超大请求不会被完整缓冲
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", "0")) or BATCH_MAX_SIZE * 64
+
+MSG_INVALID_PHONE = seg_lookup.MSG_INVALID_PHONE
+MSG_NOT_FOUND = seg_lookup.MSG_NOT_FOUND
+
+# ---------------------- 预序列化响应 ----------------------
+# 完整响应 LRU 缓存容量（按手机号），0 表示关闭
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "0"))
+# 查询结果的 Cache-Control max-age（秒），0 表示不下发缓存头
+RESPONSE_MAX_AGE = int(os.environ.get("RESPONSE_MAX_AGE", "300"))
+# 首页等静态资源的 Cache-Control max-age（秒）
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", "3600"))
+
+BODY_INVALID_PHONE = dump_json({"code": 400, "msg": MSG_INVALID_PHONE, "data": None})
+BODY_NOT_FOUND = dump_json({"code": 404, "msg": MSG_NOT_FOUND, "data": None})
+BODY_THROTTLED = dump_json({"code": 429, "msg": "请求过于频繁，请稍后再试", "data": None})
+# 错误响应体固定不变，预先编码，拒绝请求时不再序列化
+_ERROR_PAYLOADS = {400: BODY_INVALID_PHONE.encode("utf-8"), 404: BODY_NOT_FOUND.encode("utf-8")}
+_THROTTLED_PAYLOAD = BODY_THROTTLED.encode("utf-8")
+# 成功响应 = _BODY_OK_HEAD + 手机号 + _BODY_OK_SEG + 号段 + 号段类型片段 + 归属地片段
+_BODY_OK_HEAD = '{"code":200,"msg":"查询成功","data":{"phone":"'
+_BODY_OK_SEG = '","seg":"'
+_BODY_SEG_TYPES = {n: f'","seg_type":"{seg_type}"' for n, seg_type in seg_lookup.SEG_TYPES.items()}
+
+def _location_tail(loc, confidence=None):
+    """归属地片段：,"city":"..","operator":".."}} ，与 dump_json 的输出逐字节一致；前缀回退时追加 confidence"""
+    fields = {"city": loc[0], "operator": loc[1]}
+    if confidence is not None:
+        fields["confidence"] = confidence
+    return "," + dump_json(fields)[1:] + "}"
+
+def prepare_responses(data):
+    """加载完成后为每个归属地、每个 (归属地, 前缀置信度) 组合预先序列化响应片段"""
+    locations = data.seg_map.locations
+    prefix_tails = {}
+    for code, pct in set(zip(data.prefixes.match_codes, data.prefixes.match_conf)):
+        if code:
+            prefix_tails[(code, pct)] = _location_tail(locations[code - 1], pct / 100)
+    data.responses = ([_location_tail(loc) for loc in locations], prefix_tails)
+
+class LRUCache:
+    """按手机号缓存完整响应的有界 LRU，数据版本变化时整体失效"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self.version:
+                self._items.clear()
+                self.version = version
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, version, value):
+        with self._lock:
+            if version != self.version:
+                return
+            self._items[key] = value
+            if len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+RESPONSE_CACHE = LRUCache(RESPONSE_CACHE_SIZE) if RESPONSE_CACHE_SIZE > 0 else None
+
+# ---------------------- 限流 ----------------------
+# 查询接口按客户端限流（RATE_LIMIT_RPS 等配置见 ratelimit.py），None 表示关闭
+LIMITER = ratelimit.from_env()
+
+def throttle(remote_addr, forwarded_for=None):
+    """对查询请求限流：放行返回 None，否则返回 Retry-After 秒数（字符串）"""
+    limiter = LIMITER
+    if limiter is None:
+        return None
+    wait = limiter.acquire(ratelimit.client_key(remote_addr, forwarded_for))
+    if not wait:
+        return None
+    metrics.inc("rate_limited_total")
+    return ratelimit.retry_after(wait)
+
+def throttled_response(retry_after):
+    """429 响应（预先编码的固定响应体）"""
+    return Response(_THROTTLED_PAYLOAD, status=429, headers=[("Retry-After", retry_after)], mimetype=JSON_MIMETYPE)
+
+# ---------------------- 紧凑二进制格式协商 ----------------------
+def wants_binary(accept):
+    """Accept 中紧凑二进制格式的优先级高于 JSON 时返回 True（同等优先级仍返回 JSON）"""
+    if not accept or compact.MEDIA_TYPE not in accept:
+        return False
+    best = parse_accept_header(accept, MIMEAccept).best_match(("application/json", compact.MEDIA_TYPE))
+    return best == compact.MEDIA_TYPE
+
+# ---------------------- 热更新配置 ----------------------
+# 管理口令（请求头 X-Admin-Token）：未设置时 /api/admin/* 不可用
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# 请求调用栈抽样分析（PROFILE_SAMPLE_RATE 或 /api/admin/profile 开启），每个 worker 各自累计与输出
+PROFILER = profiling.SamplingProfiler()
+
+def process_memory():
+    """读取当前进程的 RSS 与 PSS（字节），PSS 按共享进程数均摊共享页；非 Linux 平台返回 None"""
+    usage = {"rss_bytes": None, "pss_bytes": None}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    usage["rss_bytes"] = int(line.split()[1]) * 1024
+                    break
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    usage["pss_bytes"] = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    return usage
 
 # ---------------------- ✅ 关键：在模块顶层调用数据加载 ----------------------
-load_seg_data()
+def start_background_threads():
+    """启动每个进程的后台线程（gunicorn preload 模式需在 post_fork 中再调用一次）"""
+    seg_lookup.start_reload_watcher()
+    seg_lookup.start_warmup()
+    metrics.start_flusher()
+    accesslog.start_writer()
+
+# 号段数据加载、热更新的日志输出到 stderr（与 gunicorn 日志一致）；已配置过日志时不覆盖
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+seg_lookup.add_activate_hook(prepare_responses)
+seg_lookup.get_data()
+start_background_threads()
+
+# ---------------------- 请求指标 ----------------------
+@app.before_request
+def _metrics_start():
+    g.metrics_start = time.perf_counter()
+
+# 写入审计访问日志的查询路由
+ACCESS_LOG_ROUTES = ("/api/phone/location", "/api/phone/location/batch", "/api/phone/location/stream")
+
+@app.after_request
+def _metrics_record(response):
+    start = g.get("metrics_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        elapsed = time.perf_counter() - start
+        metrics.record_request(route, response.status_code, elapsed)
+        if accesslog.enabled() and route in ACCESS_LOG_ROUTES:
+            phone = None
+            if route == "/api/phone/location":
+                phone = request.args.get("phone", "").strip() or request.form.get("phone", "").strip()
+            client = ratelimit.client_key(request.remote_addr, request.headers.get("X-Forwarded-For"))
+            accesslog.record(route, request.method, response.status_code, elapsed, client, phone,
+                             g.get("lookup_path"))
+    return response
+
+# ---------------------- 响应压缩 ----------------------
+def compressed_body(body, accept_encoding):
+    """较大的响应体按 Accept-Encoding 即时压缩，返回 (响应体, 额外响应头)；小于阈值时原样返回"""
+    if len(body) < compress.COMPRESS_MIN_BYTES:
+        return body, []
+    encoding = compress.choose_encoding(accept_encoding)
+    if encoding is None:
+        return body, [("Vary", "Accept-Encoding")]
+    return compress.compress(body, encoding), [("Content-Encoding", encoding), ("Vary", "Accept-Encoding")]
+
+@app.after_request
+def _compress_response(response):
+    """压缩较大的非流式 200 响应（批量查询、解码表、范围查询、指标等）；已编码或流式的响应不处理"""
+    if response.status_code != 200 or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+    body, headers = compressed_body(response.get_data(), request.headers.get("Accept-Encoding"))
+    if headers:
+        response.set_data(body)
+        for name, value in headers:
+            # 视图已声明 Vary: Accept-Encoding（如预压缩的首页）时不再重复添加
+            if name == "Vary" and value.lower() in response.vary:
+                continue
+            response.headers.add(name, value)
+    return response
 
 # ---------------------- API 路由 ----------------------
 
-@app.route("/")
-def index():
-    """根路径：显示美化后的欢迎页面（带查询功能）"""
-    return """
+# 首页 HTML（带在线查询功能）
+INDEX_HTML = """
     <!DOCTYPE html>
     <html lang="zh-CN">
     <head>
@@ -470,10 +622,35 @@ def index():
                         <strong>查询接口</strong>
                         <code>GET /api/phone/location?phone=13800138000</code>
                     </li>
+                    <li>
+                        <strong>批量查询接口</strong>
+                        <code>POST /api/phone/location/batch  ["13800138000", "13912345678"]</code>
+                    </li>
+                    <li>
+                        <strong>流式补全接口（CSV / NDJSON 上传）</strong>
+                        <code>POST /api/phone/location/stream?format=csv&amp;column=phone&amp;summary=1</code>
+                    </li>
+                    <li>
+                        <strong>号段范围查询</strong>
+                        <code>GET /api/segments/range?start=1380000&amp;end=1389999&amp;offset=0&amp;limit=100</code>
+                    </li>
+                    <li>
+                        <strong>号段反向索引 / 聚合统计</strong>
+                        <code>GET /api/segments?city=广东&amp;operator=移动&amp;prefix=138&amp;offset=0&amp;limit=100</code>
+                        <code>GET /api/segments/stats?group_by=city,operator,prefix</code>
+                    </li>
+                    <li>
+                        <strong>归属地解码表（紧凑二进制格式用，Accept: application/x-phone-location）</strong>
+                        <code>GET /api/locations</code>
+                    </li>
                     <li>
                         <strong>健康检查</strong>
                         <code>GET /api/health</code>
                     </li>
+                    <li>
+                        <strong>就绪探针</strong>
+                        <code>GET /api/ready</code>
+                    </li>
                 </ul>
             </div>
 
@@ -571,63 +748,637 @@ def index():
     </html>
     """
 
-@app.route("/api/health")
-def health_check():
-    """健康检查接口"""
-    return json_response({
+# 首页在启动时预压缩，按 Accept-Encoding 返回对应版本
+INDEX_ASSET = compress.StaticAsset(INDEX_HTML.encode("utf-8"), "text/html; charset=utf-8")
+
+def static_asset_payload(asset, accept_encoding, if_none_match):
+    """静态资源响应，返回 (HTTP 状态码, 响应体, 响应头)；If-None-Match 命中所选版本的 ETag 时返回 304"""
+    encoding, body, etag = asset.select(accept_encoding)
+    headers = [("ETag", f'"{etag}"'), ("Cache-Control", f"public, max-age={STATIC_MAX_AGE}"),
+               ("Vary", "Accept-Encoding")]
+    if if_none_match and parse_etags(if_none_match).contains(etag):
+        return 304, b"", headers
+    if encoding is not None:
+        headers.append(("Content-Encoding", encoding))
+    return 200, body, headers
+
+@app.route("/")
+def index():
+    """根路径：显示美化后的欢迎页面（带查询功能）"""
+    status, body, headers = static_asset_payload(
+        INDEX_ASSET, request.headers.get("Accept-Encoding"), request.headers.get("If-None-Match"))
+    if status == 304:
+        return Response(status=304, headers=headers)
+    return Response(body, headers=headers, content_type=INDEX_ASSET.mimetype)
+
+def health_payload():
+    """健康检查响应内容"""
+    data = seg_lookup.get_data()
+    return {
         "status": "ok",
         "service": "phone-location-api",
-        "data_loaded": len(SEG_MAP) > 0,
-        "seg_7_count": len(SEG_MAP),
-        "seg_3_count": len(SEG_PREFIX_MAP),
+        "data_loaded": len(data.seg_map) > 0,
+        "data_version": data.version,
+        "data_source": data.source,
+        "data_loaded_at": int(data.loaded_at),
+        # 多节点核对：同一版本的内容摘要必须相同
+        "snapshot": {"version": data.version, "content_hash": data.content_hash,
+                     "sync": snapshot.stats() if snapshot.enabled() else None},
+        "reload": seg_lookup.RELOAD_STATE,
+        "seg_7_count": len(data.seg_map),
+        "seg_3_count": data.prefixes.count(3),
+        "prefix_count": len(data.prefixes),
+        "seg_map_bytes": data.seg_map.nbytes,
+        "seg_map_shared": data.seg_map.shared,
+        "seg_range_count": len(data.ranges) if data.ranges is not None else 0,
+        "seg_range_bytes": data.ranges.nbytes if data.ranges is not None else 0,
+        "response_cache": RESPONSE_CACHE.stats() if RESPONSE_CACHE is not None else None,
+        "ported": seg_lookup.PORTED.stats() if seg_lookup.PORTED is not None else None,
+        "rate_limit": LIMITER.stats() if LIMITER is not None else None,
+        "access_log": accesslog.stats() if accesslog.enabled() else None,
+        **process_memory(),
         "message": "服务正常运行中"
-    })
+    }
+
+@app.route("/api/health")
+def health_check():
+    """健康检查接口"""
+    return json_response(health_payload())
+
+def ready_payload(require_warm=False):
+    """就绪探针响应，返回 (响应内容, HTTP 状态码)；require_warm 时全部分片预热完成才算就绪"""
+    state = seg_lookup.readiness()
+    ready = state["ready"] and (state["warm"] or not require_warm)
+    return {
+        "code": 200 if ready else 503,
+        "msg": "服务已就绪" if ready else "号段数据加载中",
+        "data": state
+    }, 200 if ready else 503
+
+@app.route("/api/ready")
+def ready_check():
+    """就绪探针：数据可用返回 200，否则 503；?warm=1 时要求全部分片预热完成"""
+    return json_response(*ready_payload(request.args.get("warm") == "1"))
+
+def locate_phone(phone):
+    """查询单个手机号，返回 (响应内容, HTTP 状态码)"""
+    result = seg_lookup.lookup(phone)
+    return {
+        "code": result["code"],
+        "msg": result["msg"],
+        "data": result["data"]
+    }, result["code"]
+
+def locate_phone_json(phone):
+    """查询单个手机号，返回 (JSON 响应体, HTTP 状态码, 查询路径)；用预序列化片段拼接，结果与 locate_phone 逐字节一致
+
+    查询路径见 seg_lookup.lookup_path，写入审计访问日志。
+
+    格式错误的号码在读取数据与缓存之前直接拒绝；缓存只保存命中结果，随机号码刷出的 404 不会挤掉正常条目。
+    """
+    if not seg_lookup.PHONE_PATTERN.fullmatch(phone):
+        metrics.inc("lookup_results_total", seg_lookup.RESULT_INVALID)
+        return BODY_INVALID_PHONE, 400, "invalid"
+    data = seg_lookup.get_data()
+    cache = RESPONSE_CACHE
+    version = seg_lookup.version_tag(data)
+    if cache is not None:
+        cached = cache.get(phone, version)
+        if cached is not None:
+            metrics.inc("lookup_results_total", cached[2])
+            return cached[0], cached[1], cached[3]
+
+    status, seg, code, pct, override = seg_lookup.resolve(phone, data)
+    path = seg_lookup.lookup_path(status, seg, override)
+    if status == 400:
+        return BODY_INVALID_PHONE, 400, path
+    if status == 404:
+        body, label = BODY_NOT_FOUND, seg_lookup.RESULT_MISS
+    elif override is not None:
+        # 携号转网号码很少，直接完整序列化
+        result = seg_lookup.build_result(phone, seg, data.seg_map.locations[code - 1], pct, override)
+        body = dump_json({"code": 200, "msg": seg_lookup.MSG_OK, "data": result})
+        label = seg_lookup.RESULT_SEG7 if pct is None else seg_lookup.RESULT_PREFIX
+    else:
+        loc_tails, prefix_tails = data.responses
+        tail = loc_tails[code - 1] if pct is None else prefix_tails[(code, pct)]
+        body = _BODY_OK_HEAD + phone + _BODY_OK_SEG + seg + _BODY_SEG_TYPES[len(seg)] + tail
+        label = seg_lookup.RESULT_SEG7 if pct is None else seg_lookup.RESULT_PREFIX
+
+    if cache is not None and status == 200:
+        cache.put(phone, version, (body, status, label, path))
+    return body, status, path
+
+def locate_phone_payload(phone, binary=False):
+    """查询单个手机号，返回 (响应体 bytes, HTTP 状态码, Content-Type, 额外响应头, 查询路径)；binary 时为紧凑二进制记录"""
+    if not binary:
+        body, status, path = locate_phone_json(phone)
+        payload = _ERROR_PAYLOADS[status] if status != 200 else body.encode("utf-8")
+        return payload, status, JSON_MIMETYPE, [], path
+    data = seg_lookup.get_data()
+    resolved = seg_lookup.resolve(phone, data)
+    body = compact.encode((resolved,), data.seg_map.locations)
+    path = seg_lookup.lookup_path(resolved[0], resolved[1], resolved[4])
+    return body, resolved[0], compact.MEDIA_TYPE, [("X-Data-Version", data.version or "")], path
+
+def location_cache_headers(phone, status, binary=False):
+    """单号查询的缓存头，返回 (不带引号的 ETag 或 None, 响应头列表)
+
+    200/404 下发 Cache-Control 与 Vary: Accept，200 另带强 ETag（数据版本 + 手机号，号段或携号转网数据更新后
+    自动变化；二进制格式另加后缀，与 JSON 表示区分）。
+    """
+    if status == 400 or RESPONSE_MAX_AGE <= 0:
+        return None, []
+    headers = [("Cache-Control", f"public, max-age={RESPONSE_MAX_AGE}"), ("Vary", "Accept")]
+    if status != 200:
+        return None, headers
+    etag = f"{seg_lookup.version_tag(seg_lookup.get_data())}-{phone}"
+    if binary:
+        etag += ".bin"
+    return etag, [("ETag", f'"{etag}"')] + headers
 
 @app.route("/api/phone/location", methods=["GET", "POST"])
 def phone_location():
     """手机号归属地查询接口"""
+    retry_after = throttle(request.remote_addr, request.headers.get("X-Forwarded-For"))
+    if retry_after is not None:
+        return throttled_response(retry_after)
     phone = (
         request.args.get("phone", "").strip()
         or request.form.get("phone", "").strip()
     )
+    binary = wants_binary(request.headers.get("Accept"))
+    body, status, mimetype, extra, g.lookup_path = locate_phone_payload(phone, binary)
+    if request.method == "POST":
+        return Response(body, status=status, headers=extra, mimetype=mimetype)
+
+    etag, headers = location_cache_headers(phone, status, binary)
+    if etag is not None and request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    return Response(body, status=status, headers=headers + extra, mimetype=mimetype)
+
+# 批量查询（bulk / asgi 共用）；结果每项的 code/msg/data 与单号查询接口一致
+lookup_batch = seg_lookup.lookup_many
+
+def parse_batch_body(body, is_json=False):
+    """解析批量请求体：JSON 数组、{"phones": [...]} 或每行一个号码的纯文本，失败返回 None"""
+    if is_json or body.lstrip()[:1] in ("[", "{"):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None
+        if isinstance(payload, dict):
+            payload = payload.get("phones")
+        return payload if isinstance(payload, list) else None
+    return [line for line in body.splitlines() if line.strip()]
 
-    if not re.match(r"^1[3-9]\d{9}$", phone):
+def batch_too_large():
+    """请求体超过 BATCH_MAX_BYTES 时的 413 响应内容"""
+    return {
+        "code": 413,
+        "msg": f"请求体不能超过 {BATCH_MAX_BYTES} 字节（单次最多查询 {BATCH_MAX_SIZE} 个手机号）",
+        "data": None
+    }, 413
+
+def read_batch_body():
+    """读取批量请求体（文本），超过 BATCH_MAX_BYTES 时返回 None
+
+    先看 Content-Length，没有时（分块上传）最多读 BATCH_MAX_BYTES + 1 字节即停止。
+    """
+    if request.content_length is not None and request.content_length > BATCH_MAX_BYTES:
+        return None
+    body = request.stream.read(BATCH_MAX_BYTES + 1)
+    if len(body) > BATCH_MAX_BYTES:
+        return None
+    return body.decode("utf-8", "replace")
+
+def batch_error(phones):
+    """批量请求体校验，返回 (错误响应内容, HTTP 状态码)，请求有效时返回 None"""
+    if phones is None:
+        return {
+            "code": 400,
+            "msg": "请求体应为 JSON 数组、{\"phones\": [...]} 或每行一个手机号",
+            "data": None
+        }, 400
+
+    if len(phones) > BATCH_MAX_SIZE:
+        return {
+            "code": 413,
+            "msg": f"单次最多查询 {BATCH_MAX_SIZE} 个手机号",
+            "data": None
+        }, 413
+    return None
+
+def locate_batch_binary(phones):
+    """批量查询并编码为紧凑二进制记录，返回 (响应体 bytes, 数据版本)；phones 需先经 batch_error 校验"""
+    data = seg_lookup.get_data()
+    resolve = seg_lookup.resolve
+    resolved = (resolve(str(p).strip() if p is not None else "", data) for p in phones)
+    return compact.encode(resolved, data.seg_map.locations), data.version or ""
+
+def locate_batch(phones):
+    """批量查询，phones 为 parse_batch_body 的结果，返回 (响应内容, HTTP 状态码)"""
+    error = batch_error(phones)
+    if error is not None:
+        return error
+
+    results = lookup_batch(phones)
+    return {
+        "code": 200,
+        "msg": "查询成功",
+        "data": {
+            "total": len(results),
+            "found": sum(1 for r in results if r["code"] == 200),
+            "results": results
+        }
+    }, 200
+
+@app.route("/api/phone/location/batch", methods=["POST"])
+def phone_location_batch():
+    """批量手机号归属地查询接口"""
+    retry_after = throttle(request.remote_addr, request.headers.get("X-Forwarded-For"))
+    if retry_after is not None:
+        return throttled_response(retry_after)
+    body = read_batch_body()
+    if body is None:
+        return json_response(*batch_too_large())
+    phones = parse_batch_body(body, request.is_json)
+    if wants_binary(request.headers.get("Accept")) and batch_error(phones) is None:
+        body, version = locate_batch_binary(phones)
+        return Response(body, headers=[("X-Data-Version", version)], mimetype=compact.MEDIA_TYPE)
+    return json_response(*locate_batch(phones))
+
+def locations_payload():
+    """归属地解码表响应内容（紧凑二进制格式中的归属地编号、运营商编号）"""
+    return {"code": 200, "msg": "查询成功", "data": compact.location_dictionary(seg_lookup.get_data())}
+
+@app.route("/api/locations")
+def locations():
+    """归属地解码表接口：客户端按 version 缓存，二进制响应的 X-Data-Version 变化时重新获取"""
+    return json_response(locations_payload())
+
+def stream_summary(fmt, stats, error=None):
+    """流式补全结束后追加给客户端的统计行：NDJSON 为 {"summary": {...}} 对象，CSV 为 # 开头的注释行"""
+    summary = stats.as_dict()
+    if error is not None:
+        summary["error"] = error
+    if fmt == "ndjson":
+        return dump_json({"summary": summary}) + "\n"
+    return "# " + dump_json(summary) + "\n"
+
+@app.route("/api/phone/location/stream", methods=["POST"])
+def phone_location_stream():
+    """流式批量补全接口：上传 CSV / NDJSON，逐行查询并以分块响应返回补全后的数据；
+    summary=1 时在末尾追加一行处理统计（行数、命中数、耗时与吞吐量，中途出错时带 error）"""
+    fmt = request.args.get("format") or (
+        "ndjson" if "ndjson" in (request.mimetype or "") or "jsonl" in (request.mimetype or "") else "csv"
+    )
+    if fmt not in bulk.ENRICHERS:
         return json_response({
             "code": 400,
-            "msg": "请输入11位有效手机号（13/14/15/17/18/19开头）",
+            "msg": "format 仅支持 csv 或 ndjson",
             "data": None
         }, 400)
 
-    seg_7 = phone[:7]
-    seg_3 = phone[:3]
+    column = request.args.get("column") or None
+    with_summary = request.args.get("summary") == "1"
+    lines = io.TextIOWrapper(io.BufferedReader(request.stream), encoding="utf-8-sig", errors="replace", newline="")
+    if fmt == "csv":
+        # 响应开始后就无法再返回错误状态码：先读表头确认号码列存在，再开始流式输出
+        first = lines.readline()
+        if first:
+            try:
+                bulk.find_column(next(csv.reader([first]), []), column)
+            except ValueError as e:
+                return json_response({"code": 400, "msg": str(e), "data": None}, 400)
+            lines = itertools.chain([first], lines)
+    stats = bulk.BulkStats()
+
+    def generate():
+        error = None
+        try:
+            yield from bulk.ENRICHERS[fmt](lines, lookup_batch, column, stats)
+        except ValueError as e:
+            error = str(e)
+            stats.finish()
+            print(f"⚠️  流式查询中止: {e}")
+        else:
+            print(f"📊 流式查询完成（{fmt}）: {stats.summary()}")
+        if with_summary:
+            yield stream_summary(fmt, stats, error)
 
-    if seg_7 in SEG_MAP:
-        city, operator = SEG_MAP[seg_7]
-        result = {
-            "phone": phone,
-            "seg": seg_7,
-            "seg_type": "7位号段",
-            "city": city,
-            "operator": operator
+    content_type = ("application/x-ndjson" if fmt == "ndjson" else "text/csv") + "; charset=utf-8"
+    encoding = compress.choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding is None:
+        return Response(stream_with_context(generate()), content_type=content_type)
+    chunks = compress.compress_stream((text.encode("utf-8") for text in generate()), encoding)
+    return Response(stream_with_context(chunks), headers=[("Content-Encoding", encoding), ("Vary", "Accept-Encoding")],
+                    content_type=content_type)
+
+def segment_range(start, end, prefix, offset="", limit=""):
+    """号段范围查询：返回 [start, end]（或某个 3~7 位前缀覆盖的范围）内各区间的归属地（按起点分页）
+    与按归属地汇总的号段数（取自 SegStats 反向索引，不随范围大小增长）"""
+    if prefix:
+        if not re.match(r"^1[3-9]\d{1,5}$", prefix):
+            return {"code": 400, "msg": "prefix 应为 1[3-9] 开头的 3~7 位数字", "data": None}, 400
+        pad = 7 - len(prefix)
+        start, end = prefix + "0" * pad, prefix + "9" * pad
+    if not (re.match(r"^1[3-9]\d{5}$", start or "") and re.match(r"^1[3-9]\d{5}$", end or "")):
+        return {"code": 400, "msg": "请提供 7 位号段 start 与 end，或 3~7 位前缀 prefix", "data": None}, 400
+    start, end = int(start), int(end)
+    if start > end:
+        return {"code": 400, "msg": "start 不能大于 end", "data": None}, 400
+    page = _page_params(offset, limit)
+    if page is None:
+        return {"code": 400, "msg": "offset / limit 应为非负整数", "data": None}, 400
+    offset, limit = page
+
+    total, ranges = seg_lookup.get_ranges().query(start, end, offset, limit)
+    totals = seg_lookup.get_stats().totals(start, end)
+    return {
+        "code": 200,
+        "msg": "查询成功",
+        "data": {
+            "start": str(start),
+            "end": str(end),
+            "segments": sum(count for _, count in totals),
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "ranges": [
+                {"start": str(lo), "end": str(hi), "count": hi - lo + 1, "city": loc[0], "operator": loc[1]}
+                for lo, hi, loc in ranges
+            ],
+            "locations": [
+                {"city": loc[0], "operator": loc[1], "segments": count}
+                for loc, count in totals
+            ]
         }
-    elif seg_3 in SEG_PREFIX_MAP:
-        city, operator = SEG_PREFIX_MAP[seg_3]
-        result = {
-            "phone": phone,
-            "seg": seg_3,
-            "seg_type": "3位前缀",
+    }, 200
+
+@app.route("/api/segments/range")
+def segments_range():
+    """号段范围查询接口：哪些省份/运营商拥有某个号段范围（区间列表分页）"""
+    return json_response(*segment_range(
+        request.args.get("start", "").strip(),
+        request.args.get("end", "").strip(),
+        request.args.get("prefix", "").strip(),
+        request.args.get("offset", "").strip(),
+        request.args.get("limit", "").strip(),
+    ))
+
+# 号段列表、范围查询与聚合统计的分页上限
+PAGE_MAX_SIZE = int(os.environ.get("PAGE_MAX_SIZE", "1000"))
+
+def _page_params(offset, limit, default_limit=100):
+    """解析分页参数，返回 (offset, limit)，无效时返回 None"""
+    if not (offset or "0").isdigit() or not (limit or str(default_limit)).isdigit():
+        return None
+    return int(offset or 0), min(int(limit or default_limit), PAGE_MAX_SIZE)
+
+def _stats_filters(city, operator, prefix):
+    """解析归属地/运营商/三位前缀筛选条件，返回 (city, operator, prefix) 或错误响应"""
+    if prefix and not re.match(r"^1[3-9]\d$", prefix):
+        return None, ({"code": 400, "msg": "prefix 应为 1[3-9] 开头的 3 位数字", "data": None}, 400)
+    if operator:
+        operator = operator.removeprefix("中国")
+    return (city or None, operator or None, prefix or None), None
+
+def segment_list(city, operator, prefix, offset, limit):
+    """反向索引查询：按归属地（省份/城市）、运营商、三位前缀列出七位号段，按归属地编号、号段升序分页"""
+    filters, error = _stats_filters(city, operator, prefix)
+    if error:
+        return error
+    page = _page_params(offset, limit)
+    if page is None:
+        return {"code": 400, "msg": "offset / limit 应为非负整数", "data": None}, 400
+    city, operator, prefix = filters
+    offset, limit = page
+
+    stats = seg_lookup.get_stats()
+    if prefix:
+        start = int(prefix) * seg_index.SHARD_WIDTH
+        end = start + seg_index.SHARD_WIDTH - 1
+    else:
+        start, end = seg_index.SEG_BASE, seg_index.SEG_BASE + seg_index.SEG_SPAN - 1
+    total, segments = stats.segments(stats.codes(city, operator), start, end, offset, limit)
+    return {
+        "code": 200,
+        "msg": "查询成功",
+        "data": {
             "city": city,
-            "operator": operator
+            "operator": operator,
+            "prefix": prefix,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "segments": [str(seg) for seg in segments]
         }
-    else:
-        return json_response({
-            "code": 404,
-            "msg": "未查询到该号段归属地",
-            "data": None
-        }, 404)
+    }, 200
 
-    return json_response({
+@app.route("/api/segments")
+def segments_list():
+    """号段反向索引接口：某省份/运营商/三位前缀下的全部号段（分页）"""
+    return json_response(*segment_list(
+        request.args.get("city", "").strip(),
+        request.args.get("operator", "").strip(),
+        request.args.get("prefix", "").strip(),
+        request.args.get("offset", "").strip(),
+        request.args.get("limit", "").strip(),
+    ))
+
+def segment_stats(group_by, city, operator, prefix, offset, limit):
+    """聚合统计：按 city / operator / prefix 任意组合分组的号段数，按号段数降序分页"""
+    group_by = tuple(name.strip() for name in (group_by or "city,operator").split(",") if name.strip())
+    if not group_by or len(set(group_by)) != len(group_by) \
+            or any(name not in seg_index.STATS_GROUPS for name in group_by):
+        return {"code": 400, "msg": "group_by 应为 city、operator、prefix 中的一项或多项（逗号分隔）", "data": None}, 400
+    filters, error = _stats_filters(city, operator, prefix)
+    if error:
+        return error
+    page = _page_params(offset, limit)
+    if page is None:
+        return {"code": 400, "msg": "offset / limit 应为非负整数", "data": None}, 400
+    offset, limit = page
+
+    rows = seg_lookup.get_stats().rollup(group_by, *filters)
+    return {
         "code": 200,
         "msg": "查询成功",
-        "data": result
-    })
+        "data": {
+            "group_by": list(group_by),
+            "total": len(rows),
+            "segments": sum(row[-1] for row in rows),
+            "offset": offset,
+            "limit": limit,
+            "rows": [dict(zip(group_by + ("segments",), row)) for row in rows[offset:offset + limit]]
+        }
+    }, 200
+
+@app.route("/api/segments/stats")
+def segments_stats():
+    """号段聚合统计接口：省份 × 运营商 × 三位前缀的号段数"""
+    return json_response(*segment_stats(
+        request.args.get("group_by", "").strip(),
+        request.args.get("city", "").strip(),
+        request.args.get("operator", "").strip(),
+        request.args.get("prefix", "").strip(),
+        request.args.get("offset", "").strip(),
+        request.args.get("limit", "").strip(),
+    ))
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus 指标（设置 METRICS_DIR 时汇总所有 worker）"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+def admin_denied(feature):
+    """校验管理口令，未通过时返回 403 响应，通过时返回 None"""
+    if not ADMIN_TOKEN:
+        return json_response({"code": 403, "msg": f"未配置 ADMIN_TOKEN，{feature}接口未启用", "data": None}, 403)
+    # 只接受请求头（查询参数会进入访问日志与代理日志），并用定长时间比较防止按响应时间逐位猜测
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        return json_response({"code": 403, "msg": "管理口令错误", "data": None}, 403)
+    return None
+
+@app.route("/api/admin/reload", methods=["POST"])
+def admin_reload():
+    """热更新号段数据：所有 worker 在后台重建数据并原子切换，请求立即返回"""
+    denied = admin_denied("热更新")
+    if denied is not None:
+        return denied
+
+    # 更新触发文件，通知其他 worker；当前 worker 立即开始
+    seg_lookup.touch_reload_stamp()
+    started = seg_lookup.start_reload()
+
+    return json_response({
+        "code": 202,
+        "msg": "已开始热更新" if started else "热更新正在进行中",
+        "data": {"data_version": seg_lookup.get_data().version, "reload": seg_lookup.RELOAD_STATE}
+    }, 202)
+
+@app.route("/api/admin/startup")
+def admin_startup():
+    """号段数据加载的分阶段耗时：首次加载与最近一次加载（含热更新），CSV 解析时附带解析报告（各阶段与每个文件的耗时）"""
+    denied = admin_denied("加载耗时")
+    if denied is not None:
+        return denied
+    seg_lookup.get_data()
+    return json_response({"code": 200, "msg": seg_lookup.MSG_OK, "data": {"pid": os.getpid(), **seg_lookup.load_traces()}})
+
+@app.route("/api/admin/profile", methods=["GET", "POST"])
+def admin_profile():
+    """请求调用栈抽样分析（仅作用于处理本请求的 worker）
+
+    GET 查看状态；POST 参数 rate=0~1 调整抽样比例（0 关闭），action=dump 立即写出折叠栈文件，
+    action=reset 清空已累计的数据。
+    """
+    denied = admin_denied("性能分析")
+    if denied is not None:
+        return denied
+    if request.method == "POST":
+        rate = request.values.get("rate")
+        if rate is not None:
+            try:
+                rate = float(rate)
+            except ValueError:
+                rate = -1.0
+            if not 0 <= rate <= 1:
+                return json_response({"code": 400, "msg": "rate 须为 0~1 之间的数", "data": None}, 400)
+            PROFILER.rate = rate
+        action = request.values.get("action", "")
+        if action == "dump" and PROFILER.dump() is None:
+            return json_response({"code": 500, "msg": "折叠栈文件写入失败", "data": PROFILER.stats()}, 500)
+        if action == "reset":
+            PROFILER.reset()
+    return json_response({"code": 200, "msg": seg_lookup.MSG_OK, "data": {"pid": os.getpid(), **PROFILER.stats()}})
+
+# ---------------------- WSGI 快速通道（可选）----------------------
+# 设置 WSGI_FAST_PATH=1 后，GET/HEAD /api/phone/location 直接从 environ 中处理，
+# 跳过 Flask 的请求上下文、路由匹配、参数解析、flask_cors 钩子与 Response 对象构造；
+# 响应体、状态行与响应头（含 CORS 头与顺序）和 Flask 版本逐字节一致，其余请求原样交给 Flask
+WSGI_FAST_PATH = os.environ.get("WSGI_FAST_PATH", "") == "1"
+
+_FAST_PATH = "/api/phone/location"
+_FAST_STATUS_LINES = {code: f"{code} {HTTP_STATUS_CODES[code].upper()}" for code in (200, 304, 400, 404, 429)}
+
+def _query_phone(query_string):
+    """取 phone 参数，结果与 request.args.get("phone", "") 一致"""
+    if query_string.startswith("phone=") and query_string.isascii() and not any(c in query_string for c in "&%+"):
+        return query_string[6:]
+    pairs = parse_qsl(query_string.encode("latin-1").decode(), keep_blank_values=True, errors="werkzeug.url_quote")
+    for name, value in pairs:
+        if name == "phone":
+            return value
+    return ""
+
+def _fast_cors_headers(environ):
+    """与 flask_cors 默认配置一致：有 Origin 时回显来源并加 Vary: Origin，否则允许 *"""
+    origin = environ.get("HTTP_ORIGIN")
+    if origin:
+        return [("Access-Control-Allow-Origin", origin), ("Vary", "Origin")]
+    return [("Access-Control-Allow-Origin", "*")]
+
+class LocationFastPath:
+    """WSGI 中间件：单号查询 GET/HEAD 请求不经过 Flask，其余请求交给被包装的 wsgi_app"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        if environ.get("PATH_INFO") != _FAST_PATH or method not in ("GET", "HEAD"):
+            return self.wsgi_app(environ, start_response)
+
+        start = time.perf_counter()
+        phone = _query_phone(environ.get("QUERY_STRING", "")).strip()
+        if not phone and environ.get("CONTENT_TYPE"):
+            # phone 不在查询串中时 Flask 会再读取表单，这种少见情况交给 Flask 处理
+            return self.wsgi_app(environ, start_response)
+
+        retry_after = throttle(environ.get("REMOTE_ADDR"), environ.get("HTTP_X_FORWARDED_FOR"))
+        if retry_after is not None:
+            # 被限流的请求不查询，直接返回预先编码的 429
+            headers = [("Retry-After", retry_after), ("Content-Type", JSON_MIMETYPE),
+                       ("Content-Length", str(len(_THROTTLED_PAYLOAD)))]
+            start_response(_FAST_STATUS_LINES[429], headers + _fast_cors_headers(environ))
+            self._record(environ, method, 429, start, phone)
+            return [] if method == "HEAD" else [_THROTTLED_PAYLOAD]
+
+        binary = wants_binary(environ.get("HTTP_ACCEPT"))
+        payload, status, mimetype, extra, path = locate_phone_payload(phone, binary)
+        etag, headers = location_cache_headers(phone, status, binary)
+        if etag is not None and "HTTP_IF_NONE_MATCH" in environ \
+                and parse_etags(environ["HTTP_IF_NONE_MATCH"]).contains(etag):
+            status, payload = 304, b""
+        else:
+            headers += extra
+            headers.append(("Content-Type", mimetype))
+            headers.append(("Content-Length", str(len(payload))))
+        start_response(_FAST_STATUS_LINES[status], headers + _fast_cors_headers(environ))
+        self._record(environ, method, status, start, phone, path)
+        return [] if method == "HEAD" else [payload]
+
+    @staticmethod
+    def _record(environ, method, status, start, phone, path=None):
+        """与 Flask 的 after_request 一致地记录指标与访问日志"""
+        elapsed = time.perf_counter() - start
+        metrics.record_request(_FAST_PATH, status, elapsed)
+        if accesslog.enabled():
+            client = ratelimit.client_key(environ.get("REMOTE_ADDR"), environ.get("HTTP_X_FORWARDED_FOR"))
+            accesslog.record(_FAST_PATH, method, status, elapsed, client, phone, path)
+
+if WSGI_FAST_PATH:
+    app.wsgi_app = LocationFastPath(app.wsgi_app)
+def profile_route(environ):
+    """被抽中请求匹配的路由模板（如 /api/segments/range），未匹配或方法不允许时返回 None"""
+    try:
+        rule, _ = app.url_map.bind_to_environ(environ).match(return_rule=True)
+    except HTTPException:
+        return None
+    return rule.rule
+
+# 最外层：被抽中的请求连同快速通道、Flask 与 flask_cors 一起分析
+app.wsgi_app = profiling.SamplingMiddleware(app.wsgi_app, PROFILER, profile_route)
@@ -0,0 +1,283 @@
+# 手机号归属地查询 API - ASGI 入口（可选）
+#
+# 在 asyncio 事件循环中直接处理查询接口，绕过 Flask/Werkzeug 的同步请求栈，
+# 单进程即可承载大量并发连接。响应内容与 CORS 头和 Flask 版本（flask_cors 默认配置）一致，
+# 首页同样使用预压缩版本，较大的响应同样按 Accept-Encoding 压缩。
+#
+# 启动（需另行安装任一 ASGI 服务器，如 uvicorn）：
+#     uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+#
+# 支持的路由：/、/api/health、/api/ready、/api/phone/location、/api/phone/location/batch、
+# /api/segments、/api/segments/range、/api/segments/stats、/api/locations、/metrics；
+# 流式补全与管理接口仍需通过 WSGI（gunicorn api:app）访问。
+import time
+import contextvars
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+import accesslog
+import api
+import compact
+import compress
+import metrics
+import ratelimit
+
+JSON_TYPE = b"application/json; charset=utf-8"
+BINARY_TYPE = compact.MEDIA_TYPE.encode()
+HTML_TYPE = b"text/html; charset=utf-8"
+CORS_ALLOW_METHODS = b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+
+# ---------------------- 路由处理 ----------------------
+async def handle_index(query, body, headers, method):
+    accept_encoding, if_none_match = headers.get(b"accept-encoding"), headers.get(b"if-none-match")
+    status, payload, extra = api.static_asset_payload(
+        api.INDEX_ASSET,
+        accept_encoding.decode("latin-1") if accept_encoding else None,
+        if_none_match.decode("latin-1") if if_none_match else None)
+    return status, None if status == 304 else HTML_TYPE, payload, _encode_headers(extra)
+
+
+async def handle_health(query, body, headers, method):
+    return 200, JSON_TYPE, api.dump_json(api.health_payload()).encode("utf-8"), []
+
+
+async def handle_ready(query, body, headers, method):
+    payload, status = api.ready_payload(_first(query, "warm") == "1")
+    return status, JSON_TYPE, api.dump_json(payload).encode("utf-8"), []
+
+
+# 单号查询的查询路径（seg7/prefix/...），供审计访问日志使用；每个请求在各自的任务上下文中设置
+_LOOKUP_PATH = contextvars.ContextVar("lookup_path", default=None)
+
+
+async def handle_location(query, body, headers, method):
+    phone = _first(query, "phone")
+    if not phone and headers.get(b"content-type", b"").startswith(b"application/x-www-form-urlencoded"):
+        phone = _first(parse_qs(body.decode("utf-8", "replace")), "phone")
+    binary = _wants_binary(headers)
+    payload, status, mimetype, data_headers, path = api.locate_phone_payload(phone, binary)
+    _LOOKUP_PATH.set(path)
+    data_headers = _encode_headers(data_headers)
+    if method == "POST":
+        return status, mimetype.encode(), payload, data_headers
+
+    etag, cache_headers = api.location_cache_headers(phone, status, binary)
+    extra = _encode_headers(cache_headers)
+    if etag is not None and _etag_matches(headers.get(b"if-none-match"), etag):
+        return 304, None, b"", extra
+    return status, mimetype.encode(), payload, extra + data_headers
+
+
+async def handle_segment_range(query, body, headers, method):
+    names = ("start", "end", "prefix", "offset", "limit")
+    payload, status = api.segment_range(*(_first(query, name) for name in names))
+    return status, JSON_TYPE, api.dump_json(payload).encode("utf-8"), []
+
+
+async def handle_segment_list(query, body, headers, method):
+    payload, status = api.segment_list(*(_first(query, name) for name in ("city", "operator", "prefix", "offset", "limit")))
+    return status, JSON_TYPE, api.dump_json(payload).encode("utf-8"), []
+
+
+async def handle_segment_stats(query, body, headers, method):
+    names = ("group_by", "city", "operator", "prefix", "offset", "limit")
+    payload, status = api.segment_stats(*(_first(query, name) for name in names))
+    return status, JSON_TYPE, api.dump_json(payload).encode("utf-8"), []
+
+
+async def handle_metrics(query, body, headers, method):
+    return 200, b"text/plain; version=0.0.4; charset=utf-8", metrics.render().encode("utf-8"), []
+
+
+async def handle_batch(query, body, headers, method):
+    is_json = headers.get(b"content-type", b"").split(b";")[0].strip().endswith(b"json")
+    phones = api.parse_batch_body(body.decode("utf-8", "replace"), is_json)
+    if _wants_binary(headers) and api.batch_error(phones) is None:
+        payload, version = api.locate_batch_binary(phones)
+        return 200, BINARY_TYPE, payload, [(b"x-data-version", version.encode())]
+    payload, status = api.locate_batch(phones)
+    return status, JSON_TYPE, api.dump_json(payload).encode("utf-8"), []
+
+
+async def handle_locations(query, body, headers, method):
+    return 200, JSON_TYPE, api.dump_json(api.locations_payload()).encode("utf-8"), []
+
+
+# 按客户端限流的路由（与 Flask 版本一致）
+THROTTLED_ROUTES = ("/api/phone/location", "/api/phone/location/batch")
+
+# {路径: (允许的方法, 处理函数)}；HEAD 与 OPTIONS 和 Flask 一样自动支持
+ROUTES = {
+    "/": (("GET",), handle_index),
+    "/api/health": (("GET",), handle_health),
+    "/api/ready": (("GET",), handle_ready),
+    "/api/phone/location": (("GET", "POST"), handle_location),
+    "/api/phone/location/batch": (("POST",), handle_batch),
+    "/api/segments/range": (("GET",), handle_segment_range),
+    "/api/segments": (("GET",), handle_segment_list),
+    "/api/segments/stats": (("GET",), handle_segment_stats),
+    "/api/locations": (("GET",), handle_locations),
+    "/metrics": (("GET",), handle_metrics),
+}
+
+
+def _etag_matches(if_none_match, etag):
+    """If-None-Match 是否命中（支持 * 与逗号分隔的多个 ETag，忽略弱校验前缀）"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.decode("latin-1").split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/").strip('"') == etag:
+            return True
+    return False
+
+
+def _wants_binary(headers):
+    accept = headers.get(b"accept")
+    return accept is not None and api.wants_binary(accept.decode("latin-1"))
+
+
+def _encode_headers(headers):
+    return [(name.lower().encode(), value.encode()) for name, value in headers]
+
+
+def _first(query, name):
+    values = query.get(name)
+    return values[0].strip() if values else ""
+
+
+# ---------------------- CORS（与 flask_cors 默认行为一致）----------------------
+def cors_headers(headers, preflight=False):
+    """有 Origin 时回显来源并加 Vary: Origin，否则允许 *；预检请求额外返回允许的方法与请求头"""
+    origin = headers.get(b"origin")
+    result = [(b"access-control-allow-origin", origin or b"*")]
+    if preflight:
+        request_headers = headers.get(b"access-control-request-headers")
+        if request_headers:
+            result.append((b"access-control-allow-headers", request_headers))
+        result.append((b"access-control-allow-methods", CORS_ALLOW_METHODS))
+    if origin:
+        result.append((b"vary", b"Origin"))
+    return result
+
+
+# ---------------------- ASGI 应用 ----------------------
+async def _read_body(receive, limit):
+    """读取请求体，超过 limit 字节时停止读取并返回 None"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _send(send, status, content_type, body, extra_headers, head=False):
+    if content_type is None:
+        headers = []
+    else:
+        headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers + extra_headers})
+    await send({"type": "http.response.body", "body": b"" if head else body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    headers = dict(scope["headers"])
+    method = scope["method"]
+    route = ROUTES.get(scope["path"])
+
+    if route is None:
+        error = NotFound()
+        await _send(send, 404, HTML_TYPE, error.get_body().encode("utf-8"), cors_headers(headers), method == "HEAD")
+        return
+
+    methods, handler = route
+    allowed = methods + ("HEAD", "OPTIONS") if "GET" in methods else methods + ("OPTIONS",)
+
+    if method == "OPTIONS":
+        preflight = b"access-control-request-method" in headers
+        extra = [(b"allow", ", ".join(allowed).encode())] + cors_headers(headers, preflight)
+        await _send(send, 200, HTML_TYPE, b"", extra)
+        return
+
+    if method not in allowed:
+        error = MethodNotAllowed(valid_methods=allowed)
+        extra = [(b"allow", ", ".join(allowed).encode())] + cors_headers(headers)
+        await _send(send, 405, HTML_TYPE, error.get_body().encode("utf-8"), extra)
+        return
+
+    start = time.perf_counter()
+    # 与 werkzeug 一致：未转义的非 ASCII 字节按 UTF-8 解码（latin-1 会把 city=北京 变成乱码）
+    query = parse_qs(scope["query_string"].decode("utf-8", "replace"), keep_blank_values=True)
+    if scope["path"] in THROTTLED_ROUTES:
+        retry_after = api.throttle(*_client(scope, headers))
+        if retry_after is not None:
+            extra = [(b"retry-after", retry_after.encode())] + cors_headers(headers)
+            await _send(send, 429, JSON_TYPE, api.BODY_THROTTLED.encode("utf-8"), extra, method == "HEAD")
+            _record(scope, headers, query, method, 429, start)
+            return
+
+    body = b""
+    if method == "POST":
+        # POST 路由（单号表单、批量查询）的请求体都很小，与 Flask 版本一样按 BATCH_MAX_BYTES 限制
+        length = headers.get(b"content-length")
+        too_large = length is not None and length.isdigit() and int(length) > api.BATCH_MAX_BYTES
+        body = None if too_large else await _read_body(receive, api.BATCH_MAX_BYTES)
+        if body is None:
+            payload, status = api.batch_too_large()
+            await _send(send, status, JSON_TYPE, api.dump_json(payload).encode("utf-8"), cors_headers(headers))
+            _record(scope, headers, query, method, status, start)
+            return
+    status, content_type, payload, extra = await handler(query, body, headers, method)
+    if status == 200 and len(payload) >= compress.COMPRESS_MIN_BYTES \
+            and not any(name == b"content-encoding" for name, _ in extra):
+        accept_encoding = headers.get(b"accept-encoding")
+        payload, encoding_headers = api.compressed_body(payload, accept_encoding.decode("latin-1") if accept_encoding else None)
+        if any(name == b"vary" and b"accept-encoding" in value.lower() for name, value in extra):
+            encoding_headers = [h for h in encoding_headers if h[0] != "Vary"]
+        extra = extra + _encode_headers(encoding_headers)
+    await _send(send, status, content_type, payload, extra + cors_headers(headers), method == "HEAD")
+    _record(scope, headers, query, method, status, start)
+
+
+def _client(scope, headers):
+    """(REMOTE_ADDR, X-Forwarded-For)"""
+    client = scope.get("client")
+    forwarded_for = headers.get(b"x-forwarded-for")
+    return client[0] if client else None, forwarded_for.decode("latin-1") if forwarded_for else None
+
+
+def _record(scope, headers, query, method, status, start):
+    """记录指标，查询路由另写审计访问日志（与 Flask 版本一致）"""
+    path = scope["path"]
+    elapsed = time.perf_counter() - start
+    metrics.record_request(path, status, elapsed)
+    if accesslog.enabled() and path in api.ACCESS_LOG_ROUTES:
+        phone = _first(query, "phone") if path == "/api/phone/location" else None
+        lookup = _LOOKUP_PATH.get() if path == "/api/phone/location" else None
+        accesslog.record(path, method, status, elapsed, ratelimit.client_key(*_client(scope, headers)), phone, lookup)
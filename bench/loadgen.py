@@ -0,0 +1,165 @@
+# HTTP 压测：以可配置并发驱动单号查询 / 批量查询接口，统计延迟分位数
+#
+# 先启动服务（gunicorn -c gunicorn.conf.py api:app 或 uvicorn asgi:app），再执行：
+#     python bench/loadgen.py --url http://127.0.0.1:8000 --concurrency 32 --duration 30
+#     python bench/loadgen.py --mode batch --batch-size 1000 --concurrency 4
+#
+# 每个并发使用一条 keep-alive 连接，号码样本按 --mix 比例生成且固定随机种子，保证多次运行可比。
+import io
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+import http.client
+from urllib.parse import urlsplit
+
+from workload import ROOT_DIR, environment, mixed_samples, parse_mix, percentiles, write_results
+
+import seg_index
+
+
+def load_data():
+    """加载本地号段数据用于生成号码样本（优先读取最新索引）"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        if seg_index.index_is_fresh():
+            return seg_index.read_index()
+        return seg_index.parse_city_dir()
+
+
+class Worker(threading.Thread):
+    """单个并发：循环发送请求直到截止时间或请求数用完，记录每个请求的延迟"""
+
+    def __init__(self, target, requests, deadline, budget):
+        super().__init__(daemon=True)
+        self.target = target
+        self.requests = requests
+        self.deadline = deadline
+        self.budget = budget
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def run(self):
+        conn = http.client.HTTPConnection(self.target.hostname, self.target.port or 80, timeout=30)
+        i = 0
+        while time.perf_counter() < self.deadline and self.budget.take():
+            method, path, body, headers = self.requests[i % len(self.requests)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(self.target.hostname, self.target.port or 80, timeout=30)
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            self.statuses[resp.status] = self.statuses.get(resp.status, 0) + 1
+        conn.close()
+
+
+class Budget:
+    """所有并发共享的请求数配额（None 表示不限，只按时长停止）"""
+
+    def __init__(self, total):
+        self.remaining = total
+        self.lock = threading.Lock()
+
+    def take(self):
+        if self.remaining is None:
+            return True
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+def build_requests(phones, mode, batch_size):
+    if mode == "single":
+        return [("GET", f"/api/phone/location?phone={phone}", None, {}) for phone in phones]
+    headers = {"Content-Type": "application/json"}
+    return [("POST", "/api/phone/location/batch", json.dumps(phones[i:i + batch_size]), headers)
+            for i in range(0, len(phones) - batch_size + 1, batch_size)]
+
+
+def run(url, mode, concurrency, duration, total, batch_size, mix, samples, warmup):
+    target = urlsplit(url)
+    phones = mixed_samples(load_data(), mix, max(samples, batch_size))
+    requests = build_requests(phones, mode, batch_size)
+
+    if warmup:
+        warm = [Worker(target, requests, time.perf_counter() + warmup, Budget(None)) for _ in range(concurrency)]
+        for w in warm:
+            w.start()
+        for w in warm:
+            w.join()
+
+    budget = Budget(total)
+    start = time.perf_counter()
+    workers = [Worker(target, requests[i::concurrency] or requests, start + duration, budget)
+               for i in range(concurrency)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [lat for w in workers for lat in w.latencies]
+    statuses = {}
+    for w in workers:
+        for status, count in w.statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    numbers = len(latencies) * (batch_size if mode == "batch" else 1)
+    return {
+        "requests": len(latencies),
+        "errors": sum(w.errors for w in workers),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "numbers_per_sec": round(numbers / elapsed, 1) if elapsed else None,
+        "status": statuses,
+        "latency_ms": {
+            **percentiles(latencies),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            "max": round(max(latencies) * 1000, 3) if latencies else None,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="手机号归属地 API 压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="服务地址")
+    parser.add_argument("--mode", choices=("single", "batch"), default="single", help="单号查询或批量查询")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发连接数")
+    parser.add_argument("--duration", type=float, default=10, help="压测时长（秒）")
+    parser.add_argument("--requests", type=int, help="总请求数上限（先到者为准）")
+    parser.add_argument("--batch-size", type=int, default=1000, help="批量模式每个请求的号码数")
+    parser.add_argument("--mix", default="hit=0.9,prefix=0.05,miss=0.03,invalid=0.02", help="号码类型比例")
+    parser.add_argument("--samples", type=int, default=20000, help="号码样本数（循环使用）")
+    parser.add_argument("--warmup", type=float, default=1, help="预热时长（秒），不计入结果")
+    parser.add_argument("--out", default=f"{ROOT_DIR}/bench/results/loadgen-{int(time.time())}.json",
+                        help="结果 JSON 路径，- 表示标准输出")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    result = run(args.url, args.mode, args.concurrency, args.duration, args.requests,
+                 args.batch_size, mix, args.samples, args.warmup)
+    print(f"🚦 {result['requests']} 个请求，{result['requests_per_sec']} 请求/秒，"
+          f"p50 {result['latency_ms']['p50']}ms / p95 {result['latency_ms']['p95']}ms / "
+          f"p99 {result['latency_ms']['p99']}ms，状态码 {result['status']}", file=sys.stderr)
+
+    write_results({
+        "benchmark": "loadgen",
+        "env": environment(),
+        "params": {k: v for k, v in vars(args).items() if k != "out"} | {"mix": mix},
+        "result": result,
+    }, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# 微基准：数据加载耗时 / 加载后内存 / 查询吞吐
+#
+#     python bench/micro.py [--lookups 200000] [--repeat 3] [--out bench/results/micro.json]
+#
+# 加载耗时与内存在独立子进程中测量（csv / index / index_mmap 三种加载方式），
+# 查询吞吐在当前进程中分别测量 SEG_MAP 直接查表、locate_phone、locate_phone_json（预序列化响应）、
+# lookup_batch、紧凑二进制批量编码（locate_batch_binary），以及完整 WSGI 调用的 Flask 路由与 WSGI 快速通道（LocationFastPath）。
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+from workload import ROOT_DIR, KINDS, phone_samples, environment, write_results
+
+import seg_index
+
+# 子进程中执行：导入 api（即完整启动加载），输出耗时与内存
+_LOAD_PROBE = """
+import io, json, time, contextlib
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import api
+elapsed = time.perf_counter() - start
+data = api.seg_lookup.get_data()
+print(json.dumps({"load_s": elapsed, "seg_map_bytes": data.seg_map.nbytes,
+                  "data_source": data.source, **api.process_memory()}))
+"""
+
+
+def bench_load(repeat):
+    """分别用 CSV 解析、私有索引、mmap 共享索引三种方式启动，取多次中的最小值"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "seg_index.bin")
+        with contextlib.redirect_stdout(io.StringIO()):
+            seg_index.write_index(seg_index.parse_city_dir(), index_path)
+
+        modes = {
+            "csv": {"SEG_INDEX_PATH": os.path.join(tmp, "missing.bin")},
+            "index": {"SEG_INDEX_PATH": index_path},
+            "index_mmap": {"SEG_INDEX_PATH": index_path, "SEG_SHARED_MMAP": "1"},
+        }
+        for mode, extra_env in modes.items():
+            env = dict(os.environ, SEG_RELOAD_POLL_SECONDS="0", SEG_SHARED_MMAP="")
+            env.update(extra_env)
+            runs = []
+            for _ in range(repeat):
+                out = subprocess.run([sys.executable, "-c", _LOAD_PROBE], cwd=ROOT_DIR, env=env,
+                                     capture_output=True, text=True, check=True).stdout
+                runs.append(json.loads(out.strip().splitlines()[-1]))
+            best = min(runs, key=lambda r: r["load_s"])
+            best["load_s_all"] = [round(r["load_s"], 4) for r in runs]
+            results[mode] = best
+            print(f"⏱️  加载[{mode}]: {best['load_s'] * 1000:.1f}ms, RSS {best['rss_bytes'] / 1048576:.1f}MB",
+                  file=sys.stderr)
+    return results
+
+
+def _ops_per_sec(fn, items, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(items)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(len(items) / best) if best else None
+
+
+def bench_lookups(n, repeat):
+    """按号码类型测量各查询路径的每秒查询数"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        import api
+
+    data = api.seg_lookup.get_data()
+
+    def seg_map_get(phones):
+        get = data.seg_map.get
+        for phone in phones:
+            get(phone[:7])
+
+    def locate(phones):
+        for phone in phones:
+            api.locate_phone(phone)
+
+    def locate_json(phones):
+        for phone in phones:
+            api.locate_phone_json(phone)
+
+    def batch(phones):
+        for i in range(0, len(phones), 1000):
+            api.lookup_batch(phones[i:i + 1000])
+
+    def batch_binary(phones):
+        for i in range(0, len(phones), 1000):
+            api.locate_batch_binary(phones[i:i + 1000])
+
+    fast_path = api.LocationFastPath(api.app.wsgi_app)
+    base_environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/api/phone/location", "SERVER_NAME": "bench",
+                    "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "wsgi.url_scheme": "http",
+                    "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr}
+
+    def wsgi(app):
+        def run(phones):
+            for phone in phones:
+                for _ in app(dict(base_environ, QUERY_STRING="phone=" + phone), lambda status, headers: None):
+                    pass
+        return run
+
+    results = {}
+    for kind in KINDS:
+        phones = phone_samples(data, kind, n)
+        results[kind] = {
+            "seg_map_get": _ops_per_sec(seg_map_get, phones, repeat),
+            "locate_phone": _ops_per_sec(locate, phones, repeat),
+            "locate_phone_json": _ops_per_sec(locate_json, phones, repeat),
+            "lookup_batch": _ops_per_sec(batch, phones, repeat),
+            "locate_batch_binary": _ops_per_sec(batch_binary, phones, repeat),
+            # 完整 Flask 请求栈慢一个数量级，只取部分号码
+            "wsgi_flask": _ops_per_sec(wsgi(api.app.wsgi_app), phones[:max(1, n // 20)], repeat),
+            "wsgi_fast_path": _ops_per_sec(wsgi(fast_path), phones, repeat),
+        }
+        print(f"🔎 查询[{kind}]: " + ", ".join(f"{k} {v:,}/s" for k, v in results[kind].items()),
+              file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="号段查询微基准")
+    parser.add_argument("--lookups", type=int, default=200000, help="每种号码类型的查询次数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最优）")
+    parser.add_argument("--skip-load", action="store_true", help="跳过加载耗时测量")
+    parser.add_argument("--out", default=os.path.join(ROOT_DIR, "bench", "results", f"micro-{int(time.time())}.json"),
+                        help="结果 JSON 路径，- 表示标准输出")
+    args = parser.parse_args(argv)
+
+    results = {
+        "benchmark": "micro",
+        "env": environment(),
+        "params": {"lookups": args.lookups, "repeat": args.repeat},
+        "load": None if args.skip_load else bench_load(args.repeat),
+        "lookups_per_sec": bench_lookups(args.lookups, args.repeat),
+    }
+    write_results(results, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
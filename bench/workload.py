@@ -0,0 +1,95 @@
+# 基准测试公共部分：可复现的号码样本生成与结果落盘
+import os
+import sys
+import json
+import time
+import random
+import platform
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import seg_index
+
+# 号码类型：hit 命中七位号段；prefix 七位未命中但前缀命中；miss 都未命中；invalid 格式错误
+KINDS = ("hit", "prefix", "miss", "invalid")
+
+
+def phone_samples(data, kind, n, seed=42):
+    """按类型生成 n 个号码（固定随机种子，保证多次运行的负载一致）"""
+    rng = random.Random(f"{seed}:{kind}")
+    table = data.seg_map.table
+    prefixes = set(data.prefixes.keys(3))
+
+    if kind == "hit":
+        pool = [i for i in range(seg_index.SEG_SPAN) if table[i]]
+        return [f"{seg_index.SEG_BASE + rng.choice(pool)}{rng.randrange(10000):04d}" for _ in range(n)]
+    if kind == "prefix":
+        pool = [i for i in range(seg_index.SEG_SPAN)
+                if not table[i] and (seg_index.SEG_BASE + i) // 10000 in prefixes]
+        return [f"{seg_index.SEG_BASE + rng.choice(pool)}{rng.randrange(10000):04d}" for _ in range(n)]
+    if kind == "miss":
+        pool = [p for p in range(130, 200) if p not in prefixes]
+        return [f"{rng.choice(pool)}{rng.randrange(10 ** 8):08d}" for _ in range(n)]
+    if kind == "invalid":
+        return [f"{rng.randrange(10 ** 9, 10 ** 10)}" for _ in range(n)]
+    raise ValueError(f"未知号码类型: {kind}")
+
+
+def mixed_samples(data, mix, n, seed=42):
+    """按比例混合多种号码，mix 形如 {"hit": 0.9, "prefix": 0.05, "miss": 0.05}"""
+    total = sum(mix.values())
+    phones = []
+    for kind, weight in mix.items():
+        phones += phone_samples(data, kind, round(n * weight / total), seed)
+    random.Random(seed).shuffle(phones)
+    return phones
+
+
+def parse_mix(text):
+    """解析命令行的混合比例参数：hit=0.9,prefix=0.05,miss=0.05"""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in KINDS:
+            raise ValueError(f"未知号码类型: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def environment():
+    """记录运行环境，便于跨提交对比结果"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": int(time.time()),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """返回 {"p50": ..., ...}（毫秒，保留三位小数）"""
+    if not samples:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(samples)
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 3) for p in points}
+
+
+def write_results(results, path):
+    """结果写入 JSON 文件（path 为 - 时输出到标准输出）"""
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if path == "-":
+        print(text)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text + "\n")
+    print(f"📄 结果已写入: {path}", file=sys.stderr)
@@ -0,0 +1,181 @@
+# 批量归属地补全：逐行读取 CSV / NDJSON，按块查询后流式输出，内存占用与文件大小无关
+#
+# 命令行用法：
+#     python bulk.py customers.csv -o customers_enriched.csv [--column phone]
+#     cat export.ndjson | python bulk.py - --format ndjson > enriched.ndjson
+import os
+import io
+import sys
+import csv
+import json
+import time
+import argparse
+import logging
+
+import seg_lookup
+
+# 每次批量查询的行数：足够摊薄查询开销，同时保证输出及时刷出
+CHUNK_ROWS = int(os.environ.get("BULK_CHUNK_ROWS", "1000"))
+
+# CSV 输出追加的列 / NDJSON 输出追加的 location 对象字段
+RESULT_FIELDS = ("code", "seg", "seg_type", "city", "operator")
+DEFAULT_COLUMNS = ("phone", "手机号", "mobile")
+
+
+def result_values(item):
+    """把 lookup_batch 的单项结果展开为 RESULT_FIELDS 顺序的值"""
+    data = item["data"] or {}
+    return [item["code"]] + [data.get(field, "") for field in RESULT_FIELDS[1:]]
+
+
+class BulkStats:
+    """流式处理统计：行数、命中数与吞吐量"""
+
+    def __init__(self):
+        self.rows = 0
+        self.found = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return f"共 {self.rows} 行，命中 {self.found} 行，耗时 {self.elapsed:.2f}s，{self.rows_per_sec:,.0f} 行/秒"
+
+    def as_dict(self):
+        return {"rows": self.rows, "found": self.found, "elapsed": round(self.elapsed, 3),
+                "rows_per_sec": round(self.rows_per_sec, 1)}
+
+
+def find_column(header, column):
+    """定位号码列：column 可以是列名或 0 起始的列序号，未指定时按常见列名猜测"""
+    if column is not None:
+        if column in header:
+            return header.index(column)
+        if column.isdigit() and int(column) < len(header):
+            return int(column)
+        raise ValueError(f"找不到号码列: {column}")
+    for name in DEFAULT_COLUMNS:
+        if name in header:
+            return header.index(name)
+    return 0
+
+
+def enrich_csv(lines, lookup_batch, column=None, stats=None):
+    """逐行补全 CSV，生成输出文本块；lines 为任意可迭代的文本行"""
+    stats = stats or BulkStats()
+    reader = csv.reader(lines)
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+
+    header = next(reader, None)
+    if header is None:
+        stats.finish()
+        return
+    col = find_column(header, column)
+    writer.writerow(header + list(RESULT_FIELDS))
+
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            yield _write_csv_chunk(chunk, col, lookup_batch, writer, buf, stats)
+            chunk = []
+    if chunk:
+        yield _write_csv_chunk(chunk, col, lookup_batch, writer, buf, stats)
+    elif buf.tell():
+        yield buf.getvalue()
+    stats.finish()
+
+
+def _write_csv_chunk(rows, col, lookup_batch, writer, buf, stats):
+    results = lookup_batch([row[col] if col < len(row) else "" for row in rows])
+    for row, item in zip(rows, results):
+        writer.writerow(row + result_values(item))
+        stats.found += item["code"] == 200
+    stats.rows += len(rows)
+    text = buf.getvalue()
+    buf.seek(0)
+    buf.truncate()
+    return text
+
+
+def enrich_ndjson(lines, lookup_batch, column=None, stats=None):
+    """逐行补全 NDJSON，每个对象追加 location 字段；无法解析的行原样放入 raw 并标记 400"""
+    stats = stats or BulkStats()
+    column = column or "phone"
+
+    chunk = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        chunk.append(line)
+        if len(chunk) >= CHUNK_ROWS:
+            yield _write_ndjson_chunk(chunk, column, lookup_batch, stats)
+            chunk = []
+    if chunk:
+        yield _write_ndjson_chunk(chunk, column, lookup_batch, stats)
+    stats.finish()
+
+
+def _write_ndjson_chunk(lines, column, lookup_batch, stats):
+    objs = []
+    for line in lines:
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            obj = None
+        objs.append(obj if isinstance(obj, dict) else {"raw": line})
+
+    results = lookup_batch([obj.get(column) for obj in objs])
+    out = []
+    for obj, item in zip(objs, results):
+        obj["location"] = dict(zip(RESULT_FIELDS, result_values(item)))
+        out.append(json.dumps(obj, ensure_ascii=False, separators=(',', ':')))
+        stats.found += item["code"] == 200
+    stats.rows += len(lines)
+    return "\n".join(out) + "\n"
+
+
+ENRICHERS = {"csv": enrich_csv, "ndjson": enrich_ndjson}
+
+
+# ---------------------- 命令行 ----------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量补全手机号归属地（CSV / NDJSON 流式处理）")
+    parser.add_argument("input", help="输入文件，- 表示标准输入")
+    parser.add_argument("-o", "--output", default="-", help="输出文件，默认标准输出")
+    parser.add_argument("--format", choices=sorted(ENRICHERS), help="输入格式，默认按扩展名判断")
+    parser.add_argument("--column", help="号码所在列名/列序号（NDJSON 为字段名），默认自动识别")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("ndjson" if args.input.endswith((".ndjson", ".jsonl")) else "csv")
+
+    # 直接在进程内查询（不经过 Flask）；加载日志输出到 stderr，不会混入 stdout 上的结果
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    seg_lookup.get_data()
+
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8-sig", newline="")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    stats = BulkStats()
+    try:
+        for text in ENRICHERS[fmt](src, seg_lookup.lookup_many, args.column, stats):
+            dst.write(text)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+    print(f"📊 {stats.summary()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
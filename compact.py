@@ -0,0 +1,62 @@
+# 紧凑二进制响应格式：供内部大批量调用方通过 Accept 协商使用，代替每条都重复中文字符串的 JSON
+#
+# 媒体类型 application/x-phone-location，所有整数为小端序：
+#     头部 8 字节:    magic(4s "PLR1") | 记录数(u32)
+#     每条记录 12 字节: 状态(u8) | 号段长度(u8) | 置信度百分比(u8) | 标志(u8)
+#                     | 号段(u32) | 归属地编号(u16) | 运营商编号(u8) | 填充(u8)
+# 状态 0 查询成功 / 1 未查询到号段 / 2 号码格式错误，后两种情况其余字段为 0；
+# 七位号段命中时置信度为 255（不适用）；标志 bit0 表示运营商被携号转网覆盖表改写。
+# 记录与请求中的号码一一对应、顺序一致，不再回传号码本身。
+#
+# 归属地编号与运营商编号都从 1 开始，0 表示无。解码表由 GET /api/locations 提供：
+# 二进制响应头 X-Data-Version 与解码表中的 version 相同时，客户端可以一直复用缓存的解码表。
+import struct
+
+from seg_index import OPERATORS
+
+MEDIA_TYPE = "application/x-phone-location"
+MAGIC = b"PLR1"
+HEADER = struct.Struct("<4sI")
+RECORD = struct.Struct("<BBBBIHBx")
+
+STATUS_OK = 0
+STATUS_NOT_FOUND = 1
+STATUS_INVALID = 2
+CONFIDENCE_NONE = 255
+FLAG_PORTED = 1
+
+# {运营商: 1 起始编号}
+OPERATOR_IDS = {operator: i + 1 for i, operator in enumerate(OPERATORS)}
+
+_RECORD_NOT_FOUND = RECORD.pack(STATUS_NOT_FOUND, 0, 0, 0, 0, 0, 0)
+_RECORD_INVALID = RECORD.pack(STATUS_INVALID, 0, 0, 0, 0, 0, 0)
+
+
+def encode(resolved, locations):
+    """把 seg_lookup.resolve 的结果序列编码为二进制响应体；locations 为同一数据快照的 seg_map.locations"""
+    pack = RECORD.pack
+    operator_ids = OPERATOR_IDS
+    records = []
+    for status, seg, code, pct, override in resolved:
+        if status == 400:
+            records.append(_RECORD_INVALID)
+        elif status == 404:
+            records.append(_RECORD_NOT_FOUND)
+        else:
+            operator = override if override is not None else locations[code - 1][1]
+            records.append(pack(STATUS_OK, len(seg), CONFIDENCE_NONE if pct is None else pct,
+                                FLAG_PORTED if override is not None else 0,
+                                int(seg), code, operator_ids.get(operator, 0)))
+    return HEADER.pack(MAGIC, len(records)) + b"".join(records)
+
+
+def location_dictionary(data):
+    """归属地与运营商解码表（GET /api/locations 的 data 字段）"""
+    return {
+        "version": data.version,
+        "operators": [{"id": i, "operator": operator} for operator, i in OPERATOR_IDS.items()],
+        "locations": [
+            {"id": i + 1, "city": city, "operator": operator, "operator_id": OPERATOR_IDS.get(operator, 0)}
+            for i, (city, operator) in enumerate(data.seg_map.locations)
+        ],
+    }
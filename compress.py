@@ -0,0 +1,87 @@
+# 响应压缩：静态页面在启动时预压缩一次，较大的动态响应按 Accept-Encoding 即时压缩
+#
+# 支持 gzip；安装了可选依赖 brotli（pip install brotli）时优先使用 br。
+# 小于 COMPRESS_MIN_BYTES 的响应（如单号查询）不压缩，省去压缩开销。
+import os
+import gzip
+import zlib
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+# 动态压缩的最小响应体积（字节）
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+# 动态压缩级别：偏向速度；静态资源只压缩一次，使用最高级别
+GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", "4"))
+
+# 服务端偏好顺序（客户端权重相同时靠前者优先）
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding, available=ENCODINGS):
+    """按 Accept-Encoding 从 available 中选择内容编码，客户端都不接受时返回 None（不压缩）"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params[:2] in ("q=", "Q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(body, encoding, level=None):
+    """压缩整块响应体；level 为 None 时使用动态压缩级别"""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY if level is None else level)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """逐块压缩流式响应；每块之后同步刷出，客户端能及时收到已处理的部分"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+class StaticAsset:
+    """启动时预压缩的静态资源：每种内容编码一份响应体与对应的强 ETag"""
+
+    def __init__(self, body, mimetype):
+        self.mimetype = mimetype
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        # {内容编码（None 为原文）: (响应体, 不带引号的 ETag)}
+        self.variants = {None: (body, digest)}
+        for encoding in ENCODINGS:
+            data = compress(body, encoding, 11 if encoding == "br" else 9)
+            if len(data) < len(body):
+                self.variants[encoding] = (data, f"{digest}-{encoding}")
+        self.encodings = tuple(e for e in ENCODINGS if e in self.variants)
+
+    def select(self, accept_encoding):
+        """按 Accept-Encoding 选择版本，返回 (内容编码或 None, 响应体, ETag)"""
+        encoding = choose_encoding(accept_encoding, self.encodings)
+        body, etag = self.variants[encoding]
+        return encoding, body, etag
@@ -0,0 +1,208 @@
+# 离线批量补全：多个大 CSV 文件按字节范围切片，在进程池中并行补全号码归属地，不经过 HTTP
+#
+# 命令行用法：
+#     python enrich.py customers-*.csv [--output-dir out/] [--workers 8] [--shard-mb 32] [--column phone]
+#
+# 每个输入文件输出为 <输出目录>/<文件名>.enriched.csv，列与 bulk.py 的 CSV 输出一致。
+# 所有 worker 以只读 mmap 映射同一份二进制索引（启动前按需从 city/ 生成），号段表在物理内存中只有一份。
+# 切片在换行处对齐，因此要求带引号的字段中不含换行；切片按原顺序写回，输出与单进程逐行处理相同。
+import os
+import io
+import sys
+import csv
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import bulk
+import seg_index
+import seg_lookup
+
+# 默认切片大小（MB）：足够摊薄任务调度开销，同时让各核的负载均衡
+SHARD_MB = float(os.environ.get("ENRICH_SHARD_MB", "32"))
+STAGES = ("read", "parse", "lookup", "write")
+
+
+class EnrichStats:
+    """汇总各切片的行数、命中数与分阶段耗时（各 worker 耗时之和）"""
+
+    def __init__(self):
+        self.rows = 0
+        self.found = 0
+        self.shards = 0
+        self.bytes = 0
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add(self, rows, found, nbytes, stages):
+        self.rows += rows
+        self.found += found
+        self.shards += 1
+        self.bytes += nbytes
+        for name, seconds in stages.items():
+            self.stages[name] += seconds
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def summary(self):
+        rate = self.rows / self.elapsed if self.elapsed else 0.0
+        stages = "，".join(f"{name} {seconds:.2f}s" for name, seconds in self.stages.items())
+        return (f"共 {self.rows} 行（{self.shards} 个切片，{self.bytes / 1048576:.1f} MB），命中 {self.found} 行，"
+                f"耗时 {self.elapsed:.2f}s，{rate:,.0f} 行/秒；分阶段: {stages}")
+
+
+# ---------------------- 切片 ----------------------
+def read_header(path):
+    """读取表头行，返回 (表头字段列表, 数据起始字节偏移)；空文件返回 (None, 0)"""
+    with open(path, "rb") as f:
+        line = f.readline()
+    if not line.strip():
+        return None, len(line)
+    text = line.decode("utf-8-sig", errors="replace")
+    return next(csv.reader([text])), len(line)
+
+
+def plan_shards(path, start, shard_bytes):
+    """把 [start, 文件末尾) 切成约 shard_bytes 大小的字节范围，每个切片都在换行符后结束"""
+    size = os.path.getsize(path)
+    shards = []
+    with open(path, "rb") as f:
+        while start < size:
+            end = start + shard_bytes
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            end = min(end, size)
+            shards.append((start, end))
+            start = end
+    return shards
+
+
+# ---------------------- worker ----------------------
+def _init_worker():
+    """进程池初始化：以共享 mmap 方式加载号段索引（每个 worker 的加载日志不输出）"""
+    seg_lookup.SHARED_MMAP = True
+    logging.disable(logging.INFO)
+    seg_lookup.get_data()
+
+
+def enrich_shard(path, start, end, col):
+    """补全一个切片，返回 (输出字节, 行数, 命中数, 各阶段耗时)"""
+    t0 = time.perf_counter()
+    with open(path, "rb") as f:
+        f.seek(start)
+        raw = f.read(end - start)
+    t1 = time.perf_counter()
+    rows = list(csv.reader(io.StringIO(raw.decode("utf-8", errors="replace"), newline="")))
+    del raw
+    t2 = time.perf_counter()
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    found = 0
+    lookup_time = 0.0
+    for i in range(0, len(rows), bulk.CHUNK_ROWS):
+        chunk = rows[i:i + bulk.CHUNK_ROWS]
+        t = time.perf_counter()
+        results = seg_lookup.lookup_many([row[col] if col < len(row) else "" for row in chunk])
+        lookup_time += time.perf_counter() - t
+        for row, item in zip(chunk, results):
+            writer.writerow(row + bulk.result_values(item))
+            found += item["code"] == 200
+    out = buf.getvalue().encode("utf-8")
+    t3 = time.perf_counter()
+    stages = {"read": t1 - t0, "parse": t2 - t1, "lookup": lookup_time, "write": t3 - t2 - lookup_time}
+    return out, len(rows), found, stages
+
+
+def _enrich_shard_task(args):
+    return enrich_shard(*args)
+
+
+# ---------------------- 调度 ----------------------
+def _ensure_index():
+    """索引缺失或过期时从 city/ 重新生成，让所有 worker 映射同一份文件"""
+    if seg_index.index_is_fresh(seg_index.INDEX_PATH, seg_lookup.LOCAL_ROOT):
+        return
+    start = time.perf_counter()
+    count = seg_index.write_index(seg_index.parse_city_dir(seg_lookup.LOCAL_ROOT), seg_index.INDEX_PATH)
+    print(f"💾 已生成二进制索引: {seg_index.INDEX_PATH}（{count} 个号段，{time.perf_counter() - start:.2f}s）",
+          file=sys.stderr)
+
+
+def output_path(path, output_dir, suffix):
+    """输出文件路径：<输出目录>/<文件名><suffix>.csv，未指定输出目录时与输入文件同目录"""
+    stem, _ = os.path.splitext(os.path.basename(path))
+    return os.path.join(output_dir or os.path.dirname(os.path.abspath(path)), f"{stem}{suffix}.csv")
+
+
+def enrich_file(pool, path, dst_path, column, shard_bytes, window, stats):
+    """切片提交到进程池，按切片顺序把结果写入 dst_path；同时在途的切片不超过 window 个"""
+    header, data_start = read_header(path)
+    if header is None:
+        open(dst_path, "wb").close()
+        return
+    col = bulk.find_column(header, column)
+    shards = plan_shards(path, data_start, shard_bytes)
+
+    with open(dst_path, "wb") as dst:
+        line = io.StringIO()
+        csv.writer(line, lineterminator="\n").writerow(header + list(bulk.RESULT_FIELDS))
+        dst.write(line.getvalue().encode("utf-8"))
+        pending = deque()
+        tasks = iter(shards)
+        while True:
+            while len(pending) < window:
+                shard = next(tasks, None)
+                if shard is None:
+                    break
+                pending.append((shard, pool.submit(_enrich_shard_task, (path, shard[0], shard[1], col))))
+            if not pending:
+                break
+            (start, end), future = pending.popleft()
+            out, rows, found, stages = future.result()
+            t = time.perf_counter()
+            dst.write(out)
+            stages["write"] += time.perf_counter() - t
+            stats.add(rows, found, end - start, stages)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多进程离线补全手机号归属地（多个 CSV 文件，按字节范围切片）")
+    parser.add_argument("inputs", nargs="+", help="输入 CSV 文件")
+    parser.add_argument("--output-dir", help="输出目录，默认与输入文件同目录")
+    parser.add_argument("--suffix", default=".enriched", help="输出文件名后缀，默认 .enriched")
+    parser.add_argument("--column", help="号码所在列名/列序号，默认自动识别")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数，默认 CPU 核数")
+    parser.add_argument("--shard-mb", type=float, default=SHARD_MB, help="切片大小（MB）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    _ensure_index()
+
+    stats = EnrichStats()
+    shard_bytes = max(1, int(args.shard_mb * 1048576))
+    workers = max(1, args.workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for path in args.inputs:
+            dst_path = output_path(path, args.output_dir, args.suffix)
+            start = time.perf_counter()
+            rows = stats.rows
+            enrich_file(pool, path, dst_path, args.column, shard_bytes, workers * 2, stats)
+            print(f"✅ {path} -> {dst_path}（{stats.rows - rows} 行，{time.perf_counter() - start:.2f}s）",
+                  file=sys.stderr)
+    stats.finish()
+
+    print(f"📊 {stats.summary()}（{workers} 个进程）", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
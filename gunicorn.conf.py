@@ -0,0 +1,60 @@
+# gunicorn 配置：多 worker 共享同一份号段表
+#
+# 启动：gunicorn -c gunicorn.conf.py api:app
+#
+# 号段表是 700000 个元素的直接寻址数组。开启 SEG_SHARED_MMAP 后，每个 worker 都把
+# seg_index.bin 以只读 mmap 方式映射进来，所有 worker 共享同一份页缓存，
+# 增加 worker 几乎不再增加号段数据的内存。索引缺失或过期时第一个加载的进程会自动生成。
+#
+# 同时开启 preload_app：api.py 在 master 中导入一次，fork 出来的 worker 继承已加载的
+# 数据（写时复制），worker 启动时不再重复解析。
+#
+# 热更新：POST /api/admin/reload（需设置 ADMIN_TOKEN）或 touch .seg_reload，
+# 每个 worker 在后台重建数据后原子切换，无需重启。CSV 有变化时只有第一个拿到 seg_index.bin.lock 的
+# worker 在进程内增量解析并写出索引，其余 worker 等待后直接读取（或 mmap）新索引。
+#
+# 多节点分发：在发布机执行 python snapshot.py publish <目录>，各节点设置 SNAPSHOT_SOURCE（目录或 URL）后
+# 启动与热更新时只下载增量包（或完整快照）并打补丁，不重新解析 CSV；同样只有拿到 seg_index.bin.lock 的 worker
+# 下载并写出索引，其余 worker 直接读取。/api/health 的 snapshot 字段用于核对版本。
+#
+# 按需加载：不开启共享 mmap 时可设置 SEG_LAZY_LOAD=1，worker 启动只读取索引元数据，
+# 号段表按三位前缀分片在首次访问时读取并在后台预热；GET /api/ready 返回预热进度。
+#
+# 快速通道：设置 WSGI_FAST_PATH=1 后 GET /api/phone/location 绕过 Flask 直接在 WSGI 层处理，
+# 响应与 Flask 逐字节一致，其余路由不受影响。
+#
+# 限流：RATE_LIMIT_RPS>0 时查询接口按客户端令牌桶限流（超出返回 429），RATE_LIMIT_SHARED=1 时
+# 令牌桶放在 master 中创建的共享内存里，所有 worker 共用同一份配额。
+#
+# 访问日志：设置 ACCESS_LOG_DIR 与 ACCESS_LOG_SALT（未设置盐值时不启用）后查询接口的审计日志由每个 worker
+# 的后台线程批量写入 access-<pid>.log，队列满时丢弃并计数（见 /api/health 的 access_log），不会阻塞请求。
+#
+# 性能分析：GET /api/admin/startup 返回数据加载的分阶段耗时；设置 PROFILE_SAMPLE_RATE（或
+# POST /api/admin/profile?rate=0.01）后按比例抽取请求做调用栈分析，写出 profile-<pid>.folded 折叠栈文件
+# （flamegraph.pl / speedscope 可直接读取）。admin/profile 只作用于处理该请求的 worker。
+#
+# 指标：GET /metrics 返回 Prometheus 格式，各 worker 的计数经 METRICS_DIR 汇总。
+#
+# 验证内存节省：对比各 worker 的 /api/health 中 pss_bytes（共享页按进程数均摊），
+# 或执行 `grep -E '^(Rss|Pss)' /proc/<worker pid>/smaps_rollup`。
+import os
+import multiprocessing
+
+os.environ.setdefault("SEG_SHARED_MMAP", "1")
+# /metrics 跨 worker 汇总所用的目录（每次启动清空，避免混入上次运行的计数）
+os.environ.setdefault("METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".metrics"))
+
+bind = os.environ.get("BIND", "0.0.0.0:" + os.environ.get("PORT", "8000"))
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+
+def post_fork(server, worker):
+    # preload 模式下 master 中启动的线程不会被 fork 继承，每个 worker 需要重新启动后台线程
+    import api
+    api.start_background_threads()
+
+
+def on_starting(server):
+    import shutil
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
@@ -0,0 +1,164 @@
+# Prometheus 格式指标：请求数、分路由延迟直方图、查询结果分布、数据加载耗时
+#
+# 热路径上只做 dict 中的整数自增（每个 worker 独立计数，不加锁）。
+# 设置 METRICS_DIR 后每个 worker 定期把自己的计数写入该目录下的 metrics-<pid>.json，
+# 抓取 /metrics 时汇总目录中所有文件，得到跨 gunicorn worker 的总量。
+import os
+import json
+import time
+import bisect
+import threading
+
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+PREFIX = "phone_api_"
+
+# 延迟直方图桶上界（秒）
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HELP = {
+    "http_requests_total": ("counter", "按路由与状态码统计的请求数"),
+    "http_request_duration_seconds": ("histogram", "按路由统计的请求处理耗时"),
+    "lookup_results_total": ("counter", "号码查询结果：seg7 七位号段命中 / prefix 3~6 位最长前缀回退 / miss 未命中 / invalid 格式错误"),
+    "data_load_duration_seconds": ("gauge", "最近一次号段数据加载耗时"),
+    "segments": ("gauge", "当前加载的号段数量"),
+    "ported_numbers": ("gauge", "携号转网覆盖表中的号码数"),
+    "ported_overrides_total": ("counter", "被携号转网覆盖表改写运营商的查询数"),
+    "rate_limited_total": ("counter", "被按客户端限流拒绝的查询请求数"),
+    "shard_load_seconds": ("histogram", "按需加载模式下查询触发的冷分片加载耗时"),
+}
+
+# {(指标名, 标签元组): 值}；标签元组形如 (("route", "/api/health"), ("status", "200"))
+_counters = {}
+# {(指标名, 标签元组): [各桶计数..., +Inf 桶计数, 总和]}
+_histograms = {}
+_gauges = {}
+
+
+def inc(name, labels=(), value=1):
+    key = (name, labels)
+    try:
+        _counters[key] += value
+    except KeyError:
+        _counters[key] = value
+
+
+def observe(name, labels, seconds):
+    key = (name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms[key] = [0] * (len(BUCKETS) + 2)
+    hist[bisect.bisect_left(BUCKETS, seconds)] += 1
+    hist[-1] += seconds
+
+
+def set_gauge(name, value, labels=()):
+    _gauges[(name, labels)] = value
+
+
+def record_request(route, status, seconds):
+    """记录一次 HTTP 请求（Flask 与 ASGI 入口共用）"""
+    inc("http_requests_total", (("route", route), ("status", str(status))))
+    observe("http_request_duration_seconds", (("route", route),), seconds)
+
+
+# ---------------------- 跨 worker 汇总 ----------------------
+def _snapshot():
+    return {
+        "counters": [[name, labels, value] for (name, labels), value in list(_counters.items())],
+        "histograms": [[name, labels, hist] for (name, labels), hist in list(_histograms.items())],
+    }
+
+
+def flush():
+    """把当前 worker 的计数写入 METRICS_DIR（原子替换）"""
+    if not METRICS_DIR:
+        return
+    path = os.path.join(METRICS_DIR, f"metrics-{os.getpid()}.json")
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(_snapshot(), f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"⚠️  指标写入失败 {path}: {e}")
+
+
+def _collect():
+    """汇总所有 worker 的计数；已退出 worker 的文件保留，计数器保持单调递增"""
+    if not METRICS_DIR:
+        return _snapshot()
+    flush()
+    counters, histograms = {}, {}
+    try:
+        names = [n for n in os.listdir(METRICS_DIR) if n.startswith("metrics-") and n.endswith(".json")]
+    except OSError:
+        names = []
+    for name in names:
+        try:
+            with open(os.path.join(METRICS_DIR, name), encoding="utf-8") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric, labels, value in snap["counters"]:
+            key = (metric, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for metric, labels, hist in snap["histograms"]:
+            key = (metric, tuple(map(tuple, labels)))
+            total = histograms.get(key)
+            histograms[key] = hist if total is None else [a + b for a, b in zip(total, hist)]
+    return {
+        "counters": [[n, l, v] for (n, l), v in counters.items()],
+        "histograms": [[n, l, h] for (n, l), h in histograms.items()],
+    }
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render():
+    """生成 Prometheus 文本格式"""
+    snap = _collect()
+    series = {}
+    for name, labels, value in snap["counters"]:
+        series.setdefault(name, []).append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+    for name, labels, hist in snap["histograms"]:
+        lines = series.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), hist[:-1]):
+            cumulative += count
+            lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {hist[-1]}")
+        lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {cumulative}")
+    for (name, labels), value in list(_gauges.items()):
+        series.setdefault(name, []).append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+
+    out = []
+    for name in sorted(series):
+        kind, text = HELP.get(name, ("untyped", name))
+        out.append(f"# HELP {PREFIX}{name} {text}")
+        out.append(f"# TYPE {PREFIX}{name} {kind}")
+        out.extend(series[name])
+    return "\n".join(out) + "\n"
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        flush()
+
+
+_flusher_pid = None
+
+
+def start_flusher():
+    """启动定期写入线程（每个进程一个，仅在设置了 METRICS_DIR 时启用）"""
+    global _flusher_pid
+    if not METRICS_DIR or METRICS_FLUSH_SECONDS <= 0 or _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
@@ -0,0 +1,106 @@
+# 携号转网覆盖表：按完整 11 位号码覆盖号段推断出的运营商
+#
+# 数据文件（默认 ported.csv，可用 PORTED_PATH 指定）每行一个号码与转入后的运营商，
+# 逗号 / 制表符 / 空格分隔均可，表头与无法识别的行会被跳过：
+#     13800138000,中国联通
+#     13912345678	电信
+#
+# 号码与运营商编号打包成一个整数（号码 * 4 + 运营商编号）存入有序数组，二分查找；
+# 前面放一个布隆过滤器，绝大多数未转网号码只需一次取模和一次位运算就能确定不在表中。
+import re
+import hashlib
+from array import array
+from bisect import bisect_left
+
+from seg_index import OPERATORS
+
+# 号码, 分隔符, 运营商（允许带"中国"前缀）
+_LINE = re.compile(r"^\s*(1[3-9]\d{9})\s*[,\t ]\s*(?:中国)?(" + "|".join(OPERATORS) + r")", re.M)
+
+# 布隆过滤器：每个号码 12 位、2 个哈希位置，误判率约 2.3%（误判只会多一次二分查找）。
+# 位数组长度取素数，第一个位置直接取 号码 % 长度（号码本身分布均匀，且只需一次小整数取模），
+# 第二个位置只在第一个命中时才计算。
+BLOOM_BITS_PER_KEY = 12
+_MIX = 0x9E3779B1
+
+
+def _next_prime(n):
+    n |= 1
+    while any(n % d == 0 for d in range(3, int(n ** 0.5) + 1, 2)):
+        n += 2
+    return n
+
+
+class PortedStore:
+    """携号转网号码表：布隆过滤器 + 有序打包数组"""
+
+    def __init__(self, overrides, version=None, path=None):
+        """overrides 为 {号码(int): 运营商编号}"""
+        self.keys = array("Q", sorted(phone * 4 + op for phone, op in overrides.items()))
+        self.version = version
+        self.path = path
+        self.bloom_passes = 0       # 通过布隆过滤器（需要二分查找）的次数
+        self.hits = 0
+        self._build_bloom()
+
+    def _build_bloom(self):
+        nbits = self.nbits = _next_prime(max(64, len(self.keys) * BLOOM_BITS_PER_KEY))
+        bits = bytearray((nbits + 7) // 8)
+        for key in self.keys:
+            phone = key >> 2
+            pos = phone % nbits
+            bits[pos >> 3] |= 1 << (pos & 7)
+            pos = (phone * _MIX >> 16) % nbits
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.bits = bytes(bits)
+
+    def get(self, phone):
+        """返回号码（int）转网后的运营商，不在表中返回 None"""
+        bits, nbits = self.bits, self.nbits
+        pos = phone % nbits
+        if not bits[pos >> 3] >> (pos & 7) & 1:
+            return None
+        pos = (phone * _MIX >> 16) % nbits
+        if not bits[pos >> 3] >> (pos & 7) & 1:
+            return None
+        self.bloom_passes += 1
+        keys = self.keys
+        i = bisect_left(keys, phone * 4)
+        if i < len(keys) and keys[i] >> 2 == phone:
+            self.hits += 1
+            return OPERATORS[keys[i] & 3]
+        return None
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return self.keys.itemsize * len(self.keys) + len(self.bits)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "version": self.version,
+            "numbers": len(self.keys),
+            "bytes": self.nbytes,
+            "bloom_passes": self.bloom_passes,
+            "hits": self.hits,
+        }
+
+
+def parse_ported(text):
+    """解析携号转网文件内容，返回 {号码(int): 运营商编号}；同一号码出现多次时以最后一行为准"""
+    op_ids = {op: i for i, op in enumerate(OPERATORS)}
+    return {int(phone): op_ids[op] for phone, op in _LINE.findall(text)}
+
+
+def load_ported(path):
+    """读取携号转网文件，返回 PortedStore；文件不存在返回 None"""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+    overrides = parse_ported(raw.decode("utf-8-sig", errors="ignore"))
+    return PortedStore(overrides, hashlib.sha1(raw).hexdigest()[:16], path)
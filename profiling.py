@@ -0,0 +1,156 @@
+# 内置性能分析：数据加载分阶段耗时 + 按比例抽样的请求调用栈分析
+#
+# 加载分阶段耗时：每次加载（启动与热更新）记录目录扫描、解析、合并校验、号段表构建等阶段的耗时，
+# 通过 GET /api/admin/startup 以 JSON 返回。
+#
+# 请求调用栈分析：设置 PROFILE_SAMPLE_RATE（0~1）或调用 POST /api/admin/profile?rate=0.01 后，
+# 按比例抽取请求，用 sys.setprofile 记录整个 WSGI 调用（Flask 路由、flask_cors、查询逻辑）中
+# 每个调用栈的自身耗时，跨请求累加后写成 flamegraph.pl / speedscope 可直接读取的折叠栈格式：
+#     wsgi GET /api/phone/location;wsgi_app (app.py:1478);...;phone_location (api.py:812) 153
+# 根帧按请求匹配的路由模板命名（未匹配的请求统一为 wsgi <unmatched>），栈的种类不随请求路径增长。
+# 末尾数字为累计微秒。每 PROFILE_DUMP_EVERY 个抽样请求或调用 action=dump 时写入
+# <PROFILE_OUTPUT>-<pid>.folded。被抽中的请求会明显变慢，线上只应使用很小的比例。
+import os
+import sys
+import time
+import random
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_OUTPUT = os.environ.get("PROFILE_OUTPUT", os.path.join(BASE_DIR, "profile"))
+PROFILE_DUMP_EVERY = int(os.environ.get("PROFILE_DUMP_EVERY", "100"))
+
+# 未匹配任何路由（404/405 等）的请求共用的根帧标签
+UNMATCHED_ROOT = "wsgi <unmatched>"
+
+
+# ---------------------- 加载分阶段耗时 ----------------------
+class PhaseTrace:
+    """按顺序记录各阶段耗时：mark(name) 记录自上一次 mark（或创建）以来的耗时"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.started_at = time.time()
+        self.phases = []
+        self.details = {}
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append({"phase": name, "ms": round((now - self._last) * 1000, 3)})
+        self._last = now
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "started_at": round(self.started_at, 3),
+            "total_ms": round((self._last - self._start) * 1000, 3),
+            "phases": self.phases,
+            **self.details,
+        }
+
+
+# ---------------------- 请求调用栈分析 ----------------------
+class _StackTracer:
+    """一次请求内的确定性调用栈分析：把相邻两次事件之间的耗时记到当时的栈顶"""
+
+    def __init__(self, root, labels):
+        self.stack = [root]
+        self.labels = labels
+        self.totals = {}
+        self.last = time.perf_counter()
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        top = self.stack[-1]
+        self.totals[top] = self.totals.get(top, 0.0) + now - self.last
+        if event == "call":
+            code = frame.f_code
+            label = self.labels.get(code)
+            if label is None:
+                label = self.labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self.stack.append(top + ";" + label)
+        elif event == "c_call":
+            self.stack.append(top + ";" + (getattr(arg, "__qualname__", None) or repr(arg)))
+        elif len(self.stack) > 1:
+            self.stack.pop()
+        self.last = time.perf_counter()
+
+
+class SamplingProfiler:
+    """跨请求累加的折叠调用栈 {栈: 秒}"""
+
+    def __init__(self, rate=PROFILE_SAMPLE_RATE, output=PROFILE_OUTPUT, dump_every=PROFILE_DUMP_EVERY):
+        self.rate = rate
+        self.output = output
+        self.dump_every = dump_every
+        self.samples = 0
+        self.last_dump = None
+        self._totals = {}
+        self._labels = {}
+        self._lock = threading.Lock()
+
+    def profile(self, root, fn, *args):
+        """在调用栈分析下执行 fn(*args)"""
+        tracer = _StackTracer(root, self._labels)
+        sys.setprofile(tracer)
+        try:
+            return fn(*args)
+        finally:
+            sys.setprofile(None)
+            with self._lock:
+                totals = self._totals
+                for stack, seconds in tracer.totals.items():
+                    totals[stack] = totals.get(stack, 0.0) + seconds
+                self.samples += 1
+                dump = self.dump_every > 0 and self.samples % self.dump_every == 0
+            if dump:
+                self.dump()
+
+    def path(self):
+        return f"{self.output}-{os.getpid()}.folded"
+
+    def dump(self):
+        """写入折叠栈文件（原子替换），返回文件路径；写入失败返回 None"""
+        with self._lock:
+            lines = [f"{stack} {round(seconds * 1e6)}" for stack, seconds in sorted(self._totals.items())
+                     if seconds >= 5e-7]
+        path = self.path()
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            print(f"⚠️  调用栈分析结果写入失败 {path}: {e}")
+            return None
+        self.last_dump = {"path": path, "stacks": len(lines), "samples": self.samples, "at": int(time.time())}
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self.samples = 0
+
+    def stats(self):
+        return {"rate": self.rate, "samples": self.samples, "stacks": len(self._totals),
+                "output": self.path(), "last_dump": self.last_dump}
+
+
+class SamplingMiddleware:
+    """WSGI 中间件：按 profiler.rate 抽取请求做调用栈分析；rate 为 0 时只多一次比较。
+    route(environ) 返回请求匹配的路由模板，未匹配时返回 None"""
+
+    def __init__(self, wsgi_app, profiler, route):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+        self.route = route
+
+    def __call__(self, environ, start_response):
+        rate = self.profiler.rate
+        if rate <= 0 or random.random() >= rate:
+            return self.wsgi_app(environ, start_response)
+        route = self.route(environ)
+        root = UNMATCHED_ROOT if route is None else f"wsgi {environ.get('REQUEST_METHOD')} {route}"
+        return self.profiler.profile(root, self.wsgi_app, environ, start_response)
@@ -0,0 +1,140 @@
+# 按客户端的令牌桶限流：抵御用随机号码刷查询接口的爬虫，保护正常请求的延迟
+#
+# 每个客户端（默认按 REMOTE_ADDR；部署在反向代理之后时设置 RATE_LIMIT_TRUST_PROXY=N，N 为可信代理的层数，
+# 取 X-Forwarded-For 从右数第 N 个地址，即最外层可信代理看到的对端地址。左侧的地址由客户端自己填写，
+# 随手伪造就能绕过限流，不能使用）
+# 一个令牌桶：每秒补充 RATE_LIMIT_RPS 个令牌，最多积攒 RATE_LIMIT_BURST 个，每个请求消耗一个。
+#
+# 默认每个 worker 在进程内计数（多 worker 时实际放行的速率是配置值乘以 worker 数）。
+# 设置 RATE_LIMIT_SHARED=1 后令牌桶放在 fork 前创建的匿名共享内存中，所有 worker 共用同一组桶
+# （需要 gunicorn preload_app，gunicorn.conf.py 默认开启）；按客户端哈希定址，槽位冲突时后来者接管该槽。
+import os
+import mmap
+import zlib
+import math
+import time
+import struct
+import threading
+import multiprocessing
+from collections import OrderedDict
+
+# 每秒补充的令牌数，0 表示关闭限流
+RATE_LIMIT_RPS = float(os.environ.get("RATE_LIMIT_RPS", "0"))
+# 令牌桶容量（允许的突发请求数），默认为两秒的配额
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", "0")) or max(1.0, RATE_LIMIT_RPS * 2)
+RATE_LIMIT_SHARED = os.environ.get("RATE_LIMIT_SHARED", "") == "1"
+# 可信反向代理的层数，0 表示不信任 X-Forwarded-For
+RATE_LIMIT_TRUST_PROXY = int(os.environ.get("RATE_LIMIT_TRUST_PROXY", "0") or "0")
+# 进程内模式最多跟踪的客户端数，超出时淘汰最久未请求的客户端
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get("RATE_LIMIT_MAX_CLIENTS", "100000"))
+# 共享模式的槽位数（每个 24 字节）
+RATE_LIMIT_SLOTS = int(os.environ.get("RATE_LIMIT_SLOTS", "65536"))
+
+
+def client_key(remote_addr, forwarded_for=None):
+    """限流使用的客户端标识
+
+    只信任可信代理追加的地址（从右数第 RATE_LIMIT_TRUST_PROXY 个）；地址数不足说明请求没有经过
+    全部代理，此时退回 REMOTE_ADDR。
+    """
+    if RATE_LIMIT_TRUST_PROXY and forwarded_for:
+        hops = forwarded_for.split(",")
+        if len(hops) >= RATE_LIMIT_TRUST_PROXY:
+            return hops[-RATE_LIMIT_TRUST_PROXY].strip()
+    return remote_addr or ""
+
+
+class LocalLimiter:
+    """进程内令牌桶：{客户端: [令牌数, 上次更新时间]}，按最近请求时间排序"""
+
+    shared = False
+
+    def __init__(self, rate, burst, max_clients=RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.throttled = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """消耗一个令牌，放行返回 0，限流时返回需要等待的秒数"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # 表满时只淘汰最久未请求的一个桶，轮换客户端标识的爬虫不会让每个请求都扫描整张表
+                if len(self._buckets) >= self.max_clients:
+                    self._buckets.popitem(last=False)
+                self._buckets[key] = [self.burst - 1, now]
+                return 0.0
+            self._buckets.move_to_end(key)
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                self.throttled += 1
+                return (1 - tokens) / self.rate
+            bucket[0] = tokens - 1
+            return 0.0
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "shared": False,
+                "clients": len(self._buckets), "throttled": self.throttled, "throttled_total": self.throttled}
+
+
+# 共享内存布局：被限流总数(u64) | 槽位 [令牌数(f64) | 上次更新时间(f64) | 客户端哈希(u32) | 填充]
+_COUNTER = struct.Struct("<Q")
+_SLOT = struct.Struct("<ddI4x")
+
+
+class SharedLimiter:
+    """跨进程令牌桶：槽位放在匿名共享内存中，用 fork 前创建的进程锁保护读改写"""
+
+    shared = True
+
+    def __init__(self, rate, burst, slots=RATE_LIMIT_SLOTS):
+        self.rate = rate
+        self.burst = burst
+        self.slots = slots
+        self.throttled = 0          # 当前 worker 的限流次数
+        self._mm = mmap.mmap(-1, _COUNTER.size + slots * _SLOT.size)
+        self._lock = multiprocessing.Lock()
+
+    def acquire(self, key):
+        """消耗一个令牌，放行返回 0，限流时返回需要等待的秒数"""
+        h = zlib.crc32(key.encode("utf-8", "replace"))
+        offset = _COUNTER.size + h % self.slots * _SLOT.size
+        now = time.monotonic()
+        mm = self._mm
+        with self._lock:
+            tokens, last, tag = _SLOT.unpack_from(mm, offset)
+            if tag != h or last == 0.0:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                _SLOT.pack_into(mm, offset, tokens, now, h)
+                _COUNTER.pack_into(mm, 0, _COUNTER.unpack_from(mm, 0)[0] + 1)
+                self.throttled += 1
+                return (1 - tokens) / self.rate
+            _SLOT.pack_into(mm, offset, tokens - 1, now, h)
+            return 0.0
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "shared": True, "slots": self.slots,
+                "throttled": self.throttled, "throttled_total": _COUNTER.unpack_from(self._mm, 0)[0]}
+
+
+def retry_after(wait):
+    """Retry-After 响应头的值（整秒，向上取整）"""
+    return str(max(1, math.ceil(wait)))
+
+
+def from_env():
+    """按环境变量创建限流器，未开启时返回 None"""
+    if RATE_LIMIT_RPS <= 0:
+        return None
+    if RATE_LIMIT_SHARED:
+        return SharedLimiter(RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+    return LocalLimiter(RATE_LIMIT_RPS, RATE_LIMIT_BURST)
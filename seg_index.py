@@ -0,0 +1,961 @@
+# 手机号段数据：CSV 解析 + 预编译二进制索引
+#
+# 构建索引（在部署/数据更新后执行一次）：
+#     python seg_index.py build [--root city] [--out seg_index.bin]
+# 查看索引信息：
+#     python seg_index.py info [--out seg_index.bin]
+import os
+import io
+import re
+import sys
+import csv
+import json
+import logging
+import hashlib
+import time
+import mmap
+import zlib
+import struct
+import argparse
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, groupby
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Mapping
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_ROOT = os.path.join(BASE_DIR, "city")
+INDEX_PATH = os.environ.get("SEG_INDEX_PATH", os.path.join(BASE_DIR, "seg_index.bin"))
+
+log = logging.getLogger(__name__)
+
+# ---------------------- 二进制索引格式 ----------------------
+# 头部: magic(8s) | 版本(u32) | 号段数(u32) | 归属地数(u32) | 元数据长度(u32) | 号段表偏移(u32)
+# 之后依次为: 元数据 JSON(UTF-8) | 填充至页边界 | 直接寻址号段表 (SEG_SPAN 个元素，小端序)
+#             | 前缀表（见 PrefixTable.arrays：各级编号、各级置信度、最长匹配展开表）
+# 号段表元素是 1 起始的 locations 下标（0 表示无此号段），元素类型见元数据 typecode。
+INDEX_MAGIC = b"SEGIDX\x00\x00"
+INDEX_VERSION = 3
+_HEADER = struct.Struct("<8sIIIII")
+
+OPERATORS = ("移动", "电信", "联通", "广电")
+
+# 直接寻址表覆盖的号段范围：1300000 ~ 1999999
+SEG_BASE = 1300000
+SEG_SPAN = 700000
+# 七位号段未命中时依次尝试的前缀长度（最长前缀优先）
+PREFIX_LEVELS = (6, 5, 4, 3)
+# 按需加载时的分片：每个三位前缀一个分片，覆盖 10000 个七位号段
+SHARD_WIDTH = 10000
+SHARD_COUNT = SEG_SPAN // SHARD_WIDTH
+
+
+def detect_operator(filename):
+    """从文件名提取运营商，无法识别时返回空字符串"""
+    for operator in OPERATORS:
+        if operator in filename:
+            return operator
+    return ""
+
+
+# ---------------------- 紧凑号段表 ----------------------
+class SegTable(Mapping):
+    """数组实现的只读号段表，接口与 {七位号段: (城市, 运营商)} 字典一致
+
+    table[int(seg) - SEG_BASE] 存放 1 起始的归属地编号（0 表示无此号段），
+    编号指向去重后的 (城市, 运营商) 元组表，查询无需哈希。
+    按需加载时 shards 为 LazyShards，直接读取 table 前需先 shards.ensure(下标 // SHARD_WIDTH)；
+    全部分片加载完成后 shards 置为 None，lazy 仍保留加载器以便查看加载统计。
+    """
+
+    shards = None
+    lazy = None
+
+    def __init__(self, locations=(), table=None, count=None):
+        self.locations = list(locations)
+        typecode = "B" if len(self.locations) < 0xFF else "H"
+        if table is None:
+            table = array(typecode, bytes(SEG_SPAN * array(typecode).itemsize))
+        # table 可以是 array，也可以是 mmap 上的只读 memoryview（多进程共享）
+        self.table = table
+        self._count = SEG_SPAN - table.count(0) if count is None else count
+
+    def _code(self, seg):
+        try:
+            i = int(seg) - SEG_BASE
+        except (TypeError, ValueError):
+            return 0
+        if 0 <= i < SEG_SPAN:
+            # 只读一次：预热线程加载完最后一个分片时会把 shards 置为 None
+            shards = self.shards
+            if shards is not None:
+                shards.ensure(i // SHARD_WIDTH)
+            return self.table[i]
+        return 0
+
+    def __getitem__(self, seg):
+        code = self._code(seg)
+        if not code:
+            raise KeyError(seg)
+        return self.locations[code - 1]
+
+    def get(self, seg, default=None):
+        code = self._code(seg)
+        return self.locations[code - 1] if code else default
+
+    def __contains__(self, seg):
+        return self._code(seg) != 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        self.load_all()
+        table = self.table
+        for i in range(SEG_SPAN):
+            if table[i]:
+                yield str(SEG_BASE + i)
+
+    def load_all(self):
+        """按需加载模式下读入所有剩余分片（遍历整张表之前调用）
+
+        整表加载不是单个查询的冷分片延迟，按预热计数，不计入 cold_loads。
+        """
+        shards = self.shards
+        if shards is not None:
+            for shard in range(SHARD_COUNT):
+                shards.ensure(shard, warm=True)
+
+    @property
+    def shared(self):
+        """号段表是否映射在共享的 mmap 文件上"""
+        return isinstance(self.table, memoryview)
+
+    @property
+    def nbytes(self):
+        """表本身占用的内存（字节）：直接寻址数组 + 归属地元组表"""
+        size = self.table.itemsize * len(self.table) + sys.getsizeof(self.locations)
+        for loc in self.locations:
+            size += sys.getsizeof(loc) + sum(sys.getsizeof(s) for s in loc)
+        return size
+
+
+# 所有按需加载器共用的锁；fork 后在子进程中重建，避免继承父进程预热线程持有的锁
+_SHARD_LOCK = threading.Lock()
+
+
+def _reset_shard_lock():
+    global _SHARD_LOCK
+    _SHARD_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_shard_lock)
+
+
+class LazyShards:
+    """号段表的按需加载器：首次访问某个三位前缀分片时才从索引文件读取该分片
+
+    每个分片一次 pread（SHARD_WIDTH 个元素），冷分片的首次查询延迟有上界且被记录；
+    其余分片由后台预热线程依次加载。打开的是加载时的索引文件，热更新替换文件不影响本快照。
+    """
+
+    def __init__(self, seg_table, path, offset):
+        self.seg_table = seg_table
+        self.offset = offset
+        self.loaded = bytearray(SHARD_COUNT)
+        self.pending = SHARD_COUNT
+        self.cold_loads = 0           # 单个查询触发（而非预热或整表加载）的分片加载次数
+        self.max_load_ms = 0.0
+        self.total_load_ms = 0.0
+        self._fd = os.open(path, os.O_RDONLY)
+        seg_table.lazy = self
+
+    def ensure(self, shard, warm=False):
+        """确保分片已加载，返回本次加载耗时（秒），已加载时返回 None"""
+        if self.loaded[shard]:
+            return None
+        with _SHARD_LOCK:
+            if self.loaded[shard]:
+                return None
+            start = time.perf_counter()
+            table = self.seg_table.table
+            size = SHARD_WIDTH * table.itemsize
+            chunk = array(table.typecode, os.pread(self._fd, size, self.offset + shard * size))
+            if sys.byteorder == "big":
+                chunk.byteswap()
+            table[shard * SHARD_WIDTH:(shard + 1) * SHARD_WIDTH] = chunk
+            self.loaded[shard] = 1
+            self.pending -= 1
+            if not self.pending:
+                os.close(self._fd)
+                self.seg_table.shards = None
+            elapsed = time.perf_counter() - start
+            self.cold_loads += not warm
+            self.max_load_ms = max(self.max_load_ms, elapsed * 1000)
+            self.total_load_ms += elapsed * 1000
+            return elapsed
+
+    def progress(self):
+        return {
+            "shards_loaded": SHARD_COUNT - self.pending,
+            "shards_total": SHARD_COUNT,
+            "cold_loads": self.cold_loads,
+            "max_load_ms": round(self.max_load_ms, 3),
+            "total_load_ms": round(self.total_load_ms, 3),
+        }
+
+
+# ---------------------- 号段区间表 ----------------------
+class SegRanges:
+    """区间压缩的号段表：连续且归属地相同的号段合并为一个 [起点, 终点] 区间
+
+    starts/ends 按起点升序排列且互不重叠，codes 为对应的 1 起始归属地编号（与 SegTable 共用 locations）。
+    区间查询二分定位与查询范围相交的区间，只访问这些区间，无需扫描整张号段表。
+    """
+
+    def __init__(self, locations=(), starts=(), ends=(), codes=()):
+        self.locations = list(locations)
+        self.starts = array("I", starts)
+        self.ends = array("I", ends)
+        self.codes = array("B" if len(self.locations) < 0xFF else "H", codes)
+
+    @classmethod
+    def from_table(cls, seg_table):
+        """由直接寻址号段表生成区间表"""
+        starts, ends, codes = [], [], []
+        i = SEG_BASE
+        for code, group in groupby(seg_table.table):
+            n = sum(1 for _ in group)
+            if code:
+                starts.append(i)
+                ends.append(i + n - 1)
+                codes.append(code)
+            i += n
+        return cls(seg_table.locations, starts, ends, codes)
+
+    def query(self, start, end, offset=0, limit=None):
+        """与 [start, end] 相交的区间按起点分页，返回 (相交区间总数, [(起点, 终点, (城市, 运营商))])
+
+        区间按查询范围截断；只访问本页的区间，耗时 O(log n + 页大小)。
+        """
+        starts, ends, codes, locations = self.starts, self.ends, self.codes, self.locations
+        a, b = bisect_left(ends, start), bisect_right(starts, end)
+        total = max(0, b - a)
+        stop = b if limit is None else min(b, a + offset + limit)
+        page = [(max(starts[i], start), min(ends[i], end), locations[codes[i] - 1])
+                for i in range(a + offset, stop)]
+        return total, page
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def nbytes(self):
+        """三个区间数组占用的内存（字节）"""
+        return sum(a.itemsize * len(a) for a in (self.starts, self.ends, self.codes))
+
+
+# ---------------------- 反向索引与聚合统计 ----------------------
+# 统计与反向索引按三位前缀分组（每个三位前缀覆盖 SHARD_WIDTH 个七位号段）
+STATS_GROUPS = ("city", "operator", "prefix")
+# 聚合结果缓存的条目上限，超出时整体清空
+STATS_CACHE_SIZE = 256
+
+
+class SegStats:
+    """号段数据的反向索引与聚合立方体，由区间表一次生成，之后只读
+
+    反向索引：每个归属地编号一组区间（在三位前缀边界处切开），starts/ends 升序，
+    cums[k] 为前 k 个区间的号段总数；按 (归属地, 前缀) 分页时二分定位起点，耗时 O(log n + 页大小)。
+    聚合立方体：{(归属地编号, 三位前缀): 号段数}；按任意维度上卷的结果缓存在对象上，
+    数据热更新后整个对象随快照一起替换，缓存自然失效。
+    """
+
+    def __init__(self, locations, by_code, cube):
+        self.locations = list(locations)
+        self.by_code = by_code          # {归属地编号: (starts, ends, cums)}
+        self.cube = cube                # {(归属地编号, 三位前缀): 号段数}
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """由区间表生成：区间在三位前缀边界处切开后按归属地分组"""
+        grouped, cube = {}, {}
+        for start, end, code in zip(ranges.starts, ranges.ends, ranges.codes):
+            starts, ends = grouped.setdefault(code, ([], []))
+            while start <= end:
+                prefix = start // SHARD_WIDTH
+                stop = min(end, prefix * SHARD_WIDTH + SHARD_WIDTH - 1)
+                starts.append(start)
+                ends.append(stop)
+                cube[(code, prefix)] = cube.get((code, prefix), 0) + stop - start + 1
+                start = stop + 1
+        by_code = {}
+        for code, (starts, ends) in grouped.items():
+            cums = [0]
+            for start, end in zip(starts, ends):
+                cums.append(cums[-1] + end - start + 1)
+            by_code[code] = (array("I", starts), array("I", ends), array("I", cums))
+        return cls(ranges.locations, by_code, cube)
+
+    def codes(self, city=None, operator=None):
+        """满足条件的归属地编号（升序）"""
+        return [i + 1 for i, (c, op) in enumerate(self.locations)
+                if (city is None or c == city) and (operator is None or op == operator)]
+
+    @staticmethod
+    def _span(entry, start, end):
+        """某个归属地在 [start, end] 内的号段：返回 (首个相交区间下标, 首区间截掉的号段数, 号段数)，不相交返回 None"""
+        starts, ends, cums = entry
+        a, b = bisect_left(ends, start), bisect_right(starts, end)
+        if a >= b:
+            return None
+        head = max(0, start - starts[a])
+        return a, head, cums[b] - cums[a] - head - max(0, ends[b - 1] - end)
+
+    def totals(self, start, end):
+        """[start, end] 内各归属地的号段数，返回按号段数降序排列的 [((城市, 运营商), 号段数)]
+
+        每个归属地两次二分，耗时与范围大小无关。
+        """
+        result = []
+        for code, entry in self.by_code.items():
+            span = self._span(entry, start, end)
+            if span is not None:
+                result.append((code, span[2]))
+        result.sort(key=lambda item: (-item[1], item[0]))
+        return [(self.locations[code - 1], count) for code, count in result]
+
+    def segments(self, codes, start, end, offset, limit):
+        """按归属地编号、号段升序列出 [start, end] 内的七位号段，返回 (总数, 本页号段列表)"""
+        total, page = 0, []
+        for code in codes:
+            entry = self.by_code.get(code)
+            if entry is None:
+                continue
+            span = self._span(entry, start, end)
+            if span is None:
+                continue
+            starts, ends, cums = entry
+            a, head, count = span
+            skip = offset - total
+            total += count
+            if skip >= count or len(page) >= limit:
+                continue
+            # 本归属地内第 skip 个号段所在的区间
+            pos = cums[a] + head + max(0, skip)
+            k = bisect_right(cums, pos) - 1
+            seg = starts[k] + pos - cums[k]
+            remaining = min(limit - len(page), count - max(0, skip))
+            while remaining > 0:
+                n = min(remaining, ends[k] - seg + 1)
+                page.extend(range(seg, seg + n))
+                remaining -= n
+                k += 1
+                if k < len(starts):
+                    seg = starts[k]
+        return total, page
+
+    def rollup(self, group_by, city=None, operator=None, prefix=None):
+        """按 group_by（STATS_GROUPS 的子集）上卷聚合立方体，返回按号段数降序排列的 [(分组键..., 号段数)]
+
+        prefix 为 3 位前缀字符串时只统计该前缀；结果按参数缓存。
+        """
+        key = (group_by, city, operator, prefix)
+        rows = self._cache.get(key)
+        if rows is not None:
+            return rows
+        prefix_id = int(prefix) if prefix is not None else None
+        codes = set(self.codes(city, operator))
+        totals = {}
+        for (code, p), count in self.cube.items():
+            if code not in codes or (prefix_id is not None and p != prefix_id):
+                continue
+            c, op = self.locations[code - 1]
+            values = {"city": c, "operator": op, "prefix": str(p)}
+            group = tuple(values[name] for name in group_by)
+            totals[group] = totals.get(group, 0) + count
+        rows = sorted(((*group, count) for group, count in totals.items()), key=lambda r: (-r[-1], r[:-1]))
+        with self._lock:
+            if len(self._cache) >= STATS_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = rows
+        return rows
+
+
+# ---------------------- 最长前缀匹配表 ----------------------
+class PrefixTable:
+    """3~6 位前缀的多数归属地表，七位号段未命中时按最长前缀回退
+
+    每一级是按前缀直接寻址的数组（第 n 级下标为 (七位号段 - SEG_BASE) // 10 ** (7 - n)），
+    元素为该前缀下号段数最多的归属地编号（与 SegTable 共用 locations），
+    confidence 为该归属地占前缀下全部已知号段的百分比（向下取整，只有全部一致时才是 100）。
+    各级结果再展开为按 6 位前缀寻址的 match_* 数组，查询时一次下标即得到最长匹配。
+    """
+
+    def __init__(self, locations=(), codes=None, confidence=None, match=None):
+        self.locations = list(locations)
+        typecode = "B" if len(self.locations) < 0xFF else "H"
+        self.levels = []          # [(前缀长度, 下标除数, 编号数组, 置信度数组)]，按长度降序
+        for n in PREFIX_LEVELS:
+            size = SEG_SPAN // 10 ** (7 - n)
+            level_codes = codes[n] if codes else array(typecode, bytes(size * array(typecode).itemsize))
+            level_conf = confidence[n] if confidence else array("B", bytes(size))
+            self.levels.append((n, 10 ** (7 - n), level_codes, level_conf))
+
+        # 最长匹配展开表：下标为 (七位号段 - SEG_BASE) // 10；从索引读取时直接传入 match
+        if match is None:
+            match = self._expand(typecode)
+        self.match_codes, self.match_conf, self.match_len = match
+
+    def _expand(self, typecode):
+        """由各级数组生成最长匹配展开表：短前缀先写，长前缀覆盖"""
+        size = SEG_SPAN // 10
+        match_codes = array(typecode, bytes(size * array(typecode).itemsize))
+        match_conf = array("B", bytes(size))
+        match_len = array("B", bytes(size))
+        for n, width, codes, confidence in reversed(self.levels):
+            r = width // 10
+            for p, code in enumerate(codes):
+                if not code:
+                    continue
+                if r == 1:
+                    match_codes[p], match_conf[p], match_len[p] = code, confidence[p], n
+                else:
+                    match_codes[p * r:(p + 1) * r] = array(typecode, [code]) * r
+                    match_conf[p * r:(p + 1) * r] = array("B", [confidence[p]]) * r
+                    match_len[p * r:(p + 1) * r] = array("B", [n]) * r
+        return match_codes, match_conf, match_len
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """由 SegRanges 统计每个前缀下各归属地的号段数，取多数归属地"""
+        typecode = ranges.codes.typecode
+        spans = list(zip(ranges.starts, ranges.ends, ranges.codes))
+        key = 1 << 16             # 计数键 = 前缀下标 * key + 归属地编号
+        codes, confidence = {}, {}
+        for n in PREFIX_LEVELS:
+            width = 10 ** (7 - n)
+            counts = {}
+            for start, end, code in spans:
+                lo, hi = start - SEG_BASE, end - SEG_BASE
+                first, last = lo // width, hi // width
+                if first == last:
+                    k = first * key + code
+                    counts[k] = counts.get(k, 0) + hi - lo + 1
+                    continue
+                k = first * key + code
+                counts[k] = counts.get(k, 0) + (first + 1) * width - lo
+                for p in range(first + 1, last):
+                    k = p * key + code
+                    counts[k] = counts.get(k, 0) + width
+                k = last * key + code
+                counts[k] = counts.get(k, 0) + hi - last * width + 1
+
+            size = SEG_SPAN // width
+            totals = array("I", bytes(4 * size))
+            best = array("I", bytes(4 * size))
+            level_codes = array(typecode, bytes(size * array(typecode).itemsize))
+            for k, count in counts.items():
+                p, code = divmod(k, key)
+                totals[p] += count
+                # 票数相同时取编号较小者，保证结果与目录遍历顺序无关
+                if count > best[p] or (count == best[p] and code < level_codes[p]):
+                    best[p] = count
+                    level_codes[p] = code
+            codes[n] = level_codes
+            confidence[n] = array("B", (b * 100 // t if t else 0 for b, t in zip(best, totals)))
+        return cls(ranges.locations, codes, confidence)
+
+    def keys(self, n):
+        """第 n 级中有数据的前缀（整数，如 138）"""
+        for length, width, codes, _ in self.levels:
+            if length == n:
+                base = SEG_BASE // width
+                return [base + p for p, code in enumerate(codes) if code]
+        raise ValueError(f"不支持的前缀长度: {n}")
+
+    def count(self, n):
+        """第 n 级中有数据的前缀个数"""
+        for length, _, codes, _ in self.levels:
+            if length == n:
+                return len(codes) - codes.count(0)
+        raise ValueError(f"不支持的前缀长度: {n}")
+
+    def arrays(self):
+        """按索引文件中的存放顺序返回全部数组：各级编号、各级置信度、最长匹配展开表"""
+        return ([codes for _, _, codes, _ in self.levels] + [conf for _, _, _, conf in self.levels]
+                + [self.match_codes, self.match_conf, self.match_len])
+
+    def __len__(self):
+        return sum(len(codes) - codes.count(0) for _, _, codes, _ in self.levels)
+
+    @property
+    def nbytes(self):
+        """各级数组与最长匹配展开表占用的内存（字节）"""
+        return sum(a.itemsize * len(a) for a in self.arrays())
+
+
+def content_hash(seg_map):
+    """号段表内容摘要：归属地表 + 号段表（小端序）的 SHA-256 前 16 位，与构建方式、构建时间无关"""
+    seg_map.load_all()
+    table = seg_map.table
+    if sys.byteorder == "big" and table.itemsize > 1:
+        table = array(table.typecode if isinstance(table, array) else table.format, table)
+        table.byteswap()
+    h = hashlib.sha256(json.dumps(seg_map.locations, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    h.update(table)
+    return h.hexdigest()[:16]
+
+
+# ---------------------- 数据快照 ----------------------
+class SegData:
+    """一次完整加载得到的号段数据，构建完成后只读；热更新时整体替换引用，读者不会看到半成品"""
+
+    def __init__(self, seg_map, prefixes, total_loaded, version, source):
+        self.seg_map = seg_map            # SegTable {七位号段: (城市, 运营商)}
+        self.prefixes = prefixes          # PrefixTable 3~6 位前缀的多数归属地
+        self.total_loaded = total_loaded
+        self.version = version            # 源 CSV 内容摘要，内容不变则版本不变
+        self.source = source              # "csv" / "index" / "delta"
+        self.content_hash = None          # 号段表内容摘要（见 content_hash），快照与增量包据此校验
+        self.loaded_at = time.time()
+        self.responses = None             # 由 api 层预先序列化的响应片段
+        self.report = None                # CSV 解析报告：每个文件的号段数、无效单元格数与耗时
+        self.files = None                 # CSV 解析得到的源文件 [(相对路径, mtime_ns, size, sha1, 号段数组)]，写入索引供增量解析复用
+        self.ranges = None                # SegRanges 区间表，供号段范围查询使用
+        self.stats = None                 # SegStats 反向索引与聚合统计
+
+
+# ---------------------- CSV 解析 ----------------------
+# 合法号段单元格：1[3-9] 开头的 7 位数字，允许首尾空白（与原逐格 strip + isdigit 校验等价）
+SEG_CELL = re.compile(r"^[ \t\r\f\v]*(1[3-9]\d{5})[ \t\r\f\v]*$", re.M)
+# 解析进程数：按省份文件夹分发，1 表示在当前进程内顺序解析
+PARSE_WORKERS = int(os.environ.get("SEG_PARSE_WORKERS", str(min(os.cpu_count() or 1, 8))))
+
+
+def parse_csv_text(text):
+    """按列位置解析号段 CSV/TSV 文本，返回 (号段数组, 无效单元格数)
+
+    先按表头定位号段列，把所有号段单元格收集起来后用一次正则扫描完成校验与提取，
+    不再为每行构建 dict、逐格 strip/isdigit。同一文件内号段归属相同，顺序不影响结果。
+    """
+    # 自动检测分隔符：优先 \t，其次 ,
+    first_line = text[:text.find("\n")] if "\n" in text else text
+    delimiter = "\t" if "\t" in first_line else ","
+    reader = csv.reader(io.StringIO(text, newline=""), delimiter=delimiter)
+
+    header = next(reader, None)
+    if not header:
+        return array("I"), 0
+    cols = [i for i, name in enumerate(header) if name not in ("省份", "运营商")]
+    if not cols:
+        return array("I"), 0
+
+    cells = []
+    extend = cells.extend
+    if cols == list(range(cols[0], cols[-1] + 1)):
+        lo, hi = cols[0], cols[-1] + 1
+        for row in reader:
+            extend(row[lo:hi])
+    else:
+        for row in reader:
+            extend(row[i] for i in cols if i < len(row))
+
+    found = SEG_CELL.findall("\n".join(cells))
+    bad_cells = len(cells) - cells.count("") - len(found)
+    return array("I", map(int, found)), bad_cells
+
+
+def parse_file(file_path, known_digest=None):
+    """读取并解析单个号段文件，返回 (sha1, 号段数组, 无效单元格数, 耗时毫秒)
+
+    内容摘要等于 known_digest 时跳过解析，号段数组返回 None。
+    """
+    start = time.perf_counter()
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw).hexdigest()
+    if digest == known_digest:
+        return digest, None, 0, (time.perf_counter() - start) * 1000
+    segs, bad_cells = parse_csv_text(raw.decode("utf-8-sig", errors="ignore"))
+    return digest, segs, bad_cells, (time.perf_counter() - start) * 1000
+
+
+def _parse_folder(jobs):
+    """进程池任务：解析一个省份文件夹中需要更新的文件，单个文件失败不影响其他文件"""
+    results = []
+    for file_path, known_digest in jobs:
+        try:
+            results.append(parse_file(file_path, known_digest))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _run_jobs(jobs, workers):
+    """执行解析任务 {省份: [(文件路径, 已知摘要)]}，返回 {文件路径: 结果}"""
+    groups = list(jobs.values())
+    if workers > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(groups))) as pool:
+            outputs = list(pool.map(_parse_folder, groups))
+    else:
+        outputs = [_parse_folder(group) for group in groups]
+    return {path: result for group, output in zip(groups, outputs)
+            for (path, _), result in zip(group, output)}
+
+
+def parse_city_dir(root=LOCAL_ROOT, cache=None, workers=None):
+    """遍历 city/ 目录解析所有 CSV/TSV 号段文件，返回 SegData
+
+    同一七位号段出现在多个文件中时以最后写入者为准；前缀回退表按多数归属地生成，与遍历顺序无关。
+    各省份文件夹分发到进程池并行解析，再按目录遍历顺序合并，结果与顺序解析相同。
+    cache 为 {文件路径: (mtime_ns, size, sha1, 号段数组)}，传入时只重新解析
+    mtime/大小变化且内容摘要也变化的文件，其余直接复用上次的解析结果。
+    每个文件的号段数、无效单元格数与耗时记录在返回值的 report 中，各阶段耗时记录在 report["phases_ms"]。
+    """
+    if cache is None:
+        cache = {}
+    workers = PARSE_WORKERS if workers is None else workers
+    start = time.perf_counter()
+
+    city_folders = [f for f in os.listdir(root) if os.path.isdir(os.path.join(root, f))]
+    log.info(f"✅ 发现 {len(city_folders)} 个城市文件夹")
+
+    # 1. 扫描目录，未变化的文件直接复用缓存，其余按省份分组
+    entries = []          # [(城市, 文件名, 路径, 运营商, stat)]，按加载顺序
+    jobs = {}             # {城市: [(路径, 已缓存摘要)]}
+    for city in city_folders:
+        city_path = os.path.join(root, city)
+        for csv_file in [f for f in os.listdir(city_path) if f.endswith(".csv")]:
+            file_path = os.path.join(city_path, csv_file)
+            operator = detect_operator(csv_file)
+            if not operator:
+                log.warning(f"⚠️  跳过文件（无法识别运营商）: {csv_file}")
+                continue
+            try:
+                st = os.stat(file_path)
+            except OSError as e:
+                log.error(f"❌ 加载失败 {file_path}: {e}")
+                continue
+            entries.append((city, csv_file, file_path, operator, st))
+            cached = cache.get(file_path)
+            if not (cached and cached[:2] == (st.st_mtime_ns, st.st_size)):
+                jobs.setdefault(city, []).append((file_path, cached[2] if cached else None))
+    t_scan = time.perf_counter()
+
+    # 2. 并行解析
+    results = _run_jobs(jobs, workers) if jobs else {}
+    t_parse = time.perf_counter()
+
+    # 3. 按目录顺序合并，后写入者覆盖先写入者
+    files = []            # [((城市, 运营商), 号段数组)]
+    sources = []          # [(相对路径, mtime_ns, size, sha1, 号段数组)]
+    report = []
+    total_loaded = 0
+    version = hashlib.sha1()
+    for city, csv_file, file_path, operator, st in entries:
+        result = results.get(file_path)
+        if isinstance(result, Exception):
+            log.error(f"❌ 加载失败 {file_path}: {result}")
+            cache.pop(file_path, None)
+            continue
+        if result is None or result[1] is None:
+            digest, segs = cache[file_path][2], cache[file_path][3]
+            record = {"segments": len(segs), "bad_cells": None, "ms": result[3] if result else 0.0, "status": "reused"}
+        else:
+            digest, segs, bad_cells, ms = result
+            record = {"segments": len(segs), "bad_cells": bad_cells, "ms": ms, "status": "parsed"}
+        cache[file_path] = (st.st_mtime_ns, st.st_size, digest, segs)
+        sources.append((f"{city}/{csv_file}", st.st_mtime_ns, st.st_size, digest, segs))
+        report.append({"file": f"{city}/{csv_file}", **record})
+
+        version.update(f"{city}/{csv_file}:{digest}\n".encode("utf-8"))
+        if segs:
+            files.append(((city, operator), segs))
+        total_loaded += len(segs)
+    t_merge = time.perf_counter()
+
+    locations = sorted({loc for loc, _ in files})
+    loc_ids = {loc: i + 1 for i, loc in enumerate(locations)}
+    table = SegTable(locations).table
+    for loc, segs in files:
+        code = loc_ids[loc]
+        for seg in segs:
+            table[seg - SEG_BASE] = code
+
+    # 已删除的文件不再保留在缓存中
+    seen = {entry[2] for entry in entries}
+    for file_path in set(cache) - seen:
+        del cache[file_path]
+
+    wall_ms = (time.perf_counter() - start) * 1000
+    parsed = [r for r in report if r["status"] == "parsed"]
+    bad_total = sum(r["bad_cells"] for r in parsed)
+    log.info(f"📊 解析 {len(parsed)} 个文件（复用 {len(report) - len(parsed)} 个），"
+          f"{min(workers, max(len(jobs), 1))} 个进程，总耗时 {wall_ms:.0f}ms，无效单元格 {bad_total} 个")
+    for r in parsed:
+        if r["bad_cells"]:
+            log.warning(f"⚠️  {r['file']}: {r['bad_cells']} 个无效单元格")
+
+    t_table = time.perf_counter()
+    seg_map = SegTable(locations, table)
+    ranges = SegRanges.from_table(seg_map)
+    t_ranges = time.perf_counter()
+    data = SegData(seg_map, PrefixTable.from_ranges(ranges), total_loaded, version.hexdigest()[:16], "csv")
+    data.ranges = ranges
+    data.content_hash = content_hash(seg_map)
+    data.files = sources
+    t_end = time.perf_counter()
+    phases = (("scan", start, t_scan), ("parse", t_scan, t_parse), ("merge_validate", t_parse, t_merge),
+              ("map_build", t_merge, t_table), ("ranges", t_table, t_ranges), ("prefix_table", t_ranges, t_end))
+    data.report = {"workers": workers, "wall_ms": round(wall_ms, 1), "bad_cells": bad_total,
+                   "phases_ms": {name: round((b - a) * 1000, 3) for name, a, b in phases},
+                   "files": [dict(r, ms=round(r["ms"], 2)) for r in report]}
+    return data
+
+
+def source_mtime(root=LOCAL_ROOT):
+    """返回 city/ 下所有目录与 CSV 文件的最新修改时间（增删文件也会更新目录 mtime）"""
+    latest = os.stat(root).st_mtime
+    for city in os.listdir(root):
+        city_path = os.path.join(root, city)
+        if not os.path.isdir(city_path):
+            continue
+        latest = max(latest, os.stat(city_path).st_mtime)
+        for name in os.listdir(city_path):
+            if name.endswith(".csv"):
+                latest = max(latest, os.stat(os.path.join(city_path, name)).st_mtime)
+    return latest
+
+
+def index_is_fresh(path=INDEX_PATH, root=LOCAL_ROOT):
+    """索引文件存在且比所有 CSV 都新时返回 True"""
+    try:
+        return os.stat(path).st_mtime > source_mtime(root)
+    except OSError:
+        return False
+
+
+# ---------------------- 索引读写 ----------------------
+# 索引文件布局：文件头 | 元数据 JSON | 填充到页边界 | 号段表 | 前缀表各数组 | 各源文件号段（可选）
+# 源文件号段段落供热更新时的增量解析复用：每个文件的号段排序后差分编码再 zlib 压缩，
+# 偏移与长度记录在元数据 files 中（相对于该段落起点）；旧版读取方忽略该段落。
+def _index_layout(typecode):
+    """号段表字节数与前缀表各数组的 (元素类型, 长度)，顺序与 PrefixTable.arrays 一致"""
+    table_bytes = SEG_SPAN * array(typecode).itemsize
+    level_sizes = [SEG_SPAN // 10 ** (7 - n) for n in PREFIX_LEVELS]
+    prefix_layout = ([(typecode, size) for size in level_sizes] + [("B", size) for size in level_sizes]
+                     + [(typecode, SEG_SPAN // 10), ("B", SEG_SPAN // 10), ("B", SEG_SPAN // 10)])
+    return table_bytes, prefix_layout
+
+
+def pack_segs(segs):
+    """号段数组 -> 排序差分 + zlib（保留重复号段，号段数不变）"""
+    ordered = sorted(segs)
+    deltas = array("I", [b - a for a, b in zip([0] + ordered, ordered)])
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return zlib.compress(deltas.tobytes(), 6)
+
+
+def unpack_segs(raw):
+    deltas = array("I")
+    deltas.frombytes(zlib.decompress(raw))
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return array("I", accumulate(deltas))
+
+
+def write_index(data, path=INDEX_PATH):
+    """把 SegData 写成二进制索引（先写临时文件再原子替换），返回号段数"""
+    seg_map = data.seg_map
+    seg_map.load_all()
+    locations = seg_map.locations
+    typecode = seg_map.table.typecode if isinstance(seg_map.table, array) else seg_map.table.format
+
+    # 号段表与前缀表直接落盘（前缀表与号段表共用归属地编号）
+    table = array(typecode, seg_map.table)
+    prefix_arrays = [array(a.typecode, a) for a in data.prefixes.arrays()]
+    if sys.byteorder == "big":
+        for a in [table] + prefix_arrays:
+            a.byteswap()
+
+    sources = data.files or []
+    blobs = [pack_segs(segs) for *_, segs in sources]
+    file_meta = []
+    offset = 0
+    for (name, mtime_ns, size, digest, _), blob in zip(sources, blobs):
+        file_meta.append([name, mtime_ns, size, digest, offset, len(blob)])
+        offset += len(blob)
+
+    meta = json.dumps({
+        "locations": locations,
+        "total_loaded": data.total_loaded,
+        "version": data.version,
+        "content_hash": data.content_hash or content_hash(seg_map),
+        "typecode": table.typecode,
+        "built_at": int(time.time()),
+        "files": file_meta,
+    }, ensure_ascii=False, separators=(',', ':')).encode("utf-8")
+    # 号段表按页对齐，便于 mmap 后直接作为数组使用
+    table_offset = -(-(_HEADER.size + len(meta)) // mmap.PAGESIZE) * mmap.PAGESIZE
+
+    count = len(seg_map)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, count, len(locations), len(meta), table_offset))
+        f.write(meta)
+        f.write(bytes(table_offset - _HEADER.size - len(meta)))
+        table.tofile(f)
+        for a in prefix_arrays:
+            a.tofile(f)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_index(path=INDEX_PATH, shared=False, lazy=False):
+    """读取二进制索引，返回 SegData
+
+    shared=True 时号段表直接映射到只读 mmap 上，同一索引文件的所有进程共享物理内存页；
+    lazy=True 时只读取元数据与前缀表，号段表按三位前缀分片在首次访问时读取（见 LazyShards）；
+    否则读入进程私有数组。文件损坏或版本不符时抛出 ValueError。
+    """
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise ValueError("索引文件头不完整")
+        magic, version, seg_count, loc_count, meta_len, table_offset = _HEADER.unpack(header)
+        if magic != INDEX_MAGIC:
+            raise ValueError("不是号段索引文件")
+        if version != INDEX_VERSION:
+            raise ValueError(f"索引版本不兼容: {version}（需要 {INDEX_VERSION}）")
+
+        meta = json.loads(f.read(meta_len).decode("utf-8"))
+        typecode = meta["typecode"]
+        table_bytes, prefix_layout = _index_layout(typecode)
+        prefix_bytes = sum(array(t).itemsize * size for t, size in prefix_layout)
+        if os.fstat(f.fileno()).st_size < table_offset + table_bytes + prefix_bytes:
+            raise ValueError("索引文件被截断")
+
+        if shared and (typecode == "B" or sys.byteorder == "little"):
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            table = memoryview(mm)[table_offset:table_offset + table_bytes].cast(typecode)
+        elif lazy:
+            table = array(typecode, bytes(table_bytes))
+        else:
+            f.seek(table_offset)
+            table = array(typecode)
+            table.fromfile(f, SEG_SPAN)
+            if sys.byteorder == "big":
+                table.byteswap()
+
+        # 前缀表很小，总是读入进程私有数组
+        f.seek(table_offset + table_bytes)
+        prefix_arrays = []
+        for t, size in prefix_layout:
+            a = array(t)
+            a.fromfile(f, size)
+            if sys.byteorder == "big":
+                a.byteswap()
+            prefix_arrays.append(a)
+
+    locations = [tuple(loc) for loc in meta["locations"]]
+    if len(locations) != loc_count:
+        raise ValueError("索引归属地表长度不符")
+
+    seg_map = SegTable(locations, table, seg_count)
+    if lazy and isinstance(table, array):
+        seg_map.shards = LazyShards(seg_map, path, table_offset)
+    k = len(PREFIX_LEVELS)
+    prefixes = PrefixTable(locations, dict(zip(PREFIX_LEVELS, prefix_arrays[:k])),
+                           dict(zip(PREFIX_LEVELS, prefix_arrays[k:2 * k])), prefix_arrays[2 * k:])
+    data = SegData(seg_map, prefixes, meta["total_loaded"], meta.get("version"), "index")
+    data.content_hash = meta.get("content_hash")
+    return data
+
+
+def read_index_files(path=INDEX_PATH):
+    """读取索引中记录的源文件 [(相对路径, mtime_ns, size, sha1, 号段数组)]（即 SegData.files）
+
+    索引不可用或不含源文件号段时返回空列表。
+    """
+    try:
+        with open(path, "rb") as f:
+            magic, version, _, _, meta_len, table_offset = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                return []
+            meta = json.loads(f.read(meta_len).decode("utf-8"))
+            files = meta.get("files")
+            if not files:
+                return []
+            table_bytes, prefix_layout = _index_layout(meta["typecode"])
+            f.seek(table_offset + table_bytes + sum(array(t).itemsize * size for t, size in prefix_layout))
+            section = f.read()
+        return [(name, mtime_ns, size, digest, unpack_segs(section[off:off + n]))
+                for name, mtime_ns, size, digest, off, n in files]
+    except (OSError, ValueError, KeyError, struct.error, zlib.error):
+        return []
+
+
+def read_parse_cache(path=INDEX_PATH, root=LOCAL_ROOT):
+    """从索引读取各源文件，返回 parse_city_dir 所用的缓存 {文件路径: (mtime_ns, size, sha1, 号段数组)}"""
+    return {os.path.join(root, *name.split("/")): (mtime_ns, size, digest, segs)
+            for name, mtime_ns, size, digest, segs in read_index_files(path)}
+
+
+def read_index_version(path=INDEX_PATH):
+    """只读取索引元数据中的数据版本，文件不可用时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            magic, version, _, _, meta_len, _ = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                return None
+            return json.loads(f.read(meta_len).decode("utf-8")).get("version")
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+# ---------------------- 命令行 ----------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="手机号段二进制索引工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="把 city/ 目录编译为二进制索引")
+    build.add_argument("--root", default=LOCAL_ROOT, help="号段 CSV 根目录")
+    build.add_argument("--out", default=INDEX_PATH, help="索引输出路径")
+
+    info = sub.add_parser("info", help="查看索引文件信息")
+    info.add_argument("--out", default=INDEX_PATH, help="索引文件路径")
+    info.add_argument("--root", default=LOCAL_ROOT, help="号段 CSV 根目录（用于判断是否过期）")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "build":
+        start = time.perf_counter()
+        count = write_index(parse_city_dir(args.root), args.out)
+        elapsed = time.perf_counter() - start
+        print(f"✅ 索引已生成: {args.out}（{count} 个号段，{os.path.getsize(args.out)} 字节，耗时 {elapsed:.2f}s）")
+        return 0
+
+    start = time.perf_counter()
+    data = read_index(args.out)
+    elapsed = time.perf_counter() - start
+    print(f"📦 索引文件: {args.out}")
+    print(f"   - 数据版本: {data.version}")
+    print(f"   - 内容摘要: {data.content_hash or '无（旧版索引，请重新 build）'}")
+    print(f"   - 7位号段: {len(data.seg_map)}")
+    print(f"   - 3~6位前缀: {len(data.prefixes)}（3位 {data.prefixes.count(3)} 个）")
+    print(f"   - 读取耗时: {elapsed * 1000:.1f}ms")
+    print(f"   - 是否最新: {'是' if index_is_fresh(args.out, args.root) else '否（请重新 build）'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
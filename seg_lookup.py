@@ -0,0 +1,623 @@
+# 手机号归属地查询库：号段数据加载、热更新与查询，不依赖 Flask
+#
+# 在 ETL 任务或其他 Python 服务中直接使用，无需经过 HTTP：
+#     import seg_lookup
+#     seg_lookup.lookup("13800138000")          # {"phone", "code", "msg", "data"}
+#     seg_lookup.lookup_many(phones)            # 任意可迭代对象，返回同序结果列表
+#
+# 第一次查询时才加载号段数据（进程内单例，线程安全），也可以提前调用 get_data() 预热。
+# api.py / asgi.py 是在此之上的 HTTP 封装，返回的 code/msg/data 与接口完全一致。
+import os
+import re
+import logging
+import time
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台：热更新时不做跨进程互斥
+    fcntl = None
+
+import metrics
+import ported
+import profiling
+import seg_index
+import snapshot
+
+log = logging.getLogger(__name__)
+
+# ---------------------- 路径配置 ----------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_ROOT = os.path.join(BASE_DIR, "city")
+
+# 设置 SEG_SHARED_MMAP=1 时号段表映射到只读索引文件上，所有 worker 共享同一份物理内存
+SHARED_MMAP = os.environ.get("SEG_SHARED_MMAP", "") == "1"
+# 设置 SEG_LAZY_LOAD=1 时（且未开启共享 mmap）启动只读取索引元数据与前缀表，
+# 号段表按三位前缀分片在首次访问时加载，后台线程预热其余分片
+LAZY_LOAD = os.environ.get("SEG_LAZY_LOAD", "") == "1"
+# 预热线程每加载一个分片后的让出间隔（秒），避免与请求争抢 GIL
+WARMUP_DELAY = float(os.environ.get("SEG_WARMUP_DELAY", "0.005"))
+
+# 携号转网覆盖表文件（每行 号码,运营商），文件不存在时不启用覆盖
+PORTED_PATH = os.environ.get("PORTED_PATH", os.path.join(BASE_DIR, "ported.csv"))
+
+# 当前生效的号段数据快照（seg_index.SegData），None 表示尚未加载。热更新时在后台构建新快照后
+# 整体替换该引用，查询时先取一次再使用，保证同一次查询内看到的是同一份完整数据。
+DATA = None
+_LOAD_LOCK = threading.Lock()
+# 当前生效的携号转网覆盖表（ported.PortedStore），None 表示未启用；与号段数据分别加载、分别热更新
+PORTED = None
+_ported_stamp = None  # 覆盖表文件的 (mtime_ns, size)，未变化时热更新跳过
+
+# 数据切换前依次调用的回调，参数为新的 SegData（如 api 层预序列化响应片段）
+ACTIVATE_HOOKS = []
+
+# ---------------------- 查询常量 ----------------------
+PHONE_PATTERN = re.compile(r"1[3-9]\d{9}")
+MSG_OK = "查询成功"
+MSG_INVALID_PHONE = "请输入11位有效手机号（13/14/15/17/18/19开头）"
+MSG_NOT_FOUND = "未查询到该号段归属地"
+
+# 号段类型：7 位为精确号段，3~6 位为最长前缀回退
+SEG_TYPES = {n: "7位号段" if n == 7 else f"{n}位前缀" for n in range(3, 8)}
+
+# 查询结果指标的标签（预先构造，热路径上不再分配）
+RESULT_SEG7 = (("result", "seg7"),)
+RESULT_PREFIX = (("result", "prefix"),)
+RESULT_MISS = (("result", "miss"),)
+RESULT_INVALID = (("result", "invalid"),)
+
+# ---------------------- 热更新配置 ----------------------
+# 触发文件：mtime 变化后每个进程都会在后台重新加载（touch 该文件即可手动触发）
+RELOAD_STAMP = os.environ.get("SEG_RELOAD_STAMP", os.path.join(BASE_DIR, ".seg_reload"))
+# 触发文件轮询间隔（秒），0 表示关闭
+RELOAD_POLL_SECONDS = float(os.environ.get("SEG_RELOAD_POLL_SECONDS", "2"))
+
+_PARSE_CACHE = {}     # 增量解析缓存 {文件路径: (mtime_ns, size, sha1, 号段数组)}
+_RELOAD_LOCK = threading.Lock()
+RELOAD_STATE = {"in_progress": False, "last_result": None, "last_duration_ms": None, "last_finished_at": None}
+
+# 加载分阶段耗时（profiling.PhaseTrace）：首次加载与最近一次加载（含热更新）
+STARTUP_TRACE = None
+LAST_LOAD_TRACE = None
+
+
+# ---------------------- 数据加载 ----------------------
+def empty_data():
+    """没有任何号段的数据快照（city/ 目录缺失时使用）"""
+    return seg_index.SegData(seg_index.SegTable(), seg_index.PrefixTable(), 0, None, "empty")
+
+
+def build_seg_data(current_version=None, trace=None, reloading=False):
+    """构建一份新的号段数据快照：优先读取预编译二进制索引，索引缺失或过期时回退到解析 CSV
+
+    数据版本与 current_version 相同时返回 None（无需切换）。传入 trace 时记录各阶段耗时。
+    设置了 SNAPSHOT_SOURCE 时先持有索引构建锁从快照来源同步索引（见 snapshot.py），来源不可用时使用本地索引或 CSV。
+    热更新时（reloading=True）持有跨进程的索引构建锁，在当前进程内顺序解析并写出索引：
+    同一部署下只有第一个拿到锁的 worker 解析 CSV，其余 worker 拿到锁时索引已是最新，直接读取。
+    """
+    trace = trace or profiling.PhaseTrace("build")
+    if snapshot.enabled():
+        # 同一台机器上只有第一个拿到锁的 worker 下载并写出索引，其余 worker 拿到锁时本地索引已是最新
+        with _index_build_lock():
+            trace.mark("index_lock")
+            data = _build_from_snapshot(current_version, trace)
+        if data is not False:
+            return data
+    if not reloading:
+        return _build_local(current_version, trace)
+    with _index_build_lock():
+        trace.mark("index_lock")
+        # worker 的后台线程中不 fork 解析进程池：多线程进程 fork 不安全，且所有 worker 同时 fork 会占满 CPU
+        return _build_local(current_version, trace, workers=1, persist=True)
+
+
+@contextlib.contextmanager
+def _index_build_lock():
+    """跨进程的索引构建锁（对索引旁的 .lock 文件加 flock），无法加锁时直接执行"""
+    if fcntl is None:
+        yield
+        return
+    try:
+        f = open(f"{seg_index.INDEX_PATH}.lock", "a")
+    except OSError:
+        yield
+        return
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _build_local(current_version, trace, workers=None, persist=False):
+    """从本地索引或 city/ 构建；persist=True 时解析 CSV 后总是写出索引，供其他进程直接读取"""
+    fresh = seg_index.index_is_fresh(seg_index.INDEX_PATH, LOCAL_ROOT)
+    trace.mark("index_check")
+    if fresh:
+        if current_version and seg_index.read_index_version(seg_index.INDEX_PATH) == current_version:
+            trace.mark("read_index_version")
+            return None
+        try:
+            data = seg_index.read_index(seg_index.INDEX_PATH, shared=SHARED_MMAP,
+                                        lazy=LAZY_LOAD and not SHARED_MMAP)
+            trace.mark("read_index")
+            trace.details["source"] = "index"
+            log.info(f"⚡ 已从二进制索引加载: {seg_index.INDEX_PATH}{'（号段表按需加载）' if data.seg_map.shards else ''}")
+            return data
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️  二进制索引不可用，改为解析 CSV: {e}")
+    elif os.path.exists(seg_index.INDEX_PATH):
+        log.warning("⚠️  二进制索引已过期，改为解析 CSV（可执行 python seg_index.py build 重新生成）")
+
+    if not _PARSE_CACHE:
+        # 从索引启动的进程没有解析缓存：用（已过期的）索引中记录的各文件摘要与号段补齐，只重新解析变化的文件
+        _PARSE_CACHE.update(seg_index.read_parse_cache(seg_index.INDEX_PATH, LOCAL_ROOT))
+        trace.mark("read_parse_cache")
+    data = seg_index.parse_city_dir(LOCAL_ROOT, _PARSE_CACHE, workers)
+    trace.mark("parse_csv")
+    trace.details["source"] = "csv"
+    # 解析报告：进程数、总耗时、各阶段耗时、无效单元格数与每个文件的号段数/耗时/是否复用
+    trace.details["parse_csv"] = data.report
+    if persist:
+        # 内容未变（如只 touch 了 CSV）时也写出，其他 worker 不必再各自解析一遍
+        try:
+            seg_index.write_index(data, seg_index.INDEX_PATH)
+            log.info(f"💾 已生成二进制索引: {seg_index.INDEX_PATH}")
+        except OSError as e:
+            log.warning(f"⚠️  无法写出二进制索引: {e}")
+        trace.mark("write_index")
+    if current_version and data.version == current_version:
+        return None
+    if SHARED_MMAP:
+        # 共享模式依赖索引文件：先落盘再映射（写入是原子替换，多个 worker 同时生成也安全）
+        try:
+            if not persist:
+                seg_index.write_index(data, seg_index.INDEX_PATH)
+                log.info(f"💾 已生成二进制索引: {seg_index.INDEX_PATH}")
+            shared = seg_index.read_index(seg_index.INDEX_PATH, shared=True)
+            shared.ranges = data.ranges
+            data = shared
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️  无法生成共享索引，改用进程内号段表: {e}")
+        trace.mark("map_index")
+    return data
+
+
+def _read_local_index():
+    return seg_index.read_index(seg_index.INDEX_PATH, shared=SHARED_MMAP, lazy=LAZY_LOAD and not SHARED_MMAP)
+
+
+def _build_from_snapshot(current_version, trace):
+    """从快照来源同步后加载；数据未变化时返回 None，需要回退到本地 CSV 时返回 False"""
+    current = DATA if DATA is not None and DATA.version == current_version else None
+    try:
+        how, data = snapshot.sync_index(current)
+    except (OSError, ValueError, KeyError) as e:
+        # 热更新时保持当前版本（不擅自改用本地 CSV，避免与其他节点不一致）；启动时退回本地索引或 CSV
+        if current_version:
+            raise
+        log.warning(f"⚠️  快照同步失败，使用本地数据: {e}")
+        if not os.path.exists(seg_index.INDEX_PATH):
+            return False if os.path.exists(LOCAL_ROOT) else empty_data()
+        how, data = "local", None
+    trace.mark("snapshot_sync")
+    trace.details["source"] = f"snapshot:{how}"
+    if how == "current":
+        return None
+    if data is None or SHARED_MMAP:
+        # 完整快照已落盘，或共享模式需要映射刚写入的索引文件
+        ranges = data.ranges if data is not None else None
+        data = _read_local_index()
+        if ranges is not None and data.seg_map.shards is None:
+            data.ranges = ranges
+        trace.mark("read_index")
+    if current_version and data.version == current_version:
+        return None
+    return data
+
+
+def load_seg_data():
+    """加载号段数据并设为当前数据（启动时或第一次查询时调用）"""
+    global STARTUP_TRACE, LAST_LOAD_TRACE
+    trace = profiling.PhaseTrace("startup")
+    log.info("=" * 60)
+    log.info("🚀 开始加载手机号段数据...")
+    log.info(f"📁 数据目录: {LOCAL_ROOT}")
+
+    if not os.path.exists(LOCAL_ROOT) and not snapshot.enabled():
+        log.error("❌ 错误: city/ 目录不存在！请确保它与 api.py 在同一目录。")
+        activate_data(empty_data(), 0.0)
+        STARTUP_TRACE = LAST_LOAD_TRACE = trace
+        return
+
+    start = time.perf_counter()
+    data = build_seg_data(trace=trace)
+    activate_data(data, time.perf_counter() - start, trace)
+    load_ported_data()
+    trace.mark("ported")
+    trace.details["data_version"] = data.version
+    STARTUP_TRACE = LAST_LOAD_TRACE = trace
+
+    log.info(f"✅ 数据加载完成！共加载 {data.total_loaded} 个号段")
+    log.info(f"   - 数据版本: {data.version}（内容摘要 {data.content_hash}）")
+    log.info(f"   - 7位号段: {len(data.seg_map)}")
+    log.info(f"   - 3~6位前缀: {len(data.prefixes)}（3位 {data.prefixes.count(3)} 个）")
+    log.info(f"   - 号段表内存: {data.seg_map.nbytes / 1024:.0f} KB{'（mmap 共享）' if data.seg_map.shared else ''}")
+    if data.ranges is not None:
+        log.info(f"   - 号段区间: {len(data.ranges)} 个，{data.ranges.nbytes / 1024:.0f} KB")
+    log.info("=" * 60)
+
+
+def activate_data(data, seconds, trace=None):
+    """预处理新加载的数据快照并切换为当前数据"""
+    global DATA
+    trace = trace or profiling.PhaseTrace("activate")
+    # 按需加载时区间表需要完整号段表，留到预热完成后再生成
+    if data.ranges is None and data.seg_map.shards is None:
+        data.ranges = seg_index.SegRanges.from_table(data.seg_map)
+        trace.mark("ranges")
+    if data.ranges is not None:
+        data.stats = seg_index.SegStats.from_ranges(data.ranges)
+        trace.mark("stats")
+    if data.content_hash is None and data.seg_map.shards is None:
+        # 旧版索引没有记录内容摘要，补算一次供多节点核对
+        data.content_hash = seg_index.content_hash(data.seg_map)
+    for hook in ACTIVATE_HOOKS:
+        hook(data)
+    trace.mark("activate_hooks")
+    DATA = data
+    metrics.set_gauge("data_load_duration_seconds", round(seconds, 6))
+    metrics.set_gauge("segments", len(data.seg_map), (("type", "seg7"),))
+    metrics.set_gauge("segments", len(data.prefixes), (("type", "prefix"),))
+    start_warmup()
+
+
+def load_ported_data():
+    """加载携号转网覆盖表（文件未变化时跳过），返回是否有变化"""
+    global PORTED, _ported_stamp
+    try:
+        st = os.stat(PORTED_PATH)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+    if stamp == _ported_stamp:
+        return False
+    _ported_stamp = stamp
+
+    store = None
+    if stamp is not None:
+        start = time.perf_counter()
+        try:
+            store = ported.load_ported(PORTED_PATH)
+        except OSError as e:
+            log.error(f"❌ 携号转网文件加载失败 {PORTED_PATH}: {e}")
+            return False
+        if store is not None:
+            log.info(f"📶 携号转网覆盖表: {len(store)} 个号码，{store.nbytes / 1024:.0f} KB，"
+                  f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+    PORTED = store
+    metrics.set_gauge("ported_numbers", len(store) if store is not None else 0)
+    return True
+
+
+def lookup_path(status, seg, override):
+    """查询结果来自哪条路径：seg7 / prefix（前缀回退）/ ported（携号转网覆盖）/ miss / invalid"""
+    if status == 400:
+        return "invalid"
+    if status == 404:
+        return "miss"
+    if override is not None:
+        return "ported"
+    return "seg7" if len(seg) == 7 else "prefix"
+
+
+def version_tag(data):
+    """响应缓存与 ETag 使用的数据版本：号段数据版本，启用携号转网时再拼上覆盖表版本"""
+    store = PORTED
+    return f"{data.version}.{store.version}" if store is not None else data.version
+
+
+def add_activate_hook(hook):
+    """注册数据切换回调；数据已加载时立即对当前数据调用一次"""
+    with _LOAD_LOCK:
+        ACTIVATE_HOOKS.append(hook)
+        if DATA is not None:
+            hook(DATA)
+
+
+def get_data():
+    """返回当前号段数据快照，尚未加载时先加载（只加载一次）"""
+    data = DATA
+    if data is None:
+        with _LOAD_LOCK:
+            if DATA is None:
+                load_seg_data()
+        data = DATA
+    return data
+
+
+# ---------------------- 按需加载与预热 ----------------------
+def load_shard(shards, shard):
+    """查询路径上加载冷分片，并记录加载耗时"""
+    elapsed = shards.ensure(shard)
+    if elapsed is not None:
+        metrics.observe("shard_load_seconds", (), elapsed)
+
+
+def get_ranges(data=None):
+    """返回号段区间表；按需加载且尚未预热完成时先同步加载全部分片"""
+    data = data or get_data()
+    if data.ranges is None:
+        data.seg_map.load_all()
+        data.ranges = seg_index.SegRanges.from_table(data.seg_map)
+    return data.ranges
+
+
+def get_stats(data=None):
+    """返回反向索引与聚合统计；按需加载且尚未预热完成时先生成区间表"""
+    data = data or get_data()
+    if data.stats is None:
+        data.stats = seg_index.SegStats.from_ranges(get_ranges(data))
+    return data.stats
+
+
+def _warmup(data):
+    shards = data.seg_map.shards
+    start = time.perf_counter()
+    if shards is not None:
+        for shard in range(seg_index.SHARD_COUNT):
+            if shards.ensure(shard, warm=True) is not None and WARMUP_DELAY > 0:
+                time.sleep(WARMUP_DELAY)
+    get_stats(data)
+    if data is DATA:
+        log.info(f"🔥 号段表预热完成，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+_warmup_started = {}  # {进程号: 已开始预热的数据快照}
+
+
+def start_warmup():
+    """后台预热当前数据快照的剩余分片（每个进程每份快照一个线程；gunicorn preload 模式需在 post_fork 中调用）"""
+    data = DATA
+    if data is None or data.seg_map.shards is None or _warmup_started.get(os.getpid()) is data:
+        return
+    _warmup_started[os.getpid()] = data
+    threading.Thread(target=_warmup, args=(data,), name="seg-warmup", daemon=True).start()
+
+
+def readiness():
+    """就绪状态：数据已加载即可对外服务（冷分片在首次访问时加载），warm 表示是否已全部预热"""
+    data = DATA
+    shards = data.seg_map.shards if data is not None else None
+    if data is not None and data.seg_map.lazy is not None:
+        progress = data.seg_map.lazy.progress()
+    else:
+        total = seg_index.SHARD_COUNT
+        progress = {"shards_loaded": total if data is not None else 0, "shards_total": total}
+    return {
+        "ready": data is not None and data.source != "empty",
+        "warm": data is not None and shards is None,
+        "data_version": data.version if data is not None else None,
+        **progress,
+    }
+
+
+# ---------------------- 热更新 ----------------------
+def reload_seg_data():
+    """重新加载号段数据并原子替换 DATA，返回 "updated"、"unchanged"、"busy" 或失败原因"""
+    if not _RELOAD_LOCK.acquire(blocking=False):
+        return "busy"
+    global LAST_LOAD_TRACE
+    RELOAD_STATE["in_progress"] = True
+    start = time.perf_counter()
+    result = "failed"
+    trace = profiling.PhaseTrace("reload")
+    try:
+        current = DATA.version if DATA is not None else None
+        log.info(f"🔄 开始热更新号段数据（当前版本 {current}）...")
+        try:
+            data = build_seg_data(current, trace, reloading=True)
+            ported_changed = load_ported_data()
+            trace.mark("ported")
+        except Exception as e:
+            result = f"failed: {e}"
+        else:
+            if data is not None:
+                activate_data(data, time.perf_counter() - start, trace)
+            result = "unchanged" if data is None and not ported_changed else "updated"
+        trace.details["result"] = result
+        trace.details["data_version"] = DATA.version if DATA is not None else None
+        LAST_LOAD_TRACE = trace
+        log.info(f"🔄 热更新结束: {result}（当前版本 {DATA.version if DATA is not None else None}）")
+        return result
+    finally:
+        RELOAD_STATE.update(
+            in_progress=False,
+            last_result=result,
+            last_duration_ms=round((time.perf_counter() - start) * 1000, 1),
+            last_finished_at=int(time.time()),
+        )
+        _RELOAD_LOCK.release()
+
+
+def load_traces():
+    """首次加载与最近一次加载的分阶段耗时"""
+    return {
+        "startup": STARTUP_TRACE.to_dict() if STARTUP_TRACE is not None else None,
+        "last_load": LAST_LOAD_TRACE.to_dict() if LAST_LOAD_TRACE is not None else None,
+    }
+
+
+def start_reload():
+    """在后台线程中热更新，返回是否成功发起"""
+    if RELOAD_STATE["in_progress"]:
+        return False
+    threading.Thread(target=reload_seg_data, name="seg-reload", daemon=True).start()
+    return True
+
+
+def touch_reload_stamp():
+    """更新触发文件的 mtime，通知同一部署下的所有进程热更新"""
+    try:
+        with open(RELOAD_STAMP, "a"):
+            os.utime(RELOAD_STAMP)
+    except OSError as e:
+        log.warning(f"⚠️  无法更新热更新触发文件 {RELOAD_STAMP}: {e}")
+
+
+def _stamp_mtime():
+    try:
+        return os.stat(RELOAD_STAMP).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _watch_reload_stamp():
+    last = _stamp_mtime()
+    while True:
+        time.sleep(RELOAD_POLL_SECONDS)
+        current = _stamp_mtime()
+        if current != last:
+            last = current
+            start_reload()
+
+
+_watcher_pid = None
+
+
+def start_reload_watcher():
+    """启动触发文件监视线程（每个进程一个；gunicorn preload 模式需在 post_fork 中调用）"""
+    global _watcher_pid
+    if RELOAD_POLL_SECONDS <= 0 or _watcher_pid == os.getpid():
+        return
+    _watcher_pid = os.getpid()
+    threading.Thread(target=_watch_reload_stamp, name="seg-reload-watcher", daemon=True).start()
+
+
+# ---------------------- 查询 ----------------------
+def build_result(phone, seg, loc, pct=None, override=None):
+    """组装单个命中结果的 data 字段；前缀回退时带 confidence，携号转网时运营商被覆盖并标明来源"""
+    city, operator = loc
+    result = {"phone": phone, "seg": seg, "seg_type": SEG_TYPES[len(seg)], "city": city, "operator": operator}
+    if pct is not None:
+        result["confidence"] = pct / 100
+    if override is not None:
+        result["operator"] = override
+        result["seg_operator"] = operator
+        result["source"] = "ported"
+    return result
+
+
+def resolve(phone, data):
+    """在指定数据快照中查询单个手机号，返回 (HTTP 状态码, 匹配的号段/前缀, 归属地编号, 置信度百分比, 转网运营商)
+
+    先查七位号段表，未命中时查最长前缀展开表（6→3 位）；七位命中的置信度为 None。
+    归属地编号是 data.seg_map.locations 的 1 起始下标，未命中或格式错误时为 0。
+    命中后再查携号转网覆盖表，号码未转网时转网运营商为 None。
+    """
+    if not PHONE_PATTERN.fullmatch(phone):
+        metrics.inc("lookup_results_total", RESULT_INVALID)
+        return 400, None, 0, None, None
+
+    i = int(phone[:7]) - seg_index.SEG_BASE
+    shards = data.seg_map.shards
+    if shards is not None:
+        load_shard(shards, i // seg_index.SHARD_WIDTH)
+    code = data.seg_map.table[i]
+    if code:
+        metrics.inc("lookup_results_total", RESULT_SEG7)
+        seg, pct = phone[:7], None
+    else:
+        prefixes, j = data.prefixes, i // 10
+        code = prefixes.match_codes[j]
+        if not code:
+            metrics.inc("lookup_results_total", RESULT_MISS)
+            return 404, None, 0, None, None
+        metrics.inc("lookup_results_total", RESULT_PREFIX)
+        seg, pct = phone[:prefixes.match_len[j]], prefixes.match_conf[j]
+
+    # 携号转网覆盖：布隆过滤器挡掉绝大多数未转网号码
+    store = PORTED
+    override = store.get(int(phone)) if store is not None else None
+    if override is not None:
+        metrics.inc("ported_overrides_total")
+    return 200, seg, code, pct, override
+
+
+def lookup(phone):
+    """查询单个手机号，返回 {"phone", "code", "msg", "data"}，与 lookup_many 的单项一致"""
+    phone = str(phone).strip() if phone is not None else ""
+    data = get_data()
+    status, seg, code, pct, override = resolve(phone, data)
+    if status == 400:
+        return {"phone": phone, "code": 400, "msg": MSG_INVALID_PHONE, "data": None}
+    if status == 404:
+        return {"phone": phone, "code": 404, "msg": MSG_NOT_FOUND, "data": None}
+    result = build_result(phone, seg, data.seg_map.locations[code - 1], pct, override)
+    return {"phone": phone, "code": 200, "msg": MSG_OK, "data": result}
+
+
+def lookup_many(phones):
+    """批量查询：phones 为任意可迭代对象，返回与输入同序的结果列表，每项与 lookup 的返回一致
+
+    每个号码用同一个预编译正则的 fullmatch 校验（不再逐个 re.match 重新查找编译缓存），
+    命中的号码直接按下标读取号段表数组，未命中时再按下标读取最长前缀展开表，无需字典查找。
+    """
+    data = get_data()
+    fullmatch = PHONE_PATTERN.fullmatch
+    table = data.seg_map.table
+    locations = data.seg_map.locations
+    match_codes = data.prefixes.match_codes
+    match_conf = data.prefixes.match_conf
+    match_len = data.prefixes.match_len
+    base = seg_index.SEG_BASE
+    shards = data.seg_map.shards
+    shard_width = seg_index.SHARD_WIDTH
+    store = PORTED
+
+    phones = [str(p).strip() if p is not None else "" for p in phones]
+    results = []
+    invalid = prefix = miss = overridden = 0
+    for phone in phones:
+        if not fullmatch(phone):
+            results.append({"phone": phone, "code": 400, "msg": MSG_INVALID_PHONE, "data": None})
+            invalid += 1
+            continue
+        i = int(phone[:7]) - base
+        if shards is not None:
+            load_shard(shards, i // shard_width)
+        code = table[i]
+        if code:
+            city, operator = locations[code - 1]
+            info = {"phone": phone, "seg": phone[:7], "seg_type": "7位号段", "city": city, "operator": operator}
+        else:
+            j = i // 10
+            code = match_codes[j]
+            if not code:
+                results.append({"phone": phone, "code": 404, "msg": MSG_NOT_FOUND, "data": None})
+                miss += 1
+                continue
+            city, operator = locations[code - 1]
+            n = match_len[j]
+            info = {"phone": phone, "seg": phone[:n], "seg_type": SEG_TYPES[n], "city": city, "operator": operator,
+                    "confidence": match_conf[j] / 100}
+            prefix += 1
+        if store is not None:
+            override = store.get(int(phone))
+            if override is not None:
+                info["seg_operator"] = info["operator"]
+                info["operator"] = override
+                info["source"] = "ported"
+                overridden += 1
+        results.append({"phone": phone, "code": 200, "msg": MSG_OK, "data": info})
+
+    metrics.inc("lookup_results_total", RESULT_SEG7, len(phones) - invalid - prefix - miss)
+    metrics.inc("lookup_results_total", RESULT_PREFIX, prefix)
+    metrics.inc("lookup_results_total", RESULT_MISS, miss)
+    metrics.inc("lookup_results_total", RESULT_INVALID, invalid)
+    if overridden:
+        metrics.inc("ported_overrides_total", (), overridden)
+    return results
@@ -0,0 +1,444 @@
+# 号段索引快照与增量分发：多节点部署时由一处发布，各节点拉取同一份数据版本
+#
+# 快照即二进制索引文件（seg_index.bin），以数据版本（源 CSV 摘要）命名，并带号段表内容摘要（content_hash）。
+# 发布目录结构（本地目录、共享盘或任意静态文件服务器均可）：
+#     manifest.json                        最新版本、文件大小与 SHA-256、可用增量包
+#     snapshots/<版本>.bin                  完整快照
+#     deltas/<旧版本>-<新版本>.delta         从历史版本到最新版本的增量包
+#
+# 增量包布局：头部 | 元数据 JSON | zlib(变化区段) | 各源文件号段（见 seg_index 索引的源文件段落）
+# 源文件号段只附带内容摘要变化的文件，其余文件在应用时复用基准索引中的号段，
+# 打补丁后的索引仍带有完整的源文件记录，回退到本地 CSV 解析时可以增量解析。
+#
+# 命令行用法：
+#     python snapshot.py publish <发布目录> [--keep 10]        # 发布当前索引（过期时先从 city/ 重新生成）
+#     python snapshot.py sync [--source <目录或 URL>]          # 同步到最新版本并通知本机所有 worker 热更新
+#     python snapshot.py diff old.bin new.bin -o x.delta      # 生成增量包
+#     python snapshot.py apply old.bin x.delta -o new.bin     # 离线应用增量包
+#
+# 服务端设置 SNAPSHOT_SOURCE 后，启动与热更新（POST /api/admin/reload 或 touch .seg_reload）都从该来源同步：
+# 本地已是最新版本时不下载；有当前版本到最新版本的增量包时只下载增量包，在内存中打补丁并按内容摘要校验，
+# 不重新解析 CSV；否则下载完整快照。/api/health 的 snapshot 字段返回版本与内容摘要，用于核对全部节点是否一致。
+import os
+import sys
+import json
+import time
+import logging
+import zlib
+import struct
+import hashlib
+import argparse
+import urllib.request
+from array import array
+
+import seg_index
+
+log = logging.getLogger(__name__)
+
+# 快照来源：本地目录或 http(s) 地址，为空时不启用（仍从本地 city/ 构建）
+SNAPSHOT_SOURCE = os.environ.get("SNAPSHOT_SOURCE", "")
+SNAPSHOT_TIMEOUT = float(os.environ.get("SNAPSHOT_TIMEOUT", "10"))
+# 发布时保留的历史版本数（为每个历史版本生成到最新版本的增量包）
+SNAPSHOT_KEEP = int(os.environ.get("SNAPSHOT_KEEP", "10"))
+
+MANIFEST = "manifest.json"
+DELTA_MAGIC = b"SEGDLT\x00\x01"
+_DELTA_HEADER = struct.Struct("<8sI")
+_RUN = struct.Struct("<II")   # 变化区段：(号段表下标, 长度)，其后为该区段的新归属地编号
+
+STATE = {
+    "source": SNAPSHOT_SOURCE,
+    "last_sync": None,           # current / local / delta / full
+    "last_sync_at": None,
+    "last_sync_ms": None,
+    "last_bytes": None,          # 最近一次同步下载的字节数
+    "latest_version": None,      # 来源上的最新版本
+    "last_error": None,
+}
+
+
+def enabled():
+    return bool(SNAPSHOT_SOURCE)
+
+
+def stats():
+    return dict(STATE)
+
+
+# ---------------------- 增量包 ----------------------
+def _table_bytes(table, typecode):
+    """号段表（array 或 memoryview）转为指定元素类型的小端序数组"""
+    a = array(typecode, table)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+
+def _remap(seg_map, locations, missing):
+    """把 seg_map 的归属地编号换算为 locations 中的编号，locations 中没有的归属地记为 missing"""
+    seg_map.load_all()
+    ids = {loc: i + 1 for i, loc in enumerate(locations)}
+    mapping = [0] + [ids.get(loc, missing) for loc in seg_map.locations]
+    typecode = "B" if len(locations) + 1 < 0xFF else "H"
+    if mapping == list(range(len(mapping))):
+        return array(typecode, seg_map.table)
+    if typecode == "B" and len(mapping) <= 0x100:
+        return array("B", bytes(seg_map.table).translate(bytes(mapping + [0] * (0x100 - len(mapping)))))
+    return array(typecode, map(mapping.__getitem__, seg_map.table))
+
+
+def make_delta(old, new):
+    """生成从 old 到 new（SegData）的增量包（bytes）：只记录新增、删除与归属地变化的号段
+
+    new.files 存在时一并记录源文件（见 SegData.files），old.files 中内容摘要相同的文件只记录摘要。
+    """
+    new_map = new.seg_map
+    new_map.load_all()
+    locations = new_map.locations
+    # 旧表中已不存在的归属地换算为一个不会与新表相等的编号，保证这些号段一定写入增量包
+    before = _remap(old.seg_map, locations, len(locations) + 1)
+    after = new_map.table
+    added = removed = reowned = 0
+    runs = []
+    start = None
+    for i, (a, b) in enumerate(zip(before, after)):
+        if a != b:
+            if not a:
+                added += 1
+            elif not b:
+                removed += 1
+            else:
+                reowned += 1
+            if start is None:
+                start = i
+        elif start is not None:
+            runs.append((start, i - start))
+            start = None
+    if start is not None:
+        runs.append((start, len(after) - start))
+
+    typecode = "B" if len(locations) < 0xFF else "H"
+    payload = bytearray()
+    for offset, n in runs:
+        payload += _RUN.pack(offset, n)
+        payload += _table_bytes(after[offset:offset + n], typecode).tobytes()
+    payload = zlib.compress(bytes(payload), 9)
+
+    # 源文件：[相对路径, mtime_ns, size, sha1, 偏移, 长度]，长度为 0 表示复用基准中同名同摘要文件的号段
+    known = {(name, digest) for name, _, _, digest, _ in old.files or ()}
+    files, blobs, blob_offset = [], [], 0
+    for name, mtime_ns, size, digest, segs in new.files or ():
+        blob = b"" if (name, digest) in known else seg_index.pack_segs(segs)
+        files.append([name, mtime_ns, size, digest, blob_offset, len(blob)])
+        blobs.append(blob)
+        blob_offset += len(blob)
+
+    meta = json.dumps({
+        "from": old.version,
+        "to": new.version,
+        "from_hash": old.content_hash or seg_index.content_hash(old.seg_map),
+        "to_hash": new.content_hash or seg_index.content_hash(new_map),
+        "locations": locations,
+        "total_loaded": new.total_loaded,
+        "typecode": typecode,
+        "added": added,
+        "removed": removed,
+        "reowned": reowned,
+        "runs": len(runs),
+        "payload_bytes": len(payload),
+        "files": files if new.files else None,
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return _DELTA_HEADER.pack(DELTA_MAGIC, len(meta)) + meta + payload + b"".join(blobs)
+
+
+def read_delta_meta(raw):
+    """解析增量包头部，返回 (元数据, 负载起始偏移)；格式不符时抛出 ValueError"""
+    if len(raw) < _DELTA_HEADER.size:
+        raise ValueError("增量包头部不完整")
+    magic, meta_len = _DELTA_HEADER.unpack_from(raw)
+    if magic != DELTA_MAGIC:
+        raise ValueError("不是号段增量包")
+    end = _DELTA_HEADER.size + meta_len
+    return json.loads(raw[_DELTA_HEADER.size:end].decode("utf-8")), end
+
+
+def apply_delta(base, raw, base_files=None):
+    """把增量包应用到 base（SegData），返回新的 SegData；版本或内容摘要不符时抛出 ValueError
+
+    base 不会被修改（可能是正在服务的快照或只读 mmap），新号段表是 base 的副本。
+    base_files 为基准版本的源文件（默认 base.files），用于补齐增量包中未附带号段的文件。
+    """
+    meta, offset = read_delta_meta(raw)
+    if meta["from"] != base.version:
+        raise ValueError(f"增量包基于版本 {meta['from']}，当前为 {base.version}")
+    if (base.content_hash or seg_index.content_hash(base.seg_map)) != meta["from_hash"]:
+        raise ValueError("当前号段表与增量包的基准内容不一致")
+
+    locations = [tuple(loc) for loc in meta["locations"]]
+    typecode = meta["typecode"]
+    table = _remap(base.seg_map, locations, 0)
+    if table.typecode != typecode:
+        table = array(typecode, table)
+    payload_bytes = meta.get("payload_bytes")
+    payload_end = len(raw) if payload_bytes is None else offset + payload_bytes
+    payload = zlib.decompress(raw[offset:payload_end])
+    itemsize = table.itemsize
+    pos = 0
+    while pos < len(payload):
+        start, n = _RUN.unpack_from(payload, pos)
+        pos += _RUN.size
+        if start + n > len(table) or pos + n * itemsize > len(payload):
+            raise ValueError("增量包区段越界")
+        run = array(typecode)
+        run.frombytes(payload[pos:pos + n * itemsize])
+        if sys.byteorder == "big":
+            run.byteswap()
+        table[start:start + n] = run
+        pos += n * itemsize
+
+    seg_map = seg_index.SegTable(locations, table)
+    if seg_index.content_hash(seg_map) != meta["to_hash"]:
+        raise ValueError("应用增量包后内容摘要不符")
+    ranges = seg_index.SegRanges.from_table(seg_map)
+    data = seg_index.SegData(seg_map, seg_index.PrefixTable.from_ranges(ranges), meta["total_loaded"],
+                             meta["to"], "delta")
+    data.ranges = ranges
+    data.content_hash = meta["to_hash"]
+    data.files = _delta_files(meta.get("files"), raw[payload_end:], base.files if base_files is None else base_files)
+    return data
+
+
+def _delta_files(files, section, base_files):
+    """还原新版本的源文件列表；基准中缺少需要复用的文件时返回 None（不影响号段数据，只是失去解析缓存）"""
+    if not files:
+        return None
+    known = {(name, digest): segs for name, _, _, digest, segs in base_files or ()}
+    result = []
+    for name, mtime_ns, size, digest, off, n in files:
+        if n:
+            segs = seg_index.unpack_segs(section[off:off + n])
+        else:
+            segs = known.get((name, digest))
+            if segs is None:
+                return None
+        result.append((name, mtime_ns, size, digest, segs))
+    return result
+
+
+# ---------------------- 分发来源 ----------------------
+def fetch(source, name, sha256=None):
+    """从本地目录或 http(s) 来源读取文件；给出 sha256 时校验内容"""
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(f"{source.rstrip('/')}/{name}", timeout=SNAPSHOT_TIMEOUT) as resp:
+            raw = resp.read()
+    else:
+        with open(os.path.join(source, name), "rb") as f:
+            raw = f.read()
+    if sha256 and hashlib.sha256(raw).hexdigest() != sha256:
+        raise ValueError(f"{name} 校验失败（SHA-256 不符）")
+    return raw
+
+
+def fetch_manifest(source=SNAPSHOT_SOURCE):
+    return json.loads(fetch(source, MANIFEST).decode("utf-8"))
+
+
+def _write_atomic(path, raw):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+    os.replace(tmp_path, path)
+
+
+def sync_index(base=None, path=None, source=None):
+    """把本地索引同步到来源上的最新版本，返回 (方式, SegData 或 None)
+
+    方式为 "current"（base 已是最新）、"local"（本地索引已是最新，如已被其他 worker 同步）、
+    "delta"（下载增量包打补丁，返回新的 SegData 并已写入 path）或 "full"（下载完整快照写入 path）。
+    base 为 None 时以本地索引为增量基准。path、source 默认为 seg_index.INDEX_PATH 与 SNAPSHOT_SOURCE。
+    来源不可用时抛出 OSError / ValueError。
+    """
+    path = path or seg_index.INDEX_PATH
+    source = source or SNAPSHOT_SOURCE
+    start = time.perf_counter()
+    fetched = 0
+    try:
+        manifest = fetch_manifest(source)
+        latest = manifest["latest"]
+        target = latest["version"]
+        STATE["latest_version"] = target
+        if base is not None and base.version == target:
+            how, data = "current", None
+        elif seg_index.read_index_version(path) == target:
+            how, data = "local", None
+        else:
+            how, data = "full", None
+            if base is None and os.path.exists(path):
+                try:
+                    base = seg_index.read_index(path)
+                except (OSError, ValueError):
+                    base = None
+            delta = manifest.get("deltas", {}).get(base.version) if base is not None else None
+            if delta is not None:
+                try:
+                    raw = fetch(source, delta["file"], delta["sha256"])
+                    fetched += len(raw)
+                    # 从索引加载的数据不带源文件记录，从本地索引补齐（同一版本）
+                    base_files = base.files
+                    if base_files is None and seg_index.read_index_version(path) == base.version:
+                        base_files = seg_index.read_index_files(path)
+                    data = apply_delta(base, raw, base_files)
+                    seg_index.write_index(data, path)
+                    how = "delta"
+                except (OSError, ValueError) as e:
+                    log.warning(f"⚠️  增量同步失败，改为下载完整快照: {e}")
+                    data = None
+            if data is None:
+                raw = fetch(source, latest["file"], latest["sha256"])
+                fetched += len(raw)
+                _write_atomic(path, raw)
+        STATE["last_error"] = None
+    except (OSError, ValueError, KeyError) as e:
+        STATE["last_error"] = str(e)
+        raise
+    finally:
+        STATE["last_sync_at"] = int(time.time())
+        STATE["last_sync_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        STATE["last_bytes"] = fetched
+    STATE["last_sync"] = how
+    log.info(f"📦 快照同步: {how}（最新版本 {target}，下载 {fetched} 字节，耗时 {STATE['last_sync_ms']:.0f}ms）")
+    return how, data
+
+
+# ---------------------- 发布 ----------------------
+def publish(dest, index_path=seg_index.INDEX_PATH, keep=SNAPSHOT_KEEP):
+    """把 index_path 发布为最新快照，并为保留的历史版本生成到最新版本的增量包，返回 manifest"""
+    new = _read_with_files(index_path)
+    with open(index_path, "rb") as f:
+        raw = f.read()
+    os.makedirs(os.path.join(dest, "snapshots"), exist_ok=True)
+    os.makedirs(os.path.join(dest, "deltas"), exist_ok=True)
+    try:
+        manifest = fetch_manifest(dest)
+    except (OSError, ValueError):
+        manifest = {"latest": None, "history": [], "deltas": {}}
+    if manifest["latest"] and manifest["latest"]["version"] == new.version:
+        log.info(f"✅ 版本 {new.version} 已是最新，无需发布")
+        return manifest
+
+    name = f"snapshots/{new.version}.bin"
+    _write_atomic(os.path.join(dest, name), raw)
+    history = [v for v in manifest["history"] if v != new.version][-(keep - 1):] if keep > 1 else []
+    deltas = {}
+    for version in history:
+        try:
+            old = _read_with_files(os.path.join(dest, f"snapshots/{version}.bin"))
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️  跳过历史版本 {version}: {e}")
+            continue
+        delta = make_delta(old, new)
+        delta_name = f"deltas/{version}-{new.version}.delta"
+        _write_atomic(os.path.join(dest, delta_name), delta)
+        meta, _ = read_delta_meta(delta)
+        deltas[version] = {"file": delta_name, "size": len(delta), "sha256": hashlib.sha256(delta).hexdigest(),
+                           "added": meta["added"], "removed": meta["removed"], "reowned": meta["reowned"]}
+        log.info(f"   - 增量 {version} -> {new.version}: {len(delta)} 字节（新增 {meta['added']}，"
+              f"删除 {meta['removed']}，改属 {meta['reowned']}）")
+
+    manifest = {
+        "latest": {"version": new.version, "content_hash": new.content_hash or seg_index.content_hash(new.seg_map),
+                   "file": name, "size": len(raw), "sha256": hashlib.sha256(raw).hexdigest(),
+                   "segments": len(new.seg_map), "published_at": int(time.time())},
+        "history": history + [new.version],
+        "deltas": deltas,
+    }
+    _write_atomic(os.path.join(dest, MANIFEST),
+                  json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    # 清理不再保留的快照与增量包
+    kept = {f"snapshots/{v}.bin" for v in manifest["history"]} | {d["file"] for d in deltas.values()}
+    for sub in ("snapshots", "deltas"):
+        for filename in os.listdir(os.path.join(dest, sub)):
+            if f"{sub}/{filename}" not in kept:
+                os.remove(os.path.join(dest, sub, filename))
+    log.info(f"✅ 已发布版本 {new.version}（{len(raw)} 字节，{len(deltas)} 个增量包）: {dest}")
+    return manifest
+
+
+def _read_with_files(path):
+    """读取索引并带上源文件记录（生成增量包时需要）"""
+    data = seg_index.read_index(path)
+    data.files = seg_index.read_index_files(path) or None
+    return data
+
+
+# ---------------------- 命令行 ----------------------
+def _ensure_index(root, path):
+    """索引缺失或过期时从 city/ 重新生成"""
+    if not seg_index.index_is_fresh(path, root):
+        count = seg_index.write_index(seg_index.parse_city_dir(root), path)
+        print(f"💾 已生成二进制索引: {path}（{count} 个号段）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="号段索引快照发布、同步与增量包工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pub = sub.add_parser("publish", help="发布当前索引为最新快照")
+    pub.add_argument("dest", help="发布目录")
+    pub.add_argument("--root", default=seg_index.LOCAL_ROOT, help="号段 CSV 根目录")
+    pub.add_argument("--index", default=seg_index.INDEX_PATH, help="索引文件路径")
+    pub.add_argument("--keep", type=int, default=SNAPSHOT_KEEP, help="保留的历史版本数")
+
+    sync = sub.add_parser("sync", help="同步本地索引到最新快照，并通知本机 worker 热更新")
+    sync.add_argument("--source", default=SNAPSHOT_SOURCE, help="快照来源（目录或 URL），默认 SNAPSHOT_SOURCE")
+    sync.add_argument("--index", default=seg_index.INDEX_PATH, help="索引文件路径")
+    sync.add_argument("--no-reload", action="store_true", help="只更新索引文件，不通知 worker")
+
+    diff = sub.add_parser("diff", help="生成两个索引之间的增量包")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("-o", "--out", required=True)
+
+    apply = sub.add_parser("apply", help="把增量包应用到索引文件")
+    apply.add_argument("base")
+    apply.add_argument("delta")
+    apply.add_argument("-o", "--out", required=True)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "publish":
+        _ensure_index(args.root, args.index)
+        publish(args.dest, args.index, max(1, args.keep))
+        return 0
+
+    if args.command == "sync":
+        if not args.source:
+            parser.error("请通过 --source 或 SNAPSHOT_SOURCE 指定快照来源")
+        sync_index(None, args.index, args.source)
+        if not args.no_reload:
+            import seg_lookup  # 仅命令行需要：seg_lookup 本身依赖本模块
+            seg_lookup.touch_reload_stamp()
+            print(f"🔄 已更新热更新触发文件: {seg_lookup.RELOAD_STAMP}")
+        return 0
+
+    if args.command == "diff":
+        delta = make_delta(_read_with_files(args.old), _read_with_files(args.new))
+        _write_atomic(args.out, delta)
+        meta, _ = read_delta_meta(delta)
+        print(f"✅ 增量包 {meta['from']} -> {meta['to']}: {len(delta)} 字节，{meta['runs']} 个区段"
+              f"（新增 {meta['added']}，删除 {meta['removed']}，改属 {meta['reowned']}）")
+        return 0
+
+    with open(args.delta, "rb") as f:
+        raw = f.read()
+    start = time.perf_counter()
+    data = apply_delta(_read_with_files(args.base), raw)
+    seg_index.write_index(data, args.out)
+    print(f"✅ 已应用增量包: {args.out}（版本 {data.version}，内容摘要 {data.content_hash}，"
+          f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
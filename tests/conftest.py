@@ -0,0 +1,52 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _asgi_request(path, query="", headers=(), method="GET", body=b"", chunk_size=None):
+    """调用 ASGI 应用，返回 (状态码, [(响应头名, 值)], 响应体)；chunk_size 时请求体分多条消息发送"""
+    import asgi
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode("utf-8"),
+             "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+             "client": ("127.0.0.1", 1234)}
+    size = chunk_size or len(body) or 1
+    messages = [body[i:i + size] for i in range(0, len(body), size)] or [b""]
+    received, sent = [], []
+
+    async def receive():
+        chunk = messages[len(received)]
+        received.append(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": len(received) < len(messages)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    start = sent[0]
+    payload = b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], [(k.decode("latin-1"), v.decode("latin-1")) for k, v in start["headers"]], payload
+
+
+@pytest.fixture
+def asgi_request():
+    return _asgi_request
+
+
+def _write_csv(root, name, segs, mtime):
+    """在 root 下写一个号段 CSV（name 形如 "北京/移动号段数据.csv"）并设置 mtime"""
+    path = os.path.join(root, *name.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("省份,运营商,号段\n" + "".join(f"x,x,{seg}\n" for seg in segs))
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def write_csv():
+    return _write_csv
@@ -0,0 +1,50 @@
+# 审计访问日志：未配置盐值时不启用；单号查询记录实际的查询路径
+import json
+
+import pytest
+
+import accesslog
+import api
+
+
+@pytest.fixture
+def access_log(monkeypatch, tmp_path):
+    monkeypatch.setattr(accesslog, "ACCESS_LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(accesslog, "ACCESS_LOG_SALT", b"test-salt")
+    monkeypatch.setattr(accesslog, "_writer_pid", None)
+    accesslog._queue.clear()
+    yield
+    accesslog._queue.clear()
+
+
+def logged_lines():
+    lines = [json.loads(accesslog._format(entry)) for entry in accesslog._queue]
+    accesslog._queue.clear()
+    return lines
+
+
+def test_disabled_without_salt(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(accesslog, "ACCESS_LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(accesslog, "ACCESS_LOG_SALT", b"")
+    monkeypatch.setattr(accesslog, "_writer_pid", None)
+    assert not accesslog.enabled()
+    accesslog.start_writer()
+    assert accesslog._writer_pid is None
+    assert "ACCESS_LOG_SALT" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("phone, lookup", [
+    ("13800138000", "seg7"),
+    ("19900000000", "prefix"),
+    ("14000000000", "miss"),
+    ("10000000000", "invalid"),
+])
+def test_records_lookup_path(access_log, asgi_request, phone, lookup):
+    # 第二次请求命中响应缓存，查询路径也要一致
+    for _ in range(2):
+        api.app.test_client().get("/api/phone/location", query_string={"phone": phone})
+        asgi_request("/api/phone/location", "phone=" + phone)
+    lines = logged_lines()
+    assert len(lines) == 4
+    assert {line["lookup"] for line in lines} == {lookup}
+    assert len({line["phone_hash"] for line in lines}) == 1
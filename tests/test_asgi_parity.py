@@ -0,0 +1,42 @@
+# ASGI 版本与 Flask 版本的响应一致性
+from urllib.parse import quote
+
+import api
+
+
+def vary_encoding_count(headers):
+    return sum(1 for k, v in headers if k.lower() == "vary" and "accept-encoding" in v.lower())
+
+
+def test_index_sends_a_single_vary_accept_encoding(asgi_request):
+    for accept_encoding in ("identity", "gzip"):
+        resp = api.app.test_client().get("/", headers={"Accept-Encoding": accept_encoding})
+        assert resp.status_code == 200
+        assert vary_encoding_count(resp.headers.items()) == 1
+        status, headers, _ = asgi_request("/", headers=[("Accept-Encoding", accept_encoding)])
+        assert status == 200
+        assert vary_encoding_count(headers) == 1
+
+
+def test_large_dynamic_response_sends_a_single_vary_accept_encoding(asgi_request):
+    resp = api.app.test_client().get("/api/locations")
+    assert len(resp.data) >= api.compress.COMPRESS_MIN_BYTES
+    assert vary_encoding_count(resp.headers.items()) == 1
+    _, headers, _ = asgi_request("/api/locations")
+    assert vary_encoding_count(headers) == 1
+
+
+def test_non_ascii_query_matches_flask(asgi_request):
+    expected = api.app.test_client().get("/api/segments?city=" + quote("北京") + "&limit=5")
+    assert expected.status_code == 200 and expected.get_json()["data"]["total"] > 0
+    for query in ("city=北京&limit=5", "city=" + quote("北京") + "&limit=5"):
+        status, _, body = asgi_request("/api/segments", query)
+        assert status == 200
+        assert api.json.loads(body) == expected.get_json()
+
+
+def test_segment_stats_by_city_matches_flask(asgi_request):
+    expected = api.app.test_client().get("/api/segments/stats?group_by=operator&city=" + quote("上海"))
+    status, _, body = asgi_request("/api/segments/stats", "group_by=operator&city=上海")
+    assert status == expected.status_code == 200
+    assert api.json.loads(body) == expected.get_json()
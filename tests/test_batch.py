@@ -0,0 +1,58 @@
+# 批量查询：超大请求体在读取与解析之前拒绝
+import io
+import json
+
+import pytest
+
+import api
+
+
+@pytest.fixture
+def no_parse(monkeypatch):
+    """超大请求体不应进入解析"""
+    def fail(*args, **kwargs):
+        raise AssertionError("oversized body was parsed")
+    monkeypatch.setattr(api, "parse_batch_body", fail)
+
+
+def oversized_body():
+    return json.dumps(["13800138000"] * (api.BATCH_MAX_SIZE + 1)).encode()
+
+
+def test_batch_rejects_oversized_content_length(no_parse):
+    body = b" " * (api.BATCH_MAX_BYTES + 1)
+    resp = api.app.test_client().post("/api/phone/location/batch", data=body, content_type="application/json")
+    assert resp.status_code == 413
+    assert resp.get_json()["code"] == 413
+
+
+def test_batch_stops_reading_chunked_body_at_limit(no_parse, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_BYTES", 1000)
+    stream = io.BytesIO(oversized_body())
+    # 没有 Content-Length 的分块上传（gunicorn 会设置 wsgi.input_terminated）：最多读取 BATCH_MAX_BYTES + 1 字节
+    resp = api.app.test_client().post("/api/phone/location/batch", input_stream=stream,
+                                      headers={"Transfer-Encoding": "chunked", "Content-Type": "application/json"},
+                                      environ_overrides={"wsgi.input_terminated": True})
+    assert resp.status_code == 413
+    assert stream.tell() <= 1001
+
+
+def test_batch_within_limits_still_counts_items():
+    phones = ["13800138000"] * (api.BATCH_MAX_SIZE + 1)
+    assert len(json.dumps(phones)) <= api.BATCH_MAX_BYTES
+    resp = api.app.test_client().post("/api/phone/location/batch", json=phones)
+    assert resp.status_code == 413
+    assert str(api.BATCH_MAX_SIZE) in resp.get_json()["msg"]
+    resp = api.app.test_client().post("/api/phone/location/batch", json=["13800138000", "123"])
+    assert resp.status_code == 200 and resp.get_json()["data"]["found"] == 1
+
+
+def test_asgi_batch_rejects_oversized_body(no_parse, asgi_request):
+    body = oversized_body() + b" " * api.BATCH_MAX_BYTES
+    headers = [("Content-Type", "application/json"), ("Content-Length", str(len(body)))]
+    status, _, payload = asgi_request("/api/phone/location/batch", headers=headers, method="POST", body=body)
+    assert status == 413 and json.loads(payload)["code"] == 413
+    # 没有 Content-Length 时边读边计数
+    status, _, _ = asgi_request("/api/phone/location/batch", headers=headers[:1], method="POST",
+                                body=body, chunk_size=4096)
+    assert status == 413
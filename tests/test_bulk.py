@@ -0,0 +1,22 @@
+# 命令行批量补全：stdout 上只有结果，号段数据的加载日志不混入
+import logging
+
+import bulk
+import seg_lookup
+
+
+def test_fresh_load_keeps_stdout_clean(tmp_path, monkeypatch, capsys, caplog):
+    src = tmp_path / "in.csv"
+    src.write_text("name,phone\na,13800138000\nb,123\n", encoding="utf-8")
+    # 模拟 ETL 进程第一次查询：此时才加载号段数据
+    monkeypatch.setattr(seg_lookup, "DATA", None)
+    with caplog.at_level(logging.INFO):
+        assert bulk.main([str(src)]) == 0
+
+    out = capsys.readouterr().out
+    assert out.splitlines() == [
+        "name,phone,code,seg,seg_type,city,operator",
+        "a,13800138000,200,1380013,7位号段,北京,移动",
+        "b,123,400,,,,",
+    ]
+    assert any("数据加载完成" in r.getMessage() for r in caplog.records if r.name == "seg_lookup")
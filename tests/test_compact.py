@@ -0,0 +1,116 @@
+# 紧凑二进制格式：按 /api/locations 解码后与 JSON 结果一致；Accept 协商与 ETag
+import json
+
+import pytest
+
+import api
+import compact
+
+PHONES = ["13800138000", "19900000000", "14000000000", "10000000000", "13912345678"]
+BINARY = {"Accept": compact.MEDIA_TYPE}
+
+
+def decode(body, dictionary):
+    """客户端解码：二进制记录 + 解码表 -> 与 JSON 结果 data 字段相同的字典（未命中为 None）"""
+    magic, count = compact.HEADER.unpack_from(body)
+    assert magic == compact.MAGIC
+    assert len(body) == compact.HEADER.size + count * compact.RECORD.size
+    locations = {loc["id"]: loc for loc in dictionary["locations"]}
+    operators = {op["id"]: op["operator"] for op in dictionary["operators"]}
+    results = []
+    for k in range(count):
+        status, seg_len, pct, flags, seg, code, operator_id = compact.RECORD.unpack_from(
+            body, compact.HEADER.size + k * compact.RECORD.size)
+        if status != compact.STATUS_OK:
+            results.append((status, None))
+            continue
+        loc = locations[code]
+        seg = str(seg)
+        data = {"seg": seg, "seg_type": api.seg_lookup.SEG_TYPES[seg_len], "city": loc["city"],
+                "operator": operators[operator_id]}
+        if pct != compact.CONFIDENCE_NONE:
+            data["confidence"] = pct / 100
+        if flags & compact.FLAG_PORTED:
+            data["seg_operator"] = loc["operator"]
+            data["source"] = "ported"
+        results.append((status, data))
+    return results
+
+
+def test_batch_binary_decodes_to_json_answer():
+    client = api.app.test_client()
+    dictionary = client.get("/api/locations").get_json()["data"]
+    resp = client.post("/api/phone/location/batch", json=PHONES, headers=BINARY)
+    assert resp.mimetype == compact.MEDIA_TYPE
+    assert resp.headers["X-Data-Version"] == dictionary["version"]
+
+    expected = client.post("/api/phone/location/batch", json=PHONES).get_json()["data"]["results"]
+    statuses = {200: compact.STATUS_OK, 404: compact.STATUS_NOT_FOUND, 400: compact.STATUS_INVALID}
+    decoded = decode(resp.data, dictionary)
+    assert [status for status, _ in decoded] == [statuses[r["code"]] for r in expected]
+    for (_, data), result in zip(decoded, expected):
+        if data is not None:
+            assert dict(data, phone=result["phone"]) == result["data"]
+    # 样例覆盖七位命中与前缀回退（带置信度）
+    assert any("confidence" in r["data"] for r in expected if r["data"])
+    assert any(r["data"]["seg_type"] == "7位号段" for r in expected if r["data"])
+
+
+def test_single_binary_matches_json_and_asgi(asgi_request):
+    client = api.app.test_client()
+    dictionary = client.get("/api/locations").get_json()["data"]
+    for phone in PHONES:
+        resp = client.get("/api/phone/location", query_string={"phone": phone}, headers=BINARY)
+        expected = client.get("/api/phone/location", query_string={"phone": phone}).get_json()
+        (status, data), = decode(resp.data, dictionary)
+        assert resp.status_code == expected["code"]
+        if data is not None:
+            assert dict(data, phone=phone) == expected["data"]
+        asgi_status, _, body = asgi_request("/api/phone/location", "phone=" + phone,
+                                            headers=[("Accept", compact.MEDIA_TYPE)])
+        assert (asgi_status, body) == (resp.status_code, resp.data)
+
+
+@pytest.mark.parametrize("accept, binary", [
+    (None, False),
+    ("*/*", False),
+    ("application/json", False),
+    (compact.MEDIA_TYPE, True),
+    (f"application/json, {compact.MEDIA_TYPE}", False),          # 同等优先级仍返回 JSON
+    (f"{compact.MEDIA_TYPE}, application/json;q=0.9", True),
+    (f"application/json;q=0.5, {compact.MEDIA_TYPE};q=0.8", True),
+    (f"{compact.MEDIA_TYPE};q=0.2, */*", False),
+    (f"{compact.MEDIA_TYPE};q=0", False),
+])
+def test_accept_ranking(accept, binary):
+    assert api.wants_binary(accept) is binary
+
+
+def test_binary_etag_is_distinct_and_revalidates():
+    client = api.app.test_client()
+    query = {"phone": "13800138000"}
+    json_etag = client.get("/api/phone/location", query_string=query).headers["ETag"]
+    resp = client.get("/api/phone/location", query_string=query, headers=BINARY)
+    assert resp.headers["ETag"] == json_etag[:-1] + '.bin"'
+    assert "Accept" in resp.headers["Vary"]
+
+    assert client.get("/api/phone/location", query_string=query,
+                      headers=dict(BINARY, **{"If-None-Match": resp.headers["ETag"]})).status_code == 304
+    # JSON 的 ETag 不能让二进制请求返回 304，反之亦然
+    assert client.get("/api/phone/location", query_string=query,
+                      headers=dict(BINARY, **{"If-None-Match": json_etag})).status_code == 200
+    assert client.get("/api/phone/location", query_string=query,
+                      headers={"If-None-Match": resp.headers["ETag"]}).status_code == 200
+
+
+def test_locations_dictionary(asgi_request):
+    resp = api.app.test_client().get("/api/locations")
+    data = resp.get_json()["data"]
+    locations = api.seg_lookup.get_data().seg_map.locations
+    assert data["version"] == api.seg_lookup.get_data().version
+    assert [(loc["city"], loc["operator"]) for loc in data["locations"]] == [tuple(loc) for loc in locations]
+    assert [loc["id"] for loc in data["locations"]] == list(range(1, len(locations) + 1))
+    operator_ids = {op["operator"]: op["id"] for op in data["operators"]}
+    assert all(loc["operator_id"] == operator_ids[loc["operator"]] for loc in data["locations"])
+    status, _, body = asgi_request("/api/locations")
+    assert status == 200 and json.loads(body) == resp.get_json()
@@ -0,0 +1,39 @@
+# 多进程离线补全：切片并行处理后的输出与 bulk.py 单进程逐行处理逐字节相同
+import time
+
+import bulk
+import enrich
+
+
+def write_input(path, rows):
+    """七位命中、前缀回退、未命中与非法号码交替出现；备注列带引号和逗号"""
+    phones = ("138001380{:02d}", "199123456{:02d}", "140000000{:02d}", "100000000{:02d}", "123", "")
+    lines = ["id,备注,phone"]
+    for i in range(rows):
+        lines.append(f'{i},"第 {i} 行, 含逗号",{phones[i % len(phones)].format(i % 100)}')
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_enrich_matches_bulk_across_shards_and_workers(tmp_path, monkeypatch):
+    src = tmp_path / "customers.csv"
+    write_input(src, 3000)
+    shard_mb = 2048 / 1048576
+    _, data_start = enrich.read_header(str(src))
+    assert len(enrich.plan_shards(str(src), data_start, 2048)) > 20
+
+    # 越靠前的切片越慢，让切片乱序完成：输出仍须按原顺序写回
+    enrich_shard = enrich.enrich_shard
+
+    def slow_early_shards(path, start, end, col):
+        time.sleep(max(0.0, 0.02 - start / 5_000_000))
+        return enrich_shard(path, start, end, col)
+
+    monkeypatch.setattr(enrich, "enrich_shard", slow_early_shards)
+
+    bulk_out = tmp_path / "bulk.csv"
+    assert bulk.main([str(src), "-o", str(bulk_out)]) == 0
+    enrich.main([str(src), "--output-dir", str(tmp_path / "out"), "--workers", "3", "--shard-mb", str(shard_mb)])
+
+    expected = bulk_out.read_bytes()
+    assert (tmp_path / "out" / "customers.enriched.csv").read_bytes() == expected
+    assert expected.count(b"\n") == 3001
@@ -0,0 +1,48 @@
+# 按需加载：预热结束与查询并发，冷分片计数只统计单个查询触发的加载
+import time
+
+import seg_index
+
+
+class FlakyShards:
+    """第一次读取返回加载器，之后返回 None：模拟检查与调用之间预热线程加载完最后一个分片"""
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def __get__(self, table, owner):
+        loader, self.loader = self.loader, None
+        return loader
+
+    def __set__(self, table, value):
+        self.loader = value
+
+
+class NoopLoader:
+    def ensure(self, shard, warm=False):
+        return None
+
+
+def test_lookup_survives_warmup_finishing_concurrently():
+    class Table(seg_index.SegTable):
+        shards = FlakyShards(NoopLoader())
+
+    table = Table([("北京", "移动")])
+    table.table[80000] = 1
+    assert table.get("1380000") == ("北京", "移动")
+
+
+def test_load_all_is_not_counted_as_cold(tmp_path, write_csv):
+    root = str(tmp_path / "city")
+    write_csv(root, "北京/移动号段数据.csv", ["1380000", "1390000"], time.time())
+    path = str(tmp_path / "seg_index.bin")
+    seg_index.write_index(seg_index.parse_city_dir(root, {}, workers=1), path)
+
+    data = seg_index.read_index(path, lazy=True)
+    assert data.seg_map.get("1380000") == ("北京", "移动")
+    assert data.seg_map.lazy.progress()["cold_loads"] == 1
+    data.seg_map.load_all()
+    progress = data.seg_map.lazy.progress()
+    assert progress["shards_loaded"] == seg_index.SHARD_COUNT
+    assert progress["cold_loads"] == 1
+    assert data.seg_map.shards is None and data.seg_map.get("1390000") == ("北京", "移动")
@@ -0,0 +1,85 @@
+# 热更新的增量解析：从索引启动的进程只重新解析内容变化的 CSV
+import os
+import time
+
+import seg_index
+import seg_lookup
+
+FILES = {
+    "北京/移动号段数据.csv": ["1380000", "1380001", "1380002"],
+    "北京/联通号段数据.csv": ["1300000", "1300001"],
+    "上海/电信号段数据.csv": ["1330000", "1330001"],
+}
+
+
+def test_reload_from_index_reparses_only_changed_file(tmp_path, monkeypatch, write_csv):
+    root = str(tmp_path / "city")
+    index = str(tmp_path / "seg_index.bin")
+    past = time.time() - 100
+    for name, segs in FILES.items():
+        write_csv(root, name, segs, past)
+    for city in ("北京", "上海"):
+        os.utime(os.path.join(root, city), (past, past))
+    os.utime(root, (past, past))
+    seg_index.write_index(seg_index.parse_city_dir(root, {}, workers=1), index)
+
+    monkeypatch.setattr(seg_lookup, "LOCAL_ROOT", root)
+    monkeypatch.setattr(seg_index, "INDEX_PATH", index)
+    monkeypatch.setattr(seg_lookup, "SHARED_MMAP", False)
+    monkeypatch.setattr(seg_lookup, "LAZY_LOAD", False)
+    monkeypatch.setattr(seg_lookup, "_PARSE_CACHE", {})
+
+    # 进程从索引启动，没有解析过 CSV
+    data = seg_lookup.build_seg_data()
+    assert data.source == "index"
+
+    # 修改一个文件后热更新
+    write_csv(root, "北京/联通号段数据.csv", FILES["北京/联通号段数据.csv"] + ["1300002"], time.time() + 100)
+    new = seg_lookup.build_seg_data(data.version)
+
+    statuses = {r["file"]: r["status"] for r in new.report["files"]}
+    assert [name for name, status in statuses.items() if status == "parsed"] == ["北京/联通号段数据.csv"]
+    assert sorted(status for status in statuses.values()) == ["parsed", "reused", "reused"]
+    assert new.seg_map.get("1300002") == ("北京", "联通")
+    assert new.seg_map.get("1380002") == ("北京", "移动")
+    assert new.total_loaded == 8
+
+
+def test_reload_rebuilds_index_once_for_all_workers(tmp_path, monkeypatch, write_csv):
+    root = str(tmp_path / "city")
+    index = str(tmp_path / "seg_index.bin")
+    past = time.time() - 100
+    for name, segs in FILES.items():
+        write_csv(root, name, segs, past)
+    monkeypatch.setattr(seg_lookup, "LOCAL_ROOT", root)
+    monkeypatch.setattr(seg_index, "INDEX_PATH", index)
+    monkeypatch.setattr(seg_lookup, "SHARED_MMAP", False)
+    monkeypatch.setattr(seg_lookup, "LAZY_LOAD", False)
+    monkeypatch.setattr(seg_lookup, "_PARSE_CACHE", {})
+
+    # 第一个 worker 在进程内解析（不 fork 进程池）并写出索引
+    first = seg_lookup.build_seg_data("old", reloading=True)
+    assert first.source == "csv" and first.report["workers"] == 1
+    assert seg_index.index_is_fresh(index, root)
+
+    # 其他 worker 直接读取该索引
+    monkeypatch.setattr(seg_lookup, "_PARSE_CACHE", {})
+    second = seg_lookup.build_seg_data("old", reloading=True)
+    assert second.source == "index" and second.version == first.version
+
+
+def test_load_trace_includes_per_file_report(tmp_path, monkeypatch, write_csv):
+    root = str(tmp_path / "city")
+    for name, segs in FILES.items():
+        write_csv(root, name, segs, time.time())
+    monkeypatch.setattr(seg_lookup, "LOCAL_ROOT", root)
+    monkeypatch.setattr(seg_index, "INDEX_PATH", str(tmp_path / "seg_index.bin"))
+    monkeypatch.setattr(seg_lookup, "SHARED_MMAP", False)
+    monkeypatch.setattr(seg_lookup, "_PARSE_CACHE", {})
+
+    trace = seg_lookup.profiling.PhaseTrace("startup")
+    seg_lookup.build_seg_data(trace=trace)
+    report = trace.to_dict()["parse_csv"]
+    assert {"workers", "bad_cells", "phases_ms"} <= set(report)
+    assert sorted(f["file"] for f in report["files"]) == sorted(FILES)
+    assert all("ms" in f and f["status"] == "parsed" for f in report["files"])
@@ -0,0 +1,93 @@
+# 携号转网覆盖表：解析、布隆过滤器 + 二分查找、覆盖后的响应与热更新
+import os
+
+import pytest
+
+import api
+import ported
+import seg_lookup
+
+
+def test_parse_ported_formats():
+    text = "号码,运营商\n13800138000,中国联通\n13912345678\t电信\n15000000000 广电\nbad line\n13800138000,移动\n"
+    assert ported.parse_ported(text) == {13800138000: 0, 13912345678: 1, 15000000000: 3}
+
+
+def test_store_lookup_and_bloom_false_positive():
+    overrides = {13800000000 + i * 7919: i % 4 for i in range(1000)}
+    store = ported.PortedStore(overrides)
+    for phone, op in overrides.items():
+        assert store.get(phone) == ported.OPERATORS[op]
+    assert store.hits == len(overrides)
+
+    # 找一个不在表中、但两个布隆位都命中的号码：必须由二分查找排除
+    def bloom_hit(phone):
+        bits, nbits = store.bits, store.nbits
+        return all(bits[pos >> 3] >> (pos & 7) & 1
+                   for pos in (phone % nbits, (phone * ported._MIX >> 16) % nbits))
+
+    false_positive = next(p for p in range(13900000000, 13900100000) if p not in overrides and bloom_hit(p))
+    passes, hits = store.bloom_passes, store.hits
+    assert store.get(false_positive) is None
+    assert (store.bloom_passes, store.hits) == (passes + 1, hits)
+
+    # 两个布隆位不全命中的号码不做二分查找
+    miss = next(p for p in range(13900000000, 13900100000) if not bloom_hit(p))
+    assert store.get(miss) is None and store.bloom_passes == passes + 1
+
+
+@pytest.fixture
+def ported_file(tmp_path, monkeypatch):
+    path = tmp_path / "ported.csv"
+    monkeypatch.setattr(seg_lookup, "PORTED_PATH", str(path))
+    monkeypatch.setattr(seg_lookup, "PORTED", None)
+    monkeypatch.setattr(seg_lookup, "_ported_stamp", None)
+    return path
+
+
+def write_ported(path, text, mtime):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_override_response_shape_and_etag(ported_file):
+    phone = "13800138000"
+    seg_operator = seg_lookup.lookup(phone)["data"]["operator"]
+    override = "电信" if seg_operator != "电信" else "联通"
+    write_ported(ported_file, f"{phone},{override}\n", 1_000_000_000)
+    assert seg_lookup.load_ported_data() is True
+
+    client = api.app.test_client()
+    resp = client.get("/api/phone/location", query_string={"phone": phone})
+    data = resp.get_json()["data"]
+    assert (data["operator"], data["seg_operator"], data["source"]) == (override, seg_operator, "ported")
+    batch = client.post("/api/phone/location/batch", json=[phone]).get_json()["data"]["results"]
+    assert batch[0]["data"] == data
+
+    store = seg_lookup.PORTED
+    assert resp.headers["ETag"] == f'"{seg_lookup.get_data().version}.{store.version}-{phone}"'
+    binary = client.get("/api/phone/location", query_string={"phone": phone},
+                        headers={"Accept": api.compact.MEDIA_TYPE})
+    assert binary.headers["ETag"] == f'"{seg_lookup.get_data().version}.{store.version}-{phone}.bin"'
+
+    # 未转网的号码不带 source / seg_operator
+    other = client.get("/api/phone/location", query_string={"phone": "13900000000"}).get_json()["data"]
+    assert "source" not in other and "seg_operator" not in other
+
+
+def test_reload_follows_file_changes(ported_file):
+    write_ported(ported_file, "13800138000,联通\n", 1_000_000_000)
+    assert seg_lookup.load_ported_data() is True
+    first = seg_lookup.PORTED
+    # 文件未变化：跳过
+    assert seg_lookup.load_ported_data() is False and seg_lookup.PORTED is first
+
+    write_ported(ported_file, "13800138000,电信\n13900000000,联通\n", 1_000_000_100)
+    assert seg_lookup.load_ported_data() is True
+    store = seg_lookup.PORTED
+    assert store is not first and store.version != first.version and len(store) == 2
+    assert store.get(13800138000) == "电信"
+
+    # 文件删除后不再覆盖
+    ported_file.unlink()
+    assert seg_lookup.load_ported_data() is True and seg_lookup.PORTED is None
@@ -0,0 +1,60 @@
+# 最长前缀回退：多数归属地、票数相同取编号较小者、置信度与各级 seg_type
+import pytest
+
+import seg_index
+import seg_lookup
+
+A, B, C = ("北京", "移动"), ("上海", "移动"), ("广东", "联通")
+SEGS = {
+    # 六位前缀 138000：A 3 个、B 1 个 -> A，75%
+    1380000: A, 1380001: A, 1380002: A, 1380003: B,
+    # 五位前缀 13810：C、B 各 1 个 -> 票数相同取编号较小的 B，50%
+    1381000: C, 1381010: B,
+    # 四位前缀 1382：A 2 个、C 1 个 -> A，66%（向下取整）；六位前缀 138200 只有 A -> 100%
+    1382000: A, 1382100: A, 1382200: C,
+    # 三位前缀 135：B 2 个、C 1 个 -> B，66%
+    1350000: B, 1351000: B, 1352000: C,
+}
+
+
+@pytest.fixture
+def data(monkeypatch):
+    locations = [A, B, C]
+    seg_map = seg_index.SegTable(locations)
+    for seg, loc in SEGS.items():
+        seg_map.table[seg - seg_index.SEG_BASE] = locations.index(loc) + 1
+    ranges = seg_index.SegRanges.from_table(seg_map)
+    data = seg_index.SegData(seg_map, seg_index.PrefixTable.from_ranges(ranges), len(SEGS), "test", "test")
+    monkeypatch.setattr(seg_lookup, "DATA", data)
+    monkeypatch.setattr(seg_lookup, "PORTED", None)
+    return data
+
+
+@pytest.mark.parametrize("phone, seg, seg_type, loc, confidence", [
+    ("13800000000", "1380000", "7位号段", A, None),
+    ("13800051234", "138000", "6位前缀", A, 0.75),
+    ("13810201234", "13810", "5位前缀", B, 0.5),
+    ("13823001234", "1382", "4位前缀", A, 0.66),
+    ("13820011234", "138200", "6位前缀", A, 1.0),
+    ("13599991234", "135", "3位前缀", B, 0.66),
+])
+def test_longest_prefix_fallback(data, phone, seg, seg_type, loc, confidence):
+    result = seg_lookup.lookup(phone)
+    assert result["code"] == 200
+    info = result["data"]
+    assert (info["seg"], info["seg_type"], (info["city"], info["operator"])) == (seg, seg_type, loc)
+    assert info.get("confidence") == confidence
+    assert seg_lookup.lookup_many([phone]) == [result]
+
+
+def test_unknown_prefix_misses(data):
+    assert seg_lookup.lookup("17000000000")["code"] == 404
+
+
+def test_level_keys_and_counts(data):
+    prefixes = data.prefixes
+    assert prefixes.keys(3) == [135, 138]
+    assert prefixes.count(6) == len({seg // 10 for seg in SEGS})
+    assert len(prefixes) == sum(prefixes.count(n) for n in seg_index.PREFIX_LEVELS)
+    with pytest.raises(ValueError):
+        prefixes.count(7)
@@ -0,0 +1,35 @@
+# 请求调用栈抽样分析：根帧按路由模板命名，栈的种类不随请求路径增长
+import pytest
+
+import api
+import profiling
+
+
+@pytest.fixture
+def sample_all(monkeypatch):
+    monkeypatch.setattr(api.PROFILER, "rate", 1.0)
+    monkeypatch.setattr(api.PROFILER, "dump_every", 0)
+    api.PROFILER.reset()
+    yield api.PROFILER
+    api.PROFILER.reset()
+
+
+def roots(profiler):
+    return {stack.split(";", 1)[0] for stack in profiler._totals}
+
+
+def test_root_frame_uses_route_not_raw_path(sample_all):
+    client = api.app.test_client()
+    client.get("/api/phone/location", query_string={"phone": "13800138000"})
+    client.get("/api/segments/range?start=1380000&end=1380010")
+    for i in range(20):
+        client.get(f"/no/such/path/{i}")
+    client.delete("/api/health")                       # 方法不允许
+    client.get("/api/segments/range/")                 # 多出结尾斜杠，同样视为未匹配
+
+    assert roots(sample_all) == {
+        "wsgi GET /api/phone/location",
+        "wsgi GET /api/segments/range",
+        profiling.UNMATCHED_ROOT,
+    }
+    assert sample_all.samples == 24
@@ -0,0 +1,50 @@
+# 限流：客户端标识不能被伪造的 X-Forwarded-For 绕过
+import itertools
+
+import pytest
+
+import api
+import ratelimit
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = ratelimit.LocalLimiter(rate=1, burst=2)
+    monkeypatch.setattr(api, "LIMITER", limiter)
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_PROXY", 1)
+    return limiter
+
+
+def test_client_key_uses_address_appended_by_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_PROXY", 1)
+    assert ratelimit.client_key("10.0.0.1", "6.6.6.6, 203.0.113.7") == "203.0.113.7"
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_PROXY", 2)
+    assert ratelimit.client_key("10.0.0.1", "6.6.6.6, 203.0.113.7, 10.0.0.2") == "203.0.113.7"
+    # 地址数少于代理层数：请求没有经过全部可信代理，不信任该头
+    assert ratelimit.client_key("10.0.0.1", "6.6.6.6") == "10.0.0.1"
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_PROXY", 0)
+    assert ratelimit.client_key("10.0.0.1", "203.0.113.7") == "10.0.0.1"
+
+
+def test_spoofed_forwarded_for_is_still_throttled(limiter):
+    client = api.app.test_client()
+    statuses = []
+    for i in range(5):
+        # 客户端每次伪造不同的左侧地址，代理在最右侧追加真实地址
+        headers = {"X-Forwarded-For": f"198.51.100.{i}, 203.0.113.7"}
+        statuses.append(client.get("/api/phone/location?phone=13800138000", headers=headers).status_code)
+    assert statuses == [200, 200, 429, 429, 429]
+    assert limiter.stats()["clients"] == 1
+
+
+def test_local_limiter_evicts_least_recently_used():
+    limiter = ratelimit.LocalLimiter(rate=1, burst=2, max_clients=3)
+    keys = (f"client-{i}" for i in itertools.count())
+    hot = next(keys)
+    limiter.acquire(hot)
+    limiter.acquire(hot)
+    for key in itertools.islice(keys, 10):
+        limiter.acquire(key)
+        # 活跃的客户端不会被轮换的新客户端挤掉（桶被清掉就会重新得到满额令牌）
+        assert limiter.acquire(hot) > 0
+        assert len(limiter._buckets) <= 3
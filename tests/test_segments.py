@@ -0,0 +1,53 @@
+# 号段范围查询：区间列表分页，按归属地汇总取自反向索引
+import api
+import seg_lookup
+
+
+def range_page(**params):
+    resp = api.app.test_client().get("/api/segments/range", query_string=params)
+    return resp.status_code, resp.get_json()
+
+
+def test_range_is_paginated():
+    status, body = range_page(start="1300000", end="1999999")
+    assert status == 200
+    data = body["data"]
+    assert data["offset"] == 0 and data["limit"] == 100
+    assert len(data["ranges"]) == 100
+    assert data["total"] == len(seg_lookup.get_ranges())
+
+    # 逐页取回的区间与整体查询一致
+    _, full = seg_lookup.get_ranges().query(1380000, 1389999)
+    rows, offset = [], 0
+    while True:
+        _, body = range_page(prefix="138", offset=str(offset), limit="7")
+        page = body["data"]["ranges"]
+        if not page:
+            break
+        rows.extend(page)
+        offset += len(page)
+    assert body["data"]["total"] == len(full) == len(rows)
+    assert rows == [{"start": str(lo), "end": str(hi), "count": hi - lo + 1, "city": loc[0], "operator": loc[1]}
+                    for lo, hi, loc in full]
+
+
+def test_range_limit_is_capped_and_validated():
+    _, body = range_page(start="1300000", end="1999999", limit="100000")
+    assert body["data"]["limit"] == api.PAGE_MAX_SIZE
+    assert len(body["data"]["ranges"]) == api.PAGE_MAX_SIZE
+    status, _ = range_page(start="1300000", end="1999999", offset="-1")
+    assert status == 400
+
+
+def test_range_location_totals_match_ranges():
+    # 起止点落在区间中间，验证首尾区间的截断
+    start, end = 1381234, 1529876
+    _, ranges = seg_lookup.get_ranges().query(start, end)
+    expected = {}
+    for lo, hi, loc in ranges:
+        expected[loc] = expected.get(loc, 0) + hi - lo + 1
+    _, body = range_page(start=str(start), end=str(end), limit="1")
+    locations = body["data"]["locations"]
+    assert {(row["city"], row["operator"]): row["segments"] for row in locations} == expected
+    assert [row["segments"] for row in locations] == sorted(expected.values(), reverse=True)
+    assert body["data"]["segments"] == sum(expected.values())
@@ -0,0 +1,125 @@
+# 快照分发：增量包往返、同步方式，以及同一节点多个 worker 只同步一次
+import os
+import time
+import shutil
+import threading
+
+import pytest
+
+import seg_index
+import seg_lookup
+import snapshot
+
+V1 = {
+    "北京/移动号段数据.csv": ["1380000", "1380001", "1380002"],
+    "北京/联通号段数据.csv": ["1300000", "1300001"],
+    "上海/电信号段数据.csv": ["1330000", "1330001"],
+}
+# 新增 1330002、删除 1380001、1380002 从北京移动改属上海电信；北京联通不变
+V2 = {
+    "北京/移动号段数据.csv": ["1380000"],
+    "北京/联通号段数据.csv": ["1300000", "1300001"],
+    "上海/电信号段数据.csv": ["1330000", "1330001", "1330002", "1380002"],
+}
+
+@pytest.fixture
+def versions(tmp_path, write_csv):
+    """发布 V1 后再发布 V2，返回 (发布目录, V1 索引路径, V2 索引路径)"""
+    paths = []
+    for i, files in enumerate((V1, V2), 1):
+        root = str(tmp_path / f"city{i}")
+        for name, segs in files.items():
+            write_csv(root, name, segs, time.time() - 100)
+        path = str(tmp_path / f"v{i}.bin")
+        seg_index.write_index(seg_index.parse_city_dir(root, {}, workers=1), path)
+        paths.append(path)
+    source = str(tmp_path / "publish")
+    for path in paths:
+        snapshot.publish(source, path)
+    return source, paths[0], paths[1]
+
+
+def read(path):
+    data = seg_index.read_index(path)
+    data.files = seg_index.read_index_files(path)
+    return data
+
+
+def test_delta_round_trip_keeps_table_and_source_files(versions):
+    _, v1_path, v2_path = versions
+    old, new = read(v1_path), read(v2_path)
+    delta = snapshot.make_delta(old, new)
+    meta, _ = snapshot.read_delta_meta(delta)
+    assert (meta["added"], meta["removed"], meta["reowned"]) == (1, 1, 1)
+    # 只附带内容变化的两个文件的号段
+    assert sorted(name for name, *_, n in meta["files"] if n) == ["上海/电信号段数据.csv", "北京/移动号段数据.csv"]
+
+    # 正在服务的快照从索引加载，不带源文件记录：由调用方从同版本的本地索引补齐
+    base = seg_index.read_index(v1_path)
+    applied = snapshot.apply_delta(base, delta, seg_index.read_index_files(v1_path))
+    assert applied.version == new.version and applied.content_hash == new.content_hash
+    assert dict(applied.seg_map.items()) == dict(new.seg_map.items())
+    assert [(n, d, sorted(s)) for n, _, _, d, s in applied.files] == \
+        [(n, d, sorted(s)) for n, _, _, d, s in new.files]
+    assert base.files is None
+
+    # 缺少基准源文件时号段数据照常应用，只是不带源文件记录
+    assert snapshot.apply_delta(base, delta).files is None
+    with pytest.raises(ValueError):
+        snapshot.apply_delta(new, delta)
+
+
+def test_sync_index_downloads_delta_then_reports_local(versions, tmp_path):
+    source, v1_path, v2_path = versions
+    node = str(tmp_path / "node.bin")
+    shutil.copy(v1_path, node)
+
+    how, data = snapshot.sync_index(None, node, source)
+    assert how == "delta" and data.version == seg_index.read_index_version(v2_path)
+    assert snapshot.STATE["last_bytes"] < os.path.getsize(v2_path)
+    # 打补丁后写出的索引仍带完整源文件记录，之后解析本地 CSV 时可以增量解析
+    assert sorted(name for name, *_ in seg_index.read_index_files(node)) == sorted(V2)
+
+    assert snapshot.sync_index(None, node, source) == ("local", None)
+    assert snapshot.sync_index(data, node, source) == ("current", None)
+
+    os.remove(node)
+    how, _ = snapshot.sync_index(None, node, source)
+    assert how == "full" and seg_index.read_index_version(node) == data.version
+
+
+def test_workers_share_one_snapshot_sync(versions, tmp_path, monkeypatch):
+    source, v1_path, _ = versions
+    node = str(tmp_path / "node.bin")
+    shutil.copy(v1_path, node)
+    old_version = seg_index.read_index_version(v1_path)
+    monkeypatch.setattr(snapshot, "SNAPSHOT_SOURCE", source)
+    monkeypatch.setattr(seg_index, "INDEX_PATH", node)
+    monkeypatch.setattr(seg_lookup, "SHARED_MMAP", False)
+    monkeypatch.setattr(seg_lookup, "LAZY_LOAD", False)
+
+    downloads = []
+    fetch, apply_delta = snapshot.fetch, snapshot.apply_delta
+
+    def counting_fetch(src, name, sha256=None):
+        if name != snapshot.MANIFEST:
+            downloads.append(name)
+        return fetch(src, name, sha256)
+
+    def slow_apply_delta(*args):
+        # 拉长打补丁的时间：没有锁时其他 worker 会在此期间看到旧索引并各自下载
+        time.sleep(0.2)
+        return apply_delta(*args)
+
+    monkeypatch.setattr(snapshot, "fetch", counting_fetch)
+    monkeypatch.setattr(snapshot, "apply_delta", slow_apply_delta)
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(seg_lookup.build_seg_data(old_version, reloading=True)))
+               for _ in range(3)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    assert len(downloads) == 1 and downloads[0].startswith("deltas/")
+    assert len({data.version for data in results}) == 1
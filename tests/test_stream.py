@@ -0,0 +1,47 @@
+# 流式批量补全接口：可预先发现的输入错误在响应开始前返回 400
+import gzip
+import json
+
+import api
+
+
+def test_unknown_column_returns_400_before_streaming():
+    client = api.app.test_client()
+    resp = client.post("/api/phone/location/stream?column=nope", data="name,phone\na,13800138000\n",
+                       content_type="text/csv")
+    assert resp.status_code == 400
+    assert resp.get_json() == {"code": 400, "msg": "找不到号码列: nope", "data": None}
+
+
+def test_known_column_streams_rows():
+    client = api.app.test_client()
+    resp = client.post("/api/phone/location/stream?column=phone", data="name,phone\na,13800138000\n",
+                       content_type="text/csv")
+    assert resp.status_code == 200
+    assert resp.data.decode("utf-8").splitlines()[1].startswith("a,13800138000,200,1380013")
+
+
+def test_summary_line_reports_throughput_to_client():
+    client = api.app.test_client()
+    resp = client.post("/api/phone/location/stream?column=phone&summary=1",
+                       data="name,phone\na,13800138000\nb,123\n", content_type="text/csv")
+    lines = resp.data.decode("utf-8").splitlines()
+    assert len(lines) == 4 and lines[-1].startswith("# ")
+    summary = json.loads(lines[-1][2:])
+    assert (summary["rows"], summary["found"]) == (2, 1)
+    assert summary["elapsed"] >= 0 and summary["rows_per_sec"] >= 0 and "error" not in summary
+
+    body = '{"phone":"13800138000"}\n{"phone":"19912345678"}\nnot json\n'
+    resp = client.post("/api/phone/location/stream?format=ndjson&summary=1", data=body,
+                       content_type="application/x-ndjson", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    rows = [json.loads(line) for line in gzip.decompress(resp.data).decode("utf-8").splitlines()]
+    assert len(rows) == 4 and rows[-1]["summary"]["rows"] == 3
+    assert all("location" in row for row in rows[:-1])
+
+
+def test_summary_is_opt_in():
+    client = api.app.test_client()
+    resp = client.post("/api/phone/location/stream?format=ndjson", data='{"phone":"13800138000"}\n',
+                       content_type="application/x-ndjson")
+    assert [json.loads(line).keys() for line in resp.data.decode("utf-8").splitlines()] == [{"phone", "location"}]